@@ -1,206 +1,239 @@
-import yfinance as yf
-import pandas as pd
-import numpy as np
-import time
+# backtest.py
+# 15min 多股资金管理回测。导入本模块不会读取配置、修改环境变量或下载数据：
+#   result = run_backtest(config, data=(daily, intraday), params={...})   # 进程内调用，返回 engine.BacktestResult
+#   python backtest.py [--config config.json] [--offline] [--no-report]  # 命令行
+# 绘图 (matplotlib) 与下载 (yfinance) 只在生成报告 / 同步数据时才导入。
+import argparse
 import json
-import os  # 导入 os 库来设置环境变量
-from datetime import datetime, timezone
-import matplotlib.pyplot as plt
+import os
 
-from position_manager import PositionManager
+import pandas as pd
 
-from threshold_optimizer import ThresholdOptimizer
+from indicators import ema, calculate_rsi, simple_atr
+from engine import BacktestResult, intraday_arrays, adaptive_thresholds, simulate_intraday
+from bar_store import BarStore
+from log_writer import format_trades
+from resampler import Resampler
 
-# ================= 配置加载 =================
-def load_config():
-    with open('config.json', 'r') as f:
-        return json.load(f)
-CONFIG = load_config()
-
-PROXY_URL = CONFIG.get('proxy_url') # 使用 .get 防止 key 不存在报错
-# 设置代理
-if PROXY_URL:
-    os.environ['HTTP_PROXY'] = PROXY_URL
-    os.environ['HTTPS_PROXY'] = PROXY_URL
-    
 # ================= 1. 配置 =================
-TICKERS = CONFIG['watchlist']
-EMA_PERIOD = 150
-RSI_BUY_LEVEL = 40
-ATR_MULTIPLIER = 4
-INITIAL_CASH = 100000
+DEFAULTS = {
+    'ema_period': 150,
+    'rsi_buy_level': 40,
+    'percentile': 20,
+    'atr_multiplier': 4,
+    'initial_cash': 100000,
+}
+CLI_LOG_DIR = 'data/logs/backtest'
+TRADE_COLUMNS = ['Ticker', 'Buy Time', 'Buy Price', 'Close Time', 'Close Price',
+                 'Total Buy Cost', 'Total Close Value', 'PnL %', 'PnL Cash']
+
+def load_config(path='config.json'):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def apply_proxy(config):
+    """把 config 中的代理写入环境变量 (yfinance 下载使用)，只由命令行入口调用"""
+    proxy_url = config.get('proxy_url') # 使用 .get 防止 key 不存在报错
+    if proxy_url:
+        os.environ['HTTP_PROXY'] = proxy_url
+        os.environ['HTTPS_PROXY'] = proxy_url
+
+def backtest_params(config, params=None):
+    """DEFAULTS <- config 中的阈值模式 / 日志目录 <- 调用方传入的 params"""
+    p = dict(DEFAULTS)
+    # 自适应阈值模式：static 全样本分位数 / rolling 滚动窗口 / expanding 扩展窗口 (后两者无未来函数)
+    p['threshold_mode'] = config.get('threshold_mode', 'static')
+    p['threshold_window'] = config.get('threshold_window', 1000)
+    # 信号 / 成交日志目录 (分块列式文件，每次运行会清空该目录)；未设置时保存在内存中，
+    # 进程内并发 / 反复调用互不干扰。只有命令行入口默认写到 CLI_LOG_DIR
+    p['log_dir'] = config.get('backtest_log_dir')
+    p['minute_store'] = config.get('minute_store')  # 1 分钟 K 线仓库目录：设置后止损在触发 K 线内按分钟回放
+    p['checkpoint_dir'] = config.get('checkpoint_dir')  # 回测检查点：每日追加数据后从上次结束处续跑
+    p['max_corr'] = config.get('max_corr')  # 相关性仓位控制：拒绝 / 缩减与现有持仓高度相关的入场
+    p['soft_corr'] = config.get('soft_corr')
+    p.update(params or {})
+    return p
 
 # ================= 2. 数据准备 =================
-def get_data():
+def resample_daily(intraday):
+    """由 15min K 线增量合成日线 (只含已完成的日线)"""
+    resampler = Resampler('1d')
+    resampler.batch(intraday)
+    return resampler.frame()
+
+def load_data(config, tickers=None, ema_period=DEFAULTS['ema_period'], offline=None):
+    """
+    从本地 K 线仓库同步日线与 15min 数据并计算指标
+    :param offline: None 表示按 config['offline']；True 时只读本地数据，不访问网络
+    :return: (daily, intraday)，均为 {ticker: DataFrame}
+    """
+    tickers = tickers or config['watchlist']
+    store = BarStore(config.get('bar_store_dir', 'data/bars'))
+    offline = config.get('offline', False) if offline is None else offline
     daily_data = {}
     intraday_data = {}
-    print("正在拉取多周期数据...")
-    for t in TICKERS:
-        d = yf.download(t, period='2y', interval='1d', progress=False)
-        i = yf.download(t, period='60d', interval='15m', progress=False)
-        
+    print("正在同步多周期数据...")
+    intraday_raw = store.sync(tickers, '15m', '60d', offline=offline)
+    # 日线来源：resample 由本地仓库中的 15min 历史增量合成日线 (只含已完成的日线)，不再单独下载；
+    # download 单独下载 2 年日线；auto (默认) 只为本地 15min 历史不足以预热日线 EMA 的标的下载
+    source = config.get('daily_source', 'auto')
+    daily_raw = {}
+    if source != 'download':
+        daily_raw = {t: resample_daily(intraday_raw[t]) for t in tickers}
+    short = [t for t in tickers if len(daily_raw.get(t, ())) < ema_period]
+    if source == 'resample':
+        for t in short:
+            print(f"  {t} ⚠️ 本地 15min 历史只有 {len(daily_raw[t])} 天，日线 EMA{ema_period} 尚未充分预热")
+    elif short:
+        daily_raw.update(store.sync(short, '1d', '2y', pause=0, offline=offline))
+    if config.get('minute_store') and not offline:
+        # Yahoo 只提供最近 7 天的 1 分钟 K 线，靠本地仓库逐次追加积累历史；回测时按块从磁盘读取，这里不载入内存
+        print("正在同步 1 分钟数据 (止损回放)...")
+        BarStore(config['minute_store']).sync(tickers, '1m', '7d')
+    for t in tickers:
+        d = daily_raw[t]
+        i = intraday_raw[t]
+
         if d.empty or i.empty:
-            print(f"  {t} ❌ 数据下载失败")
-            return []
-        
-        for df in [d, i]:
-            df.index = df.index.tz_localize(None)
-            if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
-        
+            raise ValueError(f"{t} ❌ 数据下载失败")
+
         # 指标计算
-        d['EMA'] = d['Close'].ewm(span=EMA_PERIOD, adjust=False).mean()
-        i['RSI'] = 100 - (100 / (1 + (i['Close'].diff().where(i['Close'].diff() > 0, 0).ewm(com=13).mean() / 
-                                      -i['Close'].diff().where(i['Close'].diff() < 0, 0).ewm(com=13).mean())))
+        d['EMA'] = ema(d['Close'], ema_period)
+        i['RSI'] = calculate_rsi(i['Close'], 14)
         # 简化版 ATR
-        i['ATR'] = (i['High'] - i['Low']).rolling(14).mean()
-        
+        i['ATR'] = simple_atr(i, 14)
+
         daily_data[t] = d
         intraday_data[t] = i
-        time.sleep(0.5)
     return daily_data, intraday_data
 
 # ================= 3. 模拟引擎 =================
-# 1. 准备数据
-daily, intraday = get_data()
-pm = PositionManager(total_cash=INITIAL_CASH, num_slots=len(TICKERS))
-
-# 对齐时间轴 (以 QQQ 的 15min 时间戳为基准)
-timeline = intraday['QQQ'].index
-equity_curve = []
-
-# 2. 动态参数字典初始化
-TICKER_PARAMS = {}
-print("\n[PARAMETER OPTIMIZATION] 正在计算自适应阈值...")
-
-for t in TICKERS:
-    # 获取动态阈值
-    adaptive_rsi = ThresholdOptimizer.get_adaptive_threshold(intraday[t], base_level=RSI_BUY_LEVEL)
-    TICKER_PARAMS[t] = {
-        'rsi_threshold': adaptive_rsi,
-        'atr_multiplier': 4.0 # 可针对性增加波动率补偿
-    }
-    print(f"  └─ {t:6}: 推荐 RSI 阈值 = {adaptive_rsi}")
-    
-print("开始多股并行资金管理回测...")
-
-for t_point in timeline:
-    current_prices = {}
-    
-    for t in TICKERS:
-        if t_point not in intraday[t].index: continue
-        
-        bar = intraday[t].loc[t_point]
-        prev_bar = intraday[t].shift(1).loc[t_point]
-        current_prices[t] = bar['Close']
-        
-        # --- 1. 持仓管理 (止损/追踪) ---
-        if t in pm.positions:
-            # 更新追踪止损位
-            new_stop = bar['Close'] - (bar['ATR'] * ATR_MULTIPLIER)
-            pm.update_trailing_stop(t, new_stop)
-            
-            # 检查是否触碰止损
-            if bar['Close'] <= pm.positions[t]['trailing_stop']:
-                pm.close(t, bar['Close'], t_point)
-        
-        # --- 2. 信号扫描 ---
-        else:
-            try:
-                day_data = daily[t].loc[daily[t].index <= t_point.normalize()].iloc[-1]
-                
-                # 核心信号判断
-                # 第一层：RSI 择时触发 (从超卖区反弹)
-                threshold = TICKER_PARAMS[t]['rsi_threshold']
-                if prev_bar['RSI'] < threshold and bar['RSI'] >= threshold:
-                    # 记录信号（审计日志）
-                    pm.signal_log.append({
-                        'Time': t_point,
-                        'Ticker': t,
-                        'Price': round(bar['Close'], 2),
-                        'Daily_EMA': round(day_data['EMA'], 2),
-                        'RSI': round(bar['RSI'], 2),
-                        'Trend_OK': bar['Close'] > day_data['EMA'],
-                        'Slot_Available': pm.can_open(t)
-                    })
-                    
-                    # 第二层：战略过滤 (必须在日线 EMA 上方，确保大趋势向上)
-                    if bar['Close'] > day_data['EMA']:
-                        # 第三层：价格确认 (当前收盘价突破前一根15min K线高点，确认动量翻转)
-                        if bar['Close'] > prev_bar['High']and pm.can_open(t):
-                            initial_stop = bar['Close'] - (bar['ATR'] * ATR_MULTIPLIER)
-                            pm.open(t, bar['Close'], initial_stop, t_point)
-            except: continue
-
-    equity_curve.append(pm.get_total_value(current_prices))
-
-# # ================= 4. 统计总结 =================
-# final_df = pd.DataFrame(pm.closed_trades)
-# print("\n" + "="*40)
-# print(f"最终账户价值: ${pm.get_total_value(current_prices):.2f}")
-# print(f"总交易次数: {len(final_df)}")
-# if not final_df.empty:
-#     win_rate = len(final_df[final_df['pnl_pct'] > 0]) / len(final_df)
-#     print(f"总胜率: {win_rate:.2%}")
-#     print(f"平均每笔收益: {final_df['pnl_pct'].mean():.4%}")
-# print("="*40)
+def run_backtest(config=None, data=None, params=None, arrays=None, verbose=True):
+    """
+    :param config: 配置 dict 或 config.json 路径 (默认 config.json)
+    :param data: (daily, intraday)，默认由 load_data 从本地仓库同步
+    :param params: 覆盖 DEFAULTS / engine.INTRADAY_DEFAULTS 的参数
+    :param arrays: 已对齐的面板数组 (批量调用时复用，跳过数据准备与对齐)
+    :return: engine.BacktestResult
+    """
+    if not isinstance(config, dict):
+        config = load_config(config or 'config.json')
+    tickers = config['watchlist']
+    p = backtest_params(config, params)
+
+    if arrays is None:
+        daily, intraday = data if data is not None else load_data(config, tickers, p['ema_period'])
+        # 对齐时间轴 (所有标的 15min 时间戳的并集，缺失的 K 线由 valid 掩码标记)
+        arrays = intraday_arrays(daily, intraday, ema_periods=[p['ema_period']])
+
+    if verbose:
+        print("\n[PARAMETER OPTIMIZATION] 正在计算自适应阈值...")
+    thresholds = adaptive_thresholds(arrays, tickers, base_level=p['rsi_buy_level'], percentile=p['percentile'],
+                                     mode=p['threshold_mode'], window=p['threshold_window'])
+    if verbose:
+        for t in tickers:
+            if p['threshold_mode'] == 'static':
+                print(f"  └─ {t:6}: 推荐 RSI 阈值 = {thresholds[t]}")
+            else:
+                print(f"  └─ {t:6}: 滚动 RSI 阈值 (最新) = {thresholds[t][-1]}")
+        print("开始多股并行资金管理回测...")
+    pm, equity_curve = simulate_intraday(arrays, tickers, p, thresholds=thresholds)
+    return BacktestResult('intraday', pm, equity_curve, arrays, tickers, p, thresholds=thresholds)
 
 # ================= 4. 统计总结 =================
-print("\n" + "="*50)
-print("              信号捕捉与丢失分析")
-print("="*50)
-
-df_signals = pd.DataFrame(pm.signal_log)
-if not df_signals.empty:
-    total_sig = len(df_signals)
-    # 统计拦截原因
-    trend_blocked = len(df_signals[df_signals['Trend_OK'] == False])
-    slot_blocked = len(df_signals[(df_signals['Trend_OK'] == True) & (df_signals['Slot_Available'] == False)])
-    executed = len(pm.closed_trades) + len(pm.positions)
-    
-    print(f"总计触发信号: {total_sig} 次")
-    print(f"  └─ 趋势不符(价格在EMA下): {trend_blocked} 次")
-    print(f"  └─ 资金/坑位不足拦截: {slot_blocked} 次")
-    print(f"  └─ 成功入场: {executed} 次")
-    
-    # 展示最近的 10 条丢失信号（可选）
-    lost_signals = df_signals[(df_signals['Trend_OK'] == True) & (df_signals['Slot_Available'] == False)]
-    if not lost_signals.empty:
-        print("\n[最近因坑位不足丢失的信号]:")
-        print(lost_signals.tail(10).to_string(index=False))
-    df_signals.to_csv("lost_signals_details.csv", index=False)
-    print(f"\n✅ 完整丢失信号已保存至: lost_signals_details.csv")
-        
-# ================= 4. 统计总结 =================
-print("\n" + "="*50)
-print("              单笔交易明细报表")
-print("="*50)
-
-if pm.closed_trades:
-    # 转换为 DataFrame
-    df_trades = pd.DataFrame(pm.closed_trades)
-    
-    # 调整列顺序，使其更符合阅读习惯
-    cols = ['Ticker', 'Buy Time', 'Buy Price', 'Close Time', 'Close Price', 
-            'Total Buy Cost', 'Total Close Value', 'PnL %', 'PnL Cash']
-    df_trades = df_trades[cols]
-    
-    # # 在控制台打印前 20 笔（如果太多的话）
-    # print(df_trades.to_string(index=False))
-    
-    # 自动保存到本地，方便你用 Excel 打开深度分析
-    df_trades.to_csv("backtest_trade_details.csv", index=False)
-    print(f"\n✅ 完整交易记录已保存至: backtest_trade_details.csv")
-else:
-    print("未发现符合条件的交易记录。")
-
-print("="*50)
-print(f"最终账户总价值: ${pm.get_total_value(current_prices):.2f}")
-
-
-plt.figure(figsize=(10, 6))
-plt.plot(equity_curve)
-plt.title("Account Equity Curve - v2.0")
-plt.xlabel("15min Bars")
-plt.ylabel("Total Asset ($)")
-plt.grid(True)
-plt.show()
+def _to_csv(log, path, columns=None, transform=None):
+    """分块日志逐块写出，内存列表一次写出；transform 为写出前的格式化 (如 format_trades)"""
+    if hasattr(log, 'to_csv'):
+        log.to_csv(path, transform=transform, columns=columns)
+    else:
+        df = pd.DataFrame(log)
+        if transform is not None:
+            df = transform(df)
+        (df[columns] if columns else df).to_csv(path, index=False)
+
+def print_summary(result, out_dir='.'):
+    """信号拦截分析 + 成交明细导出 (CSV 写入 out_dir)"""
+    pm = result.pm
+    print("\n" + "="*50)
+    print("              信号捕捉与丢失分析")
+    print("="*50)
+
+    # 信号日志在磁盘上分块存放时逐块查询，不把全部信号读回内存
+    breakdown = result.signal_breakdown()
+    if breakdown['total']:
+        executed = pm.n_trades + len(pm.positions)
+
+        print(f"总计触发信号: {breakdown['total']} 次")
+        print(f"  └─ 趋势不符(价格在EMA下): {breakdown['trend_blocked']} 次")
+        print(f"  └─ 资金/坑位不足拦截: {breakdown['slot_blocked']} 次")
+        print(f"  └─ 成功入场: {executed} 次")
+
+        # 展示最近的 10 条丢失信号（可选）
+        lost_signals = result.signals(where=lambda df: df['Trend_OK'] & ~df['Slot_Available'])
+        if not lost_signals.empty:
+            print("\n[最近因坑位不足丢失的信号]:")
+            print(lost_signals.tail(10).to_string(index=False))
+        _to_csv(pm.signal_log, os.path.join(out_dir, "lost_signals_details.csv"))
+        print(f"\n✅ 完整丢失信号已保存至: lost_signals_details.csv")
+
+    print("\n" + "="*50)
+    print("              单笔交易明细报表")
+    print("="*50)
+
+    if pm.n_trades:
+        # 调整列顺序，使其更符合阅读习惯；自动保存到本地，方便你用 Excel 打开深度分析
+        _to_csv(pm.closed_trades, os.path.join(out_dir, "backtest_trade_details.csv"), TRADE_COLUMNS,
+                format_trades)
+        print(f"\n✅ 完整交易记录已保存至: backtest_trade_details.csv")
+    else:
+        print("未发现符合条件的交易记录。")
+
+    print("="*50)
+    print(f"最终账户总价值: ${result.final_equity:.2f}")
+    ledger = result.ledger  # 逐 bar 账本 (缺失 K 线按前向填充价格估值)
+    print(f"最大回撤: {ledger['drawdown'].min():.2%} | 平均仓位暴露: {ledger['exposure'].mean():.2%}")
+
+# ================= 5. 报告 =================
+def write_backtest_report(result, report_dir):
+    from report import trade_returns, write_report  # 延迟导入：不生成报告时不加载绘图模块
+    stats = result.stats
+    ledger = result.ledger
+    paths = write_report(
+        os.path.join(report_dir, 'intraday'), ledger['equity'], result.params['initial_cash'],
+        returns=trade_returns(result.pm.ledger, result.last_prices()),
+        stats={
+            '最终资产': f"${stats['final_equity']:.2f}",
+            '总收益': f"{stats['total_return']:.2%}",
+            '最大回撤': f"{stats['max_drawdown']:.2%}",
+            '平均仓位暴露': f"{ledger['exposure'].mean():.2%}",
+            '入场次数': stats['trades'],
+            '胜率': f"{stats['win_rate']:.2%}",
+        },
+        title="Account Equity Curve - v2.0")
+    print(f"✅ 回测报告已生成: {paths['html']}")
+    return paths
+
+# ================= 命令行 =================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="15min 多股资金管理回测")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--offline', action='store_true', help="只读本地 K 线仓库，不访问网络")
+    parser.add_argument('--report-dir', help="报告输出目录 (默认 config['report_dir'] 或 reports)")
+    parser.add_argument('--no-report', action='store_true', help="不生成报告 (不导入 matplotlib)")
+    parser.add_argument('--out', default='.', help="CSV 输出目录")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.offline:
+        config['offline'] = True
+    apply_proxy(config)
+    result = run_backtest(config, params={'log_dir': config.get('backtest_log_dir', CLI_LOG_DIR)})
+    print_summary(result, args.out)
+    report_dir = None if args.no_report else (args.report_dir or config.get('report_dir', 'reports'))
+    if report_dir:
+        write_backtest_report(result, report_dir)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -1,165 +1,145 @@
-import yfinance as yf
+# backtest_d.py
+# 日线趋势 + 特赦入场回测。导入本模块不会读取配置、修改环境变量或下载数据：
+#   result = run_daily_backtest(config, data={ticker: DataFrame}, params={...})  # 返回 engine.BacktestResult
+#   python backtest_d.py [--config config.json] [--offline] [--no-report]       # 命令行
+import argparse
+import os
+
 import pandas as pd
-import numpy as np
-import time
-import json
-import os  # 导入 os 库来设置环境变量
-from datetime import datetime, timezone
-import matplotlib.pyplot as plt
-
-from position_manager import PositionManager
-from threshold_optimizer import ThresholdOptimizer
-
-# ================= 配置加载 =================
-def load_config():
-    with open('config.json', 'r') as f:
-        return json.load(f)
-CONFIG = load_config()
-
-PROXY_URL = CONFIG.get('proxy_url') # 使用 .get 防止 key 不存在报错
-# 设置代理
-if PROXY_URL:
-    os.environ['HTTP_PROXY'] = PROXY_URL
-    os.environ['HTTPS_PROXY'] = PROXY_URL
+
+from indicators import ema, calculate_rsi, simple_atr
+from engine import BacktestResult, daily_arrays, simulate_daily
+from bar_store import BarStore
+from log_writer import format_trades
+from backtest import apply_proxy, load_config
 
 # ================= 1. 配置 =================
-TICKERS = CONFIG['watchlist']
-INITIAL_CASH = 100000
-ATR_MULTIPLIER_INITIAL = 2.0  # 已根据建议从 3.5 收紧至 2.0
-RSI_AMNESTY_LEVEL = 25       # 特赦入场阈值
+DEFAULTS = {
+    'ema_period': 150,
+    'amnesty_level': 25,     # 特赦入场阈值
+    'amnesty_stop': 2.0,     # 已根据建议从 3.5 收紧至 2.0
+    'trend_stop': 3.5,
+    'initial_cash': 100000,
+    'warmup': 200,           # 跳过指标预热期
+}
 
 # ================= 2. 数据准备 =================
-def run_daily_backtest():
-    data_dict = {}
-
-    print("正在拉取数据...")
-    for t in TICKERS:
-        df = yf.download(t, period='2y', interval='1d', progress=False)
-        df.index = df.index.tz_localize(None)
-        if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
-        
-        # 计算指标
-        df['EMA'] = df['Close'].ewm(span=150, adjust=False).mean()
-        df['RSI'] = 100 - (100 / (1 + (df['Close'].diff().where(df['Close'].diff() > 0, 0).ewm(com=13).mean() / 
-                                      -df['Close'].diff().where(df['Close'].diff() < 0, 0).ewm(com=13).mean())))
-        df['ATR'] = (df['High'] - df['Low']).rolling(14).mean()
-        data_dict[t] = df
-
-    pm = PositionManager(INITIAL_CASH, num_slots=len(TICKERS))
-    equity_curve = []
-    
-    # 获取每个标的的自适应阈值
-    ticker_params = {t: ThresholdOptimizer.get_adaptive_threshold(data_dict[t]) for t in TICKERS}
-    
-    # 统一时间轴
-    timeline = data_dict['QQQ'].index[200:] # 跳过指标预热期
-
-    for t_now in timeline:
-        prices_snapshot = {}
-        
-        for t in TICKERS:
-            df = data_dict[t]
-            if t_now not in df.index: continue
-            
-            curr = df.loc[t_now]
-            prev = df.shift(1).loc[t_now]
-            prices_snapshot[t] = curr['Close']
-            threshold = ticker_params[t]
-
-            # 获取 EMA 50 作为中短期参考
-            ema_50 = df['Close'].ewm(span=50, adjust=False).mean().loc[t_now]
-
-            # --- 判定入场逻辑 ---
-            if not pm.can_open(t):
-                continue
-            
-            # 路径 A: 标准趋势入场 (EMA 150 支撑)
-            trend_entry = (curr['Close'] > curr['EMA']) and (prev['RSI'] < threshold and curr['RSI'] >= threshold)
-            
-            # 路径 B: 特赦入场 (极端超卖超跌反弹)
-            # 逻辑：RSI 曾跌破 25，且当前价格开始收复前日高点，不看均线
-            amnesty_entry = (prev['RSI'] < 25) and (curr['Close'] > prev['High'])
-            
-            if (trend_entry or amnesty_entry):
-                # 针对特赦入场，我们通常需要更窄的止损，因为这是逆势交易
-                multiplier = 2.0 if amnesty_entry else 3.5
-                init_stop = curr['Close'] - (curr['ATR'] * multiplier)
-                
-                pm.open(t, curr['Close'], init_stop, t_now)
-                if amnesty_entry:
-                    print(f"🚑 {t} 触发特赦入场 (RSI < 25) | 时间: {t_now.date()}")
-        
-        # ✅ 每一天结束时记录账户总价值     
-        current_total_value = pm.get_total_value(prices_snapshot)
-        equity_curve.append(current_total_value)
-
-# ✅ 修改返回值：同时返回 PM 对象和 净值序列
-    return pm, equity_curve, timeline, prices_snapshot
-
-pm_result, equity_curve, timeline, prices_snapshot = run_daily_backtest()
-
-
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# --- 强制探测点 ---
-print(f"📊 探测到总持仓数量: {len(pm_result.positions)}")
-print(f"📊 探测到已完成交易数量: {len(pm_result.closed_trades)}")
-
-if len(pm_result.positions) > 0:
-    print(f"⚠️ 发现未平仓头寸: {list(pm_result.positions.keys())}")
-    # 打印其中一个持仓的止损位，看看是不是设得太远了
-    first_ticker = list(pm_result.positions.keys())[0]
-    pos = pm_result.positions[first_ticker]
-    print(f"   [{first_ticker}] 买入价: {pos['buy_price']:.2f}, 当前止损位: {pos['trailing_stop']:.2f}")
-
-if len(pm_result.closed_trades) == 0 and len(pm_result.positions) == 0:
-    print("❌ 警告：回测期间完全没有买入信号，请检查入场逻辑或数据范围！")
-    
-# 1. 导出 CSV
-if pm_result.closed_trades:
-    df_trades = pd.DataFrame(pm_result.closed_trades)
-    df_trades.to_csv("trade_details_final.csv", index=False)
-    print("\n✅ 成交明细已导出")
-
-# 2. 净值与回撤曲线
-equity_series = pd.Series(equity_curve, index=timeline)
-rolling_max = equity_series.cummax()
-drawdown = (equity_series - rolling_max) / rolling_max
-
-fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
-ax1.plot(timeline, equity_curve, color='#27ae60', label='Total Equity')
-ax1.fill_between(timeline, INITIAL_CASH, equity_curve, where=(np.array(equity_curve) > INITIAL_CASH), color='green', alpha=0.1)
-ax1.set_title("Strategy Performance Dashboard (Daily Pro v3.0)")
-ax1.grid(True, alpha=0.2)
-
-ax2.fill_between(timeline, drawdown, 0, color='#e74c3c', alpha=0.3)
-ax2.set_ylabel("Drawdown %")
-ax2.grid(True, alpha=0.2)
-plt.show()
-
-# 3. 综合收益分布图 (含持仓浮动盈亏)
-all_returns = []
-if pm_result.closed_trades:
-    all_returns.extend([float(t['PnL %'].strip('%')) / 100 for t in pm_result.closed_trades])
-for t, pos in pm_result.positions.items():
-    unrealized = (last_prices[t] - pos['buy_price']) / pos['buy_price']
-    all_returns.append(unrealized)
-
-if all_returns:
-    plt.figure(figsize=(10, 5))
-    sns.histplot(all_returns, bins=20, kde=True, color='skyblue')
-    plt.axvline(0, color='red', linestyle='--')
-    plt.title("Return Distribution (Realized + Unrealized)")
-    plt.show()
-
-print(f"\n📊 最终资产: ${equity_curve[-1]:.2f}")
-print(f"📊 最大回撤: {drawdown.min():.2%}")
-
-
-
-
-
-
-
+def load_data(config, tickers=None, offline=None):
+    """
+    从本地 K 线仓库同步 2 年日线并计算指标
+    :param offline: None 表示按 config['offline']；True 时只读本地数据，不访问网络
+    """
+    tickers = tickers or config['watchlist']
+    store = BarStore(config.get('bar_store_dir', 'data/bars'))
+    offline = config.get('offline', False) if offline is None else offline
+    print("正在同步数据...")
+    data_dict = store.sync(tickers, '1d', '2y', pause=0, offline=offline)
+    for t in tickers:
+        df = data_dict[t]
 
+        # 计算指标
+        df['EMA'] = ema(df['Close'], 150)
+        df['EMA50'] = ema(df['Close'], 50)  # 中短期参考
+        df['RSI'] = calculate_rsi(df['Close'], 14)
+        df['ATR'] = simple_atr(df, 14)
+    return data_dict
+
+# ================= 3. 模拟引擎 =================
+def run_daily_backtest(config=None, data=None, params=None, arrays=None, verbose=True):
+    """
+    :param config: 配置 dict 或 config.json 路径 (默认 config.json)
+    :param data: {ticker: 日线 DataFrame (含 RSI / ATR)}，默认由 load_data 同步
+    :param params: 覆盖 DEFAULTS / engine.DAILY_DEFAULTS 的参数
+    :param arrays: 已对齐的面板数组 (批量调用时复用)
+    :return: engine.BacktestResult (prices_snapshot 为最后一个交易日的价格)
+    """
+    if not isinstance(config, dict):
+        config = load_config(config or 'config.json')
+    tickers = config['watchlist']
+    p = dict(DEFAULTS, checkpoint_dir=config.get('checkpoint_dir'))  # 回测检查点：每日追加数据后从上次结束处续跑
+    p.update(max_corr=config.get('max_corr'), soft_corr=config.get('soft_corr'))  # 相关性仓位控制
+    p.update(params or {})
+
+    if arrays is None:
+        # 统一时间轴 (所有标的日线的并集)
+        arrays = daily_arrays(data if data is not None else load_data(config, tickers),
+                              ema_periods=[p['ema_period']])
+    pm, equity_curve, prices_snapshot = simulate_daily(arrays, tickers, p, verbose=verbose)
+    return BacktestResult('daily', pm, equity_curve, arrays, tickers, p, start=p['warmup'],
+                          prices_snapshot=prices_snapshot)
+
+# ================= 4. 统计总结 =================
+def print_summary(result, out_dir='.'):
+    pm_result = result.pm
+    # --- 强制探测点 ---
+    print(f"📊 探测到总持仓数量: {len(pm_result.positions)}")
+    print(f"📊 探测到已完成交易数量: {pm_result.n_trades}")
+
+    if len(pm_result.positions) > 0:
+        print(f"⚠️ 发现未平仓头寸: {list(pm_result.positions.keys())}")
+        # 打印其中一个持仓的止损位，看看是不是设得太远了
+        first_ticker = list(pm_result.positions.keys())[0]
+        pos = pm_result.positions[first_ticker]
+        print(f"   [{first_ticker}] 买入价: {pos['buy_price']:.2f}, 当前止损位: {pos['trailing_stop']:.2f}")
+
+    if pm_result.n_trades == 0 and len(pm_result.positions) == 0:
+        print("❌ 警告：回测期间完全没有买入信号，请检查入场逻辑或数据范围！")
+
+    # 1. 导出 CSV
+    if pm_result.n_trades:
+        format_trades(result.trades()).to_csv(os.path.join(out_dir, "trade_details_final.csv"), index=False)
+        print("\n✅ 成交明细已导出")
+
+    # 2. 净值与回撤
+    equity_series = pd.Series(result.equity_curve, index=result.timeline)
+    rolling_max = equity_series.cummax()
+    drawdown = (equity_series - rolling_max) / rolling_max
+
+    print(f"\n📊 最终资产: ${result.final_equity:.2f}")
+    print(f"📊 最大回撤: {drawdown.min():.2%}")
+    return equity_series
+
+# ================= 5. 报告 =================
+def write_backtest_report(result, report_dir):
+    """净值 / 回撤 / 综合收益分布 (含持仓浮动盈亏，按最后一个交易日的价格快照估值)"""
+    from report import trade_returns, write_report  # 延迟导入：不生成报告时不加载绘图模块
+    stats = result.stats
+    paths = write_report(
+        os.path.join(report_dir, 'daily'), pd.Series(result.equity_curve, index=result.timeline),
+        result.params['initial_cash'],
+        returns=trade_returns(result.pm.ledger, result.prices_snapshot),
+        stats={
+            '最终资产': f"${stats['final_equity']:.2f}",
+            '总收益': f"{stats['total_return']:.2%}",
+            '最大回撤': f"{stats['max_drawdown']:.2%}",
+            '入场次数': stats['trades'],
+            '未平仓': len(result.pm.positions),
+        },
+        title="Strategy Performance Dashboard (Daily Pro v3.0)")
+    print(f"✅ 回测报告已生成: {paths['html']}")
+    return paths
+
+# ================= 命令行 =================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="日线趋势 + 特赦入场回测")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--offline', action='store_true', help="只读本地 K 线仓库，不访问网络")
+    parser.add_argument('--report-dir', help="报告输出目录 (默认 config['report_dir'] 或 reports)")
+    parser.add_argument('--no-report', action='store_true', help="不生成报告 (不导入 matplotlib)")
+    parser.add_argument('--out', default='.', help="CSV 输出目录")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.offline:
+        config['offline'] = True
+    apply_proxy(config)
+    result = run_daily_backtest(config)
+    print_summary(result, args.out)
+    report_dir = None if args.no_report else (args.report_dir or config.get('report_dir', 'reports'))
+    if report_dir:
+        write_backtest_report(result, report_dir)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# bar_store.py
+# 本地列式 K 线仓库：每个 (interval, ticker) 一个目录，时间戳与 OHLCV 分别存为追加写入的原始二进制文件，
+# 读取时通过 np.memmap 零拷贝映射。增量更新只追加比最后一根更新的 K 线，因此可以保存超过 Yahoo 60 天限制的分钟级历史。
+# 数据源返回复权价 (auto_adjust)：增量更新时多拉取 OVERLAP 天与已有 K 线重叠，除权 / 拆股导致历史价格整体缩放时，
+# 按同一比例重写本地历史，避免新旧 K 线之间出现虚假跳空。
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Yahoo 对不同周期可回溯的最大长度
+MAX_PERIOD = {'1m': '7d', '5m': '60d', '15m': '60d', '30m': '60d', '1h': '730d', '1d': 'max'}
+# 增量更新时向前多拉取的天数 (跨越长周末后仍至少与一个完整交易日重叠)
+OVERLAP = pd.Timedelta(days=4)
+# 重叠 K 线收盘价之比偏离 1 超过该值、且各根比例一致时视为复权调整
+ADJUST_RTOL = 1e-4
+
+
+def fetch_window(last, interval, period):
+    """
+    增量更新的请求范围
+    :param last: 仓库中最后一根 K 线的时间，None 表示仓库为空 (按 period 全量拉取)
+    :return: (period, start)，两者之一为 None
+    """
+    if last is None:
+        return period, None
+    start = last - OVERLAP
+    limit = MAX_PERIOD.get(interval)
+    if limit and limit != 'max':
+        earliest = pd.Timestamp.now() - pd.Timedelta(days=int(limit.rstrip('d')))
+        if last < earliest:
+            # 超出数据源回溯窗口时只能拉取可得的最大范围，中间的缺口无法补回
+            return limit, None
+        start = min(max(start, earliest + pd.Timedelta(days=1)), last)
+    return None, start.strftime('%Y-%m-%d')
+
+
+def normalize_download(df):
+    """把 yf.download 的结果整理成统一格式：单层列名、去时区索引、只保留 OHLCV"""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([]))
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df = df[COLUMNS].astype('float64')
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def yf_fetch(ticker, interval, period=None, start=None):
+    import yfinance as yf  # 延迟导入：离线读取不需要 yfinance
+    df = yf.download(ticker, period=period, start=start, interval=interval, auto_adjust=True, progress=False)
+    return normalize_download(df)
+
+
+class BarStore:
+    def __init__(self, root='data/bars', fetcher=yf_fetch):
+        """
+        :param root: 仓库根目录
+        :param fetcher: 数据源，签名 fetcher(ticker, interval, period=None, start=None) -> DataFrame
+        """
+        self.root = root
+        self.fetcher = fetcher
+
+    def _paths(self, ticker, interval):
+        d = os.path.join(self.root, interval, ticker)
+        return os.path.join(d, 'ts.i8'), os.path.join(d, 'bars.f8')
+
+    def num_rows(self, ticker, interval):
+        ts_path, bar_path = self._paths(ticker, interval)
+        if not os.path.exists(ts_path) or not os.path.exists(bar_path):
+            return 0
+        # 以两个文件中较短的一个为准，容忍写入中途崩溃留下的半行
+        return min(os.path.getsize(ts_path) // 8, os.path.getsize(bar_path) // (8 * len(COLUMNS)))
+
+    def last_timestamp(self, ticker, interval):
+        n = self.num_rows(ticker, interval)
+        if n == 0:
+            return None
+        ts_path, _ = self._paths(ticker, interval)
+        with open(ts_path, 'rb') as f:
+            f.seek((n - 1) * 8)
+            return pd.Timestamp(np.frombuffer(f.read(8), dtype='int64')[0])
+
+    def append(self, ticker, interval, df):
+        """
+        追加新 K 线：时间戳等于最后一根的行覆盖最后一根（盘中未收盘的 K 线），更新的行追加到末尾
+        :return: 新增的行数
+        """
+        df = normalize_download(df)
+        if df.empty:
+            return 0
+        ts = df.index.values.astype('datetime64[ns]').view('int64')
+        vals = np.ascontiguousarray(df.to_numpy(dtype='float64'))
+        ts_path, bar_path = self._paths(ticker, interval)
+        os.makedirs(os.path.dirname(ts_path), exist_ok=True)
+
+        n = self.num_rows(ticker, interval)
+        row_bytes = 8 * len(COLUMNS)
+        if n:
+            # 修复上次中断留下的残缺尾部
+            if os.path.getsize(ts_path) != n * 8: os.truncate(ts_path, n * 8)
+            if os.path.getsize(bar_path) != n * row_bytes: os.truncate(bar_path, n * row_bytes)
+
+            last = self.last_timestamp(ticker, interval).value
+            self._reconcile(ticker, interval, ts, vals, n, last)
+            same = ts == last
+            if same.any():
+                with open(bar_path, 'r+b') as f:
+                    f.seek((n - 1) * row_bytes)
+                    f.write(vals[same][-1].tobytes())
+            newer = ts > last
+            ts, vals = ts[newer], vals[newer]
+
+        if len(ts):
+            # 先写数据再写时间戳，时间戳文件的长度决定可见行数
+            with open(bar_path, 'ab') as f:
+                f.write(vals.tobytes())
+            with open(ts_path, 'ab') as f:
+                f.write(ts.tobytes())
+        return len(ts)
+
+    def _reconcile(self, ticker, interval, ts, vals, n, last):
+        """
+        比较下载结果与仓库中重叠的已收盘 K 线 (不含可能未收盘的最后一根)；收盘价按同一比例整体偏离时，
+        说明数据源因除权 / 拆股重新复权了历史，此时按该比例重写本地全部历史 (成交量按相反比例)
+        :return: 复权比例，未重写时为 None
+        """
+        overlap = ts < last
+        if not overlap.any():
+            return None
+        stored_ts, bars = self.arrays(ticker, interval)
+        pos = np.minimum(np.searchsorted(stored_ts, ts[overlap]), n - 1)
+        hit = stored_ts[pos] == ts[overlap]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = vals[overlap][hit, 3] / bars[pos[hit], 3]
+        ratios = ratios[np.isfinite(ratios) & (ratios > 0)]
+        if not len(ratios):
+            return None
+        factor = float(np.median(ratios))
+        if abs(factor - 1) <= ADJUST_RTOL or not np.allclose(ratios, factor, rtol=ADJUST_RTOL):
+            return None
+
+        adjusted = np.array(bars[:n])
+        del stored_ts, bars
+        adjusted[:, :4] *= factor
+        adjusted[:, 4] /= factor
+        # 先写临时文件再替换，时间戳文件不变；已打开的内存映射仍指向旧文件
+        _, bar_path = self._paths(ticker, interval)
+        tmp = f'{bar_path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(adjusted.tobytes())
+        os.replace(tmp, bar_path)
+        print(f"  {ticker} ⚠️ {interval} 历史已按复权比例 {factor:.6g} 重写 (除权 / 拆股)")
+        return factor
+
+    def arrays(self, ticker, interval):
+        """
+        原始数组的内存映射 (不读入内存)，供按块顺序扫描大数据量的调用方使用
+        :return: (时间戳 int64 纳秒 (n,), OHLCV float64 (n, 5))；仓库为空时为长度 0 的数组
+        """
+        n = self.num_rows(ticker, interval)
+        if n == 0:
+            return np.zeros(0, dtype='int64'), np.zeros((0, len(COLUMNS)))
+        ts_path, bar_path = self._paths(ticker, interval)
+        ts = np.memmap(ts_path, dtype='int64', mode='r', shape=(n,))
+        bars = np.memmap(bar_path, dtype='float64', mode='r', shape=(n, len(COLUMNS)))
+        return ts, bars
+
+    def load(self, ticker, interval, start=None, tail=None):
+        """
+        内存映射读取（不复制数据）
+        :param start: 只返回该时间之后（含）的 K 线
+        :param tail: 只返回最后 N 根
+        """
+        n = self.num_rows(ticker, interval)
+        if n == 0:
+            return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([]), dtype='float64')
+        ts, bars = self.arrays(ticker, interval)
+
+        lo = 0
+        if start is not None:
+            lo = int(np.searchsorted(ts, pd.Timestamp(start).value, side='left'))
+        if tail is not None:
+            lo = max(lo, n - tail)
+        index = pd.DatetimeIndex(ts[lo:].view('datetime64[ns]'))
+        return pd.DataFrame(bars[lo:], index=index, columns=COLUMNS, copy=False)
+
+    def update(self, ticker, interval, period):
+        """
+        增量同步：仓库为空时按 period 全量拉取，否则从最后一根之前 OVERLAP 天开始补齐 (重叠部分用于复权校验)
+        :return: 新增的行数
+        """
+        period, start = fetch_window(self.last_timestamp(ticker, interval), interval, period)
+        return self.append(ticker, interval, self.fetcher(ticker, interval, period=period, start=start))
+
+    def sync(self, tickers, interval, period, pause=0.5, offline=False):
+        """
+        批量同步并读取，返回 {ticker: DataFrame}
+        :param offline: True 时只读本地仓库，不访问网络
+        """
+        data = {}
+        for t in tickers:
+            if not offline:
+                try:
+                    self.update(t, interval, period)
+                except Exception as e:
+                    print(f"  {t} ⚠️ 增量更新失败，使用本地数据: {e}")
+                time.sleep(pause)
+            data[t] = self.load(t, interval)
+        return data
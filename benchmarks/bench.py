@@ -0,0 +1,403 @@
+# bench.py
+# 性能基准：用合成数据分别计时各个热点环节，结果写入 JSON，并与仓库中保存的基线比较，超出容差即以非零状态退出。
+# 每个环节重复 --repeat 次取中位数；所有环节都是必需的，任何环节未能运行也按失败处理。
+# 用法 (在仓库根目录):
+#   python benchmarks/bench.py                                # 默认 10 / 100 个标的，60 天 15min
+#   python benchmarks/bench.py --full                         # 10 / 100 / 1000 个标的 × 60 天、10 / 100 个标的 × 2 年 15min
+#   python benchmarks/bench.py --tickers 1000 --intraday-days 504  # 1000 个标的 × 2 年 (约 1300 万根 15min，需 10GB 以上内存)
+#   python benchmarks/bench.py --full --update-baseline       # 在基准机器上重新生成基线
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+import engine
+from indicators import ema, calculate_rsi, simple_atr
+from position_manager import PositionManager, ArrayPositionManager
+from synthetic import make_daily, make_intraday, ticker_names, SyntheticSource
+from threshold_optimizer import ThresholdOptimizer
+
+DEFAULT_OUT = os.path.join(ROOT, 'benchmarks', 'results.json')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# 基线覆盖的规模 (标的数, 15min 交易日数)，504 天约为 2 年
+FULL_SCALES = [(10, 60), (100, 60), (1000, 60), (10, 504), (100, 504)]
+
+
+# ================= 1. 各环节 =================
+# 每个环节签名为 stage(ctx) -> 处理的条目数 (K 线数 / 操作数)，用于计算吞吐量；
+# 前面环节的结果放在 ctx 中供后面环节使用，重复执行结果相同。
+
+def stage_indicators_daily(ctx):
+    """run_daily_backtest 中的指标计算"""
+    data = {}
+    for t, df in ctx['daily_raw'].items():
+        df = df.copy()
+        df['EMA'] = ema(df['Close'], 150)
+        df['EMA50'] = ema(df['Close'], 50)
+        df['RSI'] = calculate_rsi(df['Close'], 14)
+        df['ATR'] = simple_atr(df, 14)
+        data[t] = df
+    ctx['daily'] = data
+    return ctx['daily_bars']
+
+def stage_indicators_intraday(ctx):
+    """get_data 中的指标计算"""
+    daily, intraday = {}, {}
+    for t in ctx['tickers']:
+        d = ctx['daily_raw'][t].copy()
+        i = ctx['intraday_raw'][t].copy()
+        d['EMA'] = ema(d['Close'], 150)
+        i['RSI'] = calculate_rsi(i['Close'], 14)
+        i['ATR'] = simple_atr(i, 14)
+        daily[t], intraday[t] = d, i
+    ctx['intraday_daily'], ctx['intraday'] = daily, intraday
+    return ctx['intraday_bars']
+
+def stage_threshold(ctx):
+    """ThresholdOptimizer.get_adaptive_threshold，每个标的一次"""
+    for df in ctx['intraday'].values():
+        ThresholdOptimizer.get_adaptive_threshold(df, base_level=40)
+    return ctx['intraday_bars']
+
+def stage_panel_intraday(ctx):
+    ctx['arrays_intraday'] = engine.intraday_arrays(ctx['intraday_daily'], ctx['intraday'], ema_periods=[150])
+    return ctx['intraday_bars']
+
+def stage_loop_intraday(ctx):
+    """backtest.py 主循环"""
+    engine.simulate_intraday(ctx['arrays_intraday'], ctx['tickers'])
+    return ctx['intraday_bars']
+
+def stage_panel_daily(ctx):
+    ctx['arrays_daily'] = engine.daily_arrays(ctx['daily'], ema_periods=[150])
+    return ctx['daily_bars']
+
+def stage_loop_daily(ctx):
+    """backtest_d.py 主循环"""
+    engine.simulate_daily(ctx['arrays_daily'], ctx['tickers'])
+    return ctx['daily_bars']
+
+def _pm_workload(pm, tickers, rounds=20):
+    """开仓 -> 更新追踪止损 -> 估值 -> 平仓，返回操作次数"""
+    now = pd.Timestamp('2024-01-02 10:00')
+    prices = {t: 101.0 + n for n, t in enumerate(tickers)}
+    ops = 0
+    for r in range(rounds):
+        for n, t in enumerate(tickers):
+            if pm.can_open(t):
+                pm.open(t, 100.0 + n, 90.0, now)
+            ops += 2
+        for t in tickers:
+            pm.update_trailing_stop(t, 95.0 + r)
+        pm.get_total_value(prices)
+        for t in tickers:
+            pm.close(t, 102.0, now)
+        ops += 2 * len(tickers) + 1
+    return ops
+
+def stage_position_manager(ctx):
+    return _pm_workload(PositionManager(100000, num_slots=len(ctx['tickers'])), ctx['tickers'])
+
+def stage_position_manager_array(ctx):
+    tickers = ctx['tickers']
+    return _pm_workload(ArrayPositionManager(100000, num_slots=len(tickers), tickers=tickers), tickers)
+
+@contextlib.contextmanager
+def _cwd(path):
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+class NullNotifier:
+    """替身 Telegram 客户端：接口与 notifier.TelegramNotifier 相同，只计数不发送 (基准不依赖 requests 与网络)"""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.sent = 0
+
+    @classmethod
+    def from_config(cls, config, metrics=None, **kwargs):
+        return cls(metrics)
+
+    def send(self, message):
+        self.sent += 1
+
+    def submit(self, message, on_sent=None, on_failed=None):
+        self.send(message)
+        if on_sent is not None:
+            on_sent()
+
+    @contextlib.contextmanager
+    def batch(self):
+        yield self
+
+    def flush(self):
+        pass
+
+    def close(self, timeout=30):
+        pass
+
+def _load_monitor(ctx):
+    """在临时目录中以合成配置导入 monitor，把数据源替换为 SyntheticSource，Telegram 客户端替换为 NullNotifier"""
+    if 'monitor' in ctx:
+        return ctx['monitor']
+    tmp = tempfile.TemporaryDirectory()
+    config = {
+        'watchlist': ctx['tickers'],
+        'rsi_period': 14,
+        'rsi_oversold': 30,
+        'rsi_overbought': 70,
+        'ema_period': 200,
+        'bar_store_dir': os.path.join(tmp.name, 'bars'),
+        'metrics_path': None,
+    }
+    with open(os.path.join(tmp.name, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    stub = types.ModuleType('notifier')
+    stub.TelegramNotifier = NullNotifier
+    saved = sys.modules.get('notifier')
+    sys.modules['notifier'] = stub
+    try:
+        with _cwd(tmp.name):
+            sys.modules.pop('monitor', None)
+            monitor = importlib.import_module('monitor')
+    finally:
+        if saved is None:
+            sys.modules.pop('notifier', None)
+        else:
+            sys.modules['notifier'] = saved
+    # seed_state 读取最近 59 天，合成数据需截止到今天
+    frames = make_intraday(len(ctx['tickers']), 60, ctx['seed'], end=pd.Timestamp.now())
+    source = SyntheticSource(frames, start_row=60 * 26 - 256)
+    from data_feed import ConcurrentFeed
+    monitor.FEED = ConcurrentFeed(source=source, store=monitor.BAR_STORE, max_workers=8,
+                                  rate=1e9, burst=1e9, batch_size=20)
+    ctx.update(monitor=monitor, monitor_tmp=tmp, monitor_source=source)
+    return monitor
+
+def stage_scan_cold(ctx):
+    """进程重启后的第一次扫描：本地仓库已有数据，指标状态需全量预热"""
+    monitor = _load_monitor(ctx)
+    monitor.LIVE_STATE.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.fetch_and_check()
+    return len(ctx['tickers'])
+
+def stage_scan_warm(ctx):
+    """稳态扫描：每次到来一根新 K 线，只做增量更新"""
+    monitor = _load_monitor(ctx)
+    if not monitor.LIVE_STATE:
+        stage_scan_cold(ctx)
+    ctx['monitor_source'].advance()
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.fetch_and_check()
+    return len(ctx['tickers'])
+
+STAGES = {
+    'indicators_daily': stage_indicators_daily,
+    'indicators_intraday': stage_indicators_intraday,
+    'threshold': stage_threshold,
+    'panel_intraday': stage_panel_intraday,
+    'loop_intraday': stage_loop_intraday,
+    'panel_daily': stage_panel_daily,
+    'loop_daily': stage_loop_daily,
+    'position_manager': stage_position_manager,
+    'position_manager_array': stage_position_manager_array,
+    'scan_cold': stage_scan_cold,
+    'scan_warm': stage_scan_warm,
+}
+
+
+# ================= 2. 计时 =================
+def _frames_mb(frames):
+    return sum(df.memory_usage(index=True).sum() for df in frames.values()) / 2**20
+
+def run_scale(n_tickers, intraday_days, daily_bars=504, seed=0, repeat=5, memory=True, stages=None):
+    """
+    :param repeat: 每个环节重复次数，取中位数 (同时记录最快一次)
+    :param memory: 预热的那次运行同时用 tracemalloc 记录峰值内存
+    """
+    ctx = {
+        'tickers': ticker_names(n_tickers),
+        'seed': seed,
+        'daily_raw': make_daily(n_tickers, daily_bars, seed),
+        'intraday_raw': make_intraday(n_tickers, intraday_days, seed),
+    }
+    ctx['daily_bars'] = sum(len(df) for df in ctx['daily_raw'].values())
+    ctx['intraday_bars'] = sum(len(df) for df in ctx['intraday_raw'].values())
+    result = {
+        'tickers': n_tickers,
+        'daily_bars': ctx['daily_bars'],
+        'intraday_bars': ctx['intraday_bars'],
+        'data_mb': round(_frames_mb(ctx['daily_raw']) + _frames_mb(ctx['intraday_raw']), 2),
+        'stages': {},
+        'skipped': {},
+    }
+    for name, fn in STAGES.items():
+        if stages and name not in stages and not name.startswith(('indicators', 'panel')):
+            continue
+        try:
+            # 先不计时运行一次 (预热，同时用 tracemalloc 统计峰值内存)，避免首次调用的开销混入耗时
+            peak = None
+            if memory:
+                tracemalloc.start()
+            try:
+                fn(ctx)
+                if memory:
+                    peak = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            finally:
+                if memory:
+                    tracemalloc.stop()
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                items = fn(ctx)
+                times.append(time.perf_counter() - t0)
+            median = float(np.median(times))
+            entry = {'seconds': round(median, 6), 'min_seconds': round(min(times), 6), 'items': items,
+                     'throughput': round(items / median, 1) if median else None}
+            if peak is not None:
+                entry['peak_mb'] = peak
+            result['stages'][name] = entry
+        except ImportError as e:
+            # 记录原因后由 missing_stages 判为失败，不会被静默忽略
+            result['skipped'][name] = f"{type(e).__name__}: {e}"
+    if 'monitor_tmp' in ctx:
+        ctx['monitor_tmp'].cleanup()
+    return result
+
+
+# ================= 3. 基线比较 =================
+def missing_stages(results, stages=None):
+    """:return: 应运行却未运行的环节 [(规模, 环节, 原因)]"""
+    required = [name for name in STAGES if not stages or name in stages or name.startswith(('indicators', 'panel'))]
+    missing = []
+    for scale, res in results['scales'].items():
+        for name in required:
+            if name not in res['stages']:
+                missing.append((scale, name, res['skipped'].get(name, '未运行')))
+    return missing
+
+def compare(results, baseline, tolerance=0.5, min_delta=0.1):
+    """
+    比较各环节耗时的中位数
+    :param tolerance: 允许的相对变慢比例
+    :param min_delta: 绝对差小于该秒数时视为噪声
+    :return: 回退列表 [(规模, 环节, 基线秒数, 当前秒数)]
+    """
+    regressions = []
+    for scale, res in results['scales'].items():
+        base = baseline.get('scales', {}).get(scale)
+        if not base:
+            continue
+        for stage, entry in res['stages'].items():
+            ref = base['stages'].get(stage)
+            if not ref:
+                continue
+            if entry['seconds'] > ref['seconds'] * (1 + tolerance) and entry['seconds'] - ref['seconds'] > min_delta:
+                regressions.append((scale, stage, ref['seconds'], entry['seconds']))
+    return regressions
+
+def print_report(results):
+    for scale, res in results['scales'].items():
+        print(f"\n=== {scale}: {res['tickers']} 个标的 | 日线 {res['daily_bars']} 根 | 15min {res['intraday_bars']} 根 "
+              f"| 数据 {res['data_mb']} MB ===")
+        print(f"{'环节':<24}{'耗时(s)':>10}{'吞吐(条/s)':>16}{'峰值内存(MB)':>14}")
+        for stage, e in res['stages'].items():
+            print(f"{stage:<24}{e['seconds']:>10.4f}{e['throughput'] or 0:>16,.0f}{e.get('peak_mb', float('nan')):>14.2f}")
+        for stage, reason in res['skipped'].items():
+            print(f"{stage:<24}{'跳过':>10}  ({reason})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合成数据性能基准')
+    parser.add_argument('--tickers', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--intraday-days', type=int, nargs='+', default=[60], help='15min 数据的交易日数 (504 约为 2 年)')
+    parser.add_argument('--full', action='store_true',
+                        help=f'基线的完整规模 {FULL_SCALES} (标的数, 15min 天数)，覆盖 --tickers / --intraday-days')
+    parser.add_argument('--daily-bars', type=int, default=504)
+    parser.add_argument('--repeat', type=int, default=5, help='每个环节的重复次数 (取中位数)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help='只运行指定环节 (指标与面板准备总会运行)')
+    parser.add_argument('--no-memory', action='store_true', help='不统计峰值内存')
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.5, help='允许的相对变慢比例')
+    parser.add_argument('--min-delta', type=float, default=0.1, help='绝对差小于该秒数时视为噪声')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写为新的基线')
+    args = parser.parse_args(argv)
+    scales = FULL_SCALES if args.full else [(n, days) for days in args.intraday_days for n in args.tickers]
+
+    results = {
+        'meta': {
+            'time': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'scales': {},
+    }
+    for n, days in scales:
+        scale = f"{n}x{days}d"
+        print(f"运行规模 {scale} ...")
+        results['scales'][scale] = run_scale(n, days, args.daily_bars, args.seed, args.repeat,
+                                             not args.no_memory, args.stages)
+    print_report(results)
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ 结果已保存至: {args.out}")
+
+    missing = missing_stages(results, args.stages)
+    if missing:
+        print("\n" + "!" * 60)
+        print("❌ 以下必需环节未能运行:")
+        for scale, stage, reason in missing:
+            print(f"  {scale:>10} | {stage:<24} {reason}")
+        print("!" * 60)
+        return 1
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✅ 基线已更新: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("⚠️ 没有基线文件，跳过比较 (使用 --update-baseline 生成)")
+        return 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print("\n" + "!" * 60)
+        print(f"❌ 性能回退 (容差 {args.tolerance:.0%}):")
+        for scale, stage, ref, now in regressions:
+            print(f"  {scale:>10} | {stage:<24} {ref:.4f}s -> {now:.4f}s ({now / ref - 1:+.0%})")
+        print("!" * 60)
+        return 1
+    print(f"✅ 与基线相比没有超出 {args.tolerance:.0%} 的回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
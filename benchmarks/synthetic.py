@@ -0,0 +1,78 @@
+# synthetic.py
+# 确定性的合成 OHLCV 生成器：同一 (seed, 标的序号) 永远生成同一条价格路径，与股票池大小无关，
+# 因此 10 / 100 / 1000 个标的的数据集互为前缀，可以直接横向比较各规模的耗时。
+import numpy as np
+import pandas as pd
+
+from bar_store import COLUMNS
+
+BARS_PER_DAY = 26  # 美股常规交易时段 09:30 - 16:00 的 15min K 线数
+
+
+def ticker_names(n):
+    return [f'T{i:04d}' for i in range(n)]
+
+
+def daily_index(n_bars, end=None):
+    end = pd.Timestamp(end or '2024-12-31').normalize()
+    return pd.bdate_range(end=end, periods=n_bars)
+
+
+def intraday_index(n_days, end=None, bars_per_day=BARS_PER_DAY):
+    """n_days 个交易日的 15min 时间戳 (不含时区，与 BarStore 一致)"""
+    days = daily_index(n_days, end).values
+    offsets = (np.timedelta64(9 * 60 + 30, 'm') + np.arange(bars_per_day) * np.timedelta64(15, 'm')).astype('timedelta64[ns]')
+    return pd.DatetimeIndex((days[:, None] + offsets[None, :]).ravel())
+
+
+def ohlcv(index, seed, ticker_id, vol=0.02):
+    """
+    单个标的的随机游走 K 线：t 分布收益 (厚尾) + 缓慢的周期漂移，保证 RSI 会反复穿越阈值
+    :param vol: 单根 K 线收益的大致标准差
+    """
+    rng = np.random.default_rng([seed, ticker_id])
+    n = len(index)
+    sigma = vol * rng.uniform(0.5, 1.5)
+    drift = 0.3 * sigma * np.sin(np.arange(n) * 2 * np.pi / rng.uniform(200, 600) + rng.uniform(0, 2 * np.pi))
+    ret = drift + sigma * rng.standard_t(4, n) / np.sqrt(2)
+    close = rng.uniform(20, 500) * np.exp(np.cumsum(ret))
+    open_ = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, sigma / 4, n))
+    wick = np.abs(rng.normal(0, sigma / 2, (2, n)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = np.round(rng.lognormal(13, 0.5, n))
+    return pd.DataFrame(np.column_stack((open_, high, low, close, volume)), index=index, columns=COLUMNS)
+
+
+def make_daily(n_tickers, n_bars=504, seed=0, end=None):
+    """{ticker: 日线 DataFrame}，默认约 2 年"""
+    index = daily_index(n_bars, end)
+    return {t: ohlcv(index, seed, i) for i, t in enumerate(ticker_names(n_tickers))}
+
+
+def make_intraday(n_tickers, n_days=60, seed=0, end=None):
+    """{ticker: 15min DataFrame}，n_days=60 对应 Yahoo 的 60 天上限，504 约为 2 年"""
+    index = intraday_index(n_days, end)
+    return {t: ohlcv(index, seed + 1, i, vol=0.004) for i, t in enumerate(ticker_names(n_tickers))}
+
+
+class SyntheticSource:
+    """
+    data_feed.ConcurrentFeed 的替身数据源：返回截至 cursor 的合成 K 线，advance() 模拟新 K 线到来
+    """
+
+    def __init__(self, frames, start_row):
+        self.frames = frames
+        self.cursor = start_row
+
+    def advance(self, n=1):
+        self.cursor += n
+
+    def download(self, tickers, interval, period=None, start=None):
+        result = {}
+        for t in tickers:
+            df = self.frames[t].iloc[:self.cursor]
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(start)]
+            result[t] = df
+        return result
@@ -0,0 +1,117 @@
+# checkpoint.py
+# 回测模拟检查点：运行结束时把组合状态 (PositionManager、持仓的当前止损、权益曲线) 存盘，
+# 文件以 策略 + 标的 + 参数 + 代码版本 的指纹命名，文件内记录已处理的行数与这些行上模拟输入的摘要。
+# 下次运行时如果新数据的前 n 行与上次完全一致 (只是在末尾追加了 K 线)，从检查点继续，只处理新增的行；
+# 没有新行时直接返回缓存结果。历史数据被修订、阈值变化导致历史信号不同等任何不一致都会退回完整重算，
+# 因此续跑的结果与完整重算逐位相同。
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+from log_writer import ColumnarLog
+
+VERSION = 1
+# 决定模拟结果的代码：任何一个文件变化都会使旧检查点失效
+CODE_MODULES = ('engine.py', 'exit_kernel.py', 'intrabar.py', 'ledger.py', 'position_manager.py', 'log_writer.py',
+                'risk.py')
+# 不影响模拟结果的参数，不参与指纹
+IO_PARAMS = ('log_dir', 'checkpoint_dir', 'replay_chunk_rows')
+BLOCK_ROWS = 1024  # 输入摘要按行分块：续跑时已验证的块直接复用，只对新增的行计算摘要
+
+_code_version = None
+
+
+def code_version():
+    """模拟相关源码的摘要 (进程内只计算一次)"""
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in CODE_MODULES:
+            with open(os.path.join(here, name), 'rb') as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()[:32]
+    return _code_version
+
+
+def fingerprint(strategy, params, tickers):
+    """策略 + 标的 + 参数 + 代码版本"""
+    key = {k: v for k, v in params.items() if k not in IO_PARAMS}
+    payload = json.dumps([VERSION, strategy, [str(t) for t in tickers], key, code_version()], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def block_digests(panels, lo, hi, block=BLOCK_ROWS):
+    """
+    模拟输入第 lo 到 hi 行的分块摘要 (lo 须为块边界，最后一块可以不满)
+    :param panels: {名称: 第一维为时间轴的数组}，如 timeline / close / 信号掩码
+    :return: [每块的 sha256]
+    """
+    out = []
+    for a in range(lo, hi, block):
+        b = min(a + block, hi)
+        h = hashlib.sha256()
+        for name in sorted(panels):
+            part = np.ascontiguousarray(panels[name][a:b])
+            h.update(f'{name}:{part.dtype.str}:{part.shape}'.encode())
+            h.update(part.data)
+        out.append(h.hexdigest())
+    return out
+
+
+def _logs_intact(pm):
+    """分块日志写在磁盘上时，确认目录中的分块仍是检查点保存时的那些 (没有被其他运行覆盖)"""
+    for log in vars(pm).values():
+        if isinstance(log, ColumnarLog):
+            on_disk = ColumnarLog(log.path, log.schema, log.chunk_size, log.fmt, mode='a')
+            if on_disk.parts != log.parts or on_disk.flushed != log.flushed:
+                return False
+    return True
+
+
+class SimCheckpoint:
+    def __init__(self, directory, strategy, params, tickers, panels):
+        """
+        :param directory: 检查点目录 (同一组参数只保留最新一份)
+        :param panels: 本次运行的模拟输入 (见 block_digests)，需包含 'timeline'
+        """
+        self.key = fingerprint(strategy, params, tickers)
+        self.path = os.path.join(directory, f'{strategy}-{self.key}.pkl')
+        self.panels = panels
+        self.rows = len(panels['timeline'])
+        self.verified = []  # 与检查点一致的完整块的摘要
+
+    def load(self):
+        """
+        :return: (已处理的行数, 状态 dict)；没有可用的检查点时为 (0, None)
+        """
+        if not os.path.exists(self.path):
+            return 0, None
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ 检查点读取失败，完整重算: {e}")
+            return 0, None
+        done = state['rows']
+        if done > self.rows or block_digests(self.panels, 0, done) != state['blocks']:
+            print("⚠️ 检查点之后历史数据有变化，完整重算")
+            return 0, None
+        if not _logs_intact(state['pm']):
+            print("⚠️ 日志目录已被其他运行改写，完整重算")
+            return 0, None
+        self.verified = state['blocks'][:done // BLOCK_ROWS]
+        return done, state
+
+    def save(self, **state):
+        """保存本次运行结束时的状态 (先写临时文件再替换)"""
+        lo = len(self.verified) * BLOCK_ROWS
+        state.update(rows=self.rows, blocks=self.verified + block_digests(self.panels, lo, self.rows))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
@@ -0,0 +1,123 @@
+# data_feed.py
+# 并发行情拉取：线程池 + 令牌桶限流 + 多标的批量请求 + 单标的指数退避重试。
+# 数据源可替换 (任何实现 download(tickers, interval, period=None, start=None) -> {ticker: DataFrame} 的对象)，
+# 便于用本地替身数据源测试。
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from bar_store import fetch_window, normalize_download
+from ratelimit import TokenBucket
+
+
+class YahooSource:
+    """yfinance 数据源，一次请求可拉取多个标的"""
+
+    def download(self, tickers, interval, period=None, start=None):
+        import yfinance as yf  # 延迟导入
+        raw = yf.download(list(tickers), period=period, start=start, interval=interval,
+                          group_by='ticker', auto_adjust=True, progress=False, threads=False)
+        result = {}
+        if raw is None or raw.empty:
+            return result
+        if not isinstance(raw.columns, pd.MultiIndex):
+            return {tickers[0]: normalize_download(raw)} if len(tickers) == 1 else result
+        present = set(raw.columns.get_level_values(0))
+        for t in tickers:
+            if t in present:
+                result[t] = normalize_download(raw[t].dropna(how='all'))
+        return result
+
+
+class ConcurrentFeed:
+    def __init__(self, source=None, store=None, max_workers=8, rate=2.0, burst=4,
+                 batch_size=20, retries=3, backoff=1.0, metrics=None):
+        """
+        :param source: 数据源，默认 YahooSource
+        :param store: 可选 BarStore，拉取结果先增量写入本地仓库，且只请求仓库中缺失的部分
+        :param rate / burst: 令牌桶参数 (每秒请求数 / 突发请求数)
+        :param batch_size: 单次批量请求的标的数量
+        :param retries: 单标的失败后的重试次数，等待时间按 backoff * 2^n 加随机抖动递增
+        :param metrics: 可选 metrics.Metrics，记录限流等待 (rate_wait) 与请求 (download) 耗时
+        """
+        self.source = source or YahooSource()
+        self.store = store
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate, burst)
+        self.batch_size = max(1, batch_size)
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = metrics
+
+    def _download(self, tickers, interval, period, start):
+        t0 = time.perf_counter()
+        self.bucket.acquire()
+        t1 = time.perf_counter()
+        try:
+            return self.source.download(tickers, interval, period=period, start=start)
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('stage_seconds', t1 - t0, stage='rate_wait')
+                self.metrics.observe('stage_seconds', time.perf_counter() - t1, stage='download')
+
+    def _window(self, tickers, interval, period):
+        """
+        请求范围 (period, start)：仓库中已有全部标的的数据时，从最早的最后一根之前 OVERLAP 天开始补齐
+        (重叠部分用于复权校验，且不早于数据源的回溯窗口)，否则按 period 全量拉取
+        """
+        if self.store is None:
+            return period, None
+        lasts = [self.store.last_timestamp(t, interval) for t in tickers]
+        if any(last is None for last in lasts):
+            return period, None
+        return fetch_window(min(lasts), interval, period)
+
+    def _fetch_batch(self, batch, interval, period, tail):
+        try:
+            got = self._download(batch, interval, *self._window(batch, interval, period))
+        except Exception as e:
+            print(f"⚠️ 批量请求失败 {batch}: {e}")
+            got = {}
+
+        results = {}
+        for t in batch:
+            df = got.get(t)
+            attempt = 0
+            # 批量结果中缺失或为空的标的单独重试
+            while (df is None or df.empty) and attempt < self.retries:
+                time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+                attempt += 1
+                try:
+                    df = self._download([t], interval, *self._window([t], interval, period)).get(t)
+                except Exception as e:
+                    print(f"⚠️ {t} 第 {attempt} 次重试失败: {e}")
+                    df = None
+            if df is None or df.empty:
+                # 重试后仍没有拿到数据：产出 None 由调用方计为失败，不用仓库中的旧 K 线冒充本轮结果
+                results[t] = None
+                continue
+            if self.store is not None:
+                self.store.append(t, interval, df)
+                df = self.store.load(t, interval, tail=tail)
+            results[t] = df
+        return results
+
+    def scan(self, tickers, interval, period, tail=None):
+        """
+        并发拉取整个关注列表，按到达顺序逐个产出 (ticker, DataFrame)；失败的标的产出 (ticker, None)
+        调用方可以在其余批次仍在下载时立即开始计算指标
+        :param tail: 配合 store 使用，只从仓库读回最后 N 根 K 线
+        """
+        batches = [tickers[k:k + self.batch_size] for k in range(0, len(tickers), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._fetch_batch, b, interval, period, tail): b for b in batches}
+            for fut in as_completed(futures):
+                try:
+                    results = fut.result()
+                except Exception as e:
+                    print(f"❌ 批次 {futures[fut]} 异常: {e}")
+                    results = {t: None for t in futures[fut]}
+                for t, df in results.items():
+                    yield t, df
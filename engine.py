@@ -0,0 +1,529 @@
+# engine.py
+# 回测模拟引擎：把两套策略的主循环从脚本中抽出来，输入为扁平的 {名称: np.ndarray} 数组字典，
+# 参数全部通过 params 传入。同一份数组可以被参数扫描的多个进程通过共享内存复用。
+# 数组为 panel.Panel.to_arrays() 的格式：'timeline' (int64 纳秒，所有标的时间戳的并集)、'tickers' (列顺序)、
+# 'valid' (T × N 掩码)，其余字段均为 T × N 数组；日线 EMA 为 'ema/{周期}' (日线) / 'daily_ema/{周期}' (15min，已 as-of 对齐)。
+# "前一根 K 线" 均取该标的自己序列的前一根，而不是统一时间轴上的前一行。
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from checkpoint import SimCheckpoint
+from exit_kernel import trailing_stop_exits
+from indicators import ema
+from intrabar import CHUNK_ROWS, replay_stop_exits
+from ledger import build_equity
+from log_writer import ColumnarLog
+from panel import Panel
+from resampler import Resampler, asof_positions
+from position_manager import PositionManager, ArrayPositionManager
+from risk import CorrelationGuard, RollingCorrelation
+from threshold_optimizer import ThresholdOptimizer
+
+# 15min 策略 (backtest.py) 默认参数
+INTRADAY_DEFAULTS = {
+    'ema_period': 150,       # 日线趋势 EMA
+    'rsi_buy_level': 40,     # 自适应阈值的保底值
+    'percentile': 20,        # 自适应阈值取 RSI 分布的低位百分比
+    'atr_multiplier': 4,     # 追踪止损 ATR 倍数
+    'intrabar_exits': False, # True: 盘中 Low 触及止损即按止损价离场 (否则只看收盘价)
+    'minute_store': None,    # 1 分钟 K 线仓库目录 (BarStore)；设置后隐含 intrabar_exits，触发 K 线内按分钟回放离场时刻与成交价
+    'bar_interval': '15min', # 策略 K 线周期 (分钟回放的窗口长度)
+    'replay_chunk_rows': CHUNK_ROWS,  # 分钟数据每次读入内存的行数
+    'threshold_mode': 'static',  # static: 全样本分位数; rolling / expanding: 逐 bar walk-forward 分位数
+    'threshold_window': 1000,    # rolling 模式的回看 K 线数量
+    'initial_cash': 100000,
+    'num_slots': None,       # None 表示每个标的一个坑位
+    'portfolio': 'dict',     # dict: PositionManager; array: ArrayPositionManager (大股票池)
+    'log_dir': None,         # 信号 / 成交日志写入该目录下的分块列式文件；None 表示保存在内存中
+    'checkpoint_dir': None,  # 检查点目录：数据只在末尾追加时从上次结束处续跑 (None 表示不使用)
+    'max_corr': None,        # 与任一持仓的滚动收益率相关系数 >= 该值时拒绝入场 (None 表示不限制)
+    'soft_corr': None,       # 相关系数在 [soft_corr, max_corr) 之间时线性缩减仓位，最低缩至 min_scale
+    'min_scale': 0.5,
+    'corr_window': 100,      # 滚动相关窗口 (K 线数)，每根 K 线增量更新
+    'corr_min_periods': 20,  # 成对样本少于该数量时不做相关性限制
+}
+
+# 日线策略 (backtest_d.py) 默认参数
+DAILY_DEFAULTS = {
+    'ema_period': 150,
+    'base_level': 35,
+    'percentile': 20,
+    'amnesty_level': 25,     # 特赦入场 RSI 阈值
+    'amnesty_stop': 2.0,     # 特赦入场初始止损 ATR 倍数
+    'trend_stop': 3.5,       # 趋势入场初始止损 ATR 倍数
+    'threshold_mode': 'static',
+    'threshold_window': 250,
+    'initial_cash': 100000,
+    'num_slots': None,
+    'portfolio': 'dict',
+    'log_dir': None,
+    'checkpoint_dir': None,
+    'max_corr': None,
+    'soft_corr': None,
+    'min_scale': 0.5,
+    'corr_window': 60,
+    'corr_min_periods': 20,
+    'warmup': 200,           # 跳过时间轴前 N 行 (指标预热期)
+}
+
+
+def timeline(arrays, start=0):
+    """数组字典中的统一时间轴 (DatetimeIndex)"""
+    return pd.DatetimeIndex(arrays['timeline'][start:].view('datetime64[ns]'))
+
+def _shift(a):
+    """等价于 Series.shift(1)"""
+    return np.concatenate(([np.nan], a[:-1])) if len(a) else a.astype(float)
+
+def _bar_frame(df):
+    """单个标的自己序列上的基础字段 (前一根 K 线在对齐前计算)"""
+    rsi = df['RSI'].to_numpy(dtype=float)
+    high = df['High'].to_numpy(dtype=float)
+    return pd.DataFrame({
+        'open': df['Open'].to_numpy(dtype=float),
+        'close': df['Close'].to_numpy(dtype=float),
+        'high': high,
+        'low': df['Low'].to_numpy(dtype=float),
+        'rsi': rsi,
+        'atr': df['ATR'].to_numpy(dtype=float),
+        'prev_rsi': _shift(rsi),
+        'prev_high': _shift(high),
+    }, index=df.index)
+
+
+# ================= 数组准备 =================
+def intraday_arrays(daily, intraday, timeline=None, ema_periods=(150,)):
+    """
+    15min 策略所需数组
+    :param daily / intraday: {ticker: DataFrame}，intraday 需含 RSI / ATR 列；daily 为 None 时由 intraday 重采样得到
+    :param timeline: 回测时间轴，默认为所有标的 15min 时间戳的并集
+    :param ema_periods: 需要预计算的日线 EMA 周期
+    """
+    frames = {}
+    for t, i in intraday.items():
+        f = _bar_frame(i)
+        if daily is None:
+            # 由 15min 增量合成日线：只含已完成的日线，EMA 在合成时一并计算
+            resampler = Resampler('1d', ema_periods)
+            pos = resampler.batch(i)
+            d = resampler.frame()
+        else:
+            d = daily[t]
+            # 日线按时间 as-of 对齐：只使用当天之前已收盘的日线 (-1 表示没有)，盘中看不到当天收盘后的 EMA
+            pos = asof_positions(i.index, d.index, '1d')
+        has_daily = pos >= 0
+        f['has_daily'] = has_daily.astype(float)
+        for p in ema_periods:
+            ema_d = (d[f'EMA_{int(p)}'] if daily is None else ema(d['Close'], p)).to_numpy(dtype=float)
+            col = np.full(len(i), np.nan)
+            col[has_daily] = ema_d[pos[has_daily]]
+            f[f'daily_ema/{int(p)}'] = col
+        frames[t] = f
+    return Panel.from_frames(frames, index=timeline).to_arrays()
+
+def daily_arrays(data, timeline=None, ema_periods=(150,)):
+    """
+    日线策略所需数组，data 为 {ticker: DataFrame}，需含 RSI / ATR 列
+    :param timeline: 默认为所有标的日线的并集；预热期由 params['warmup'] 跳过，分位数阈值仍使用完整历史
+    """
+    frames = {}
+    for t, df in data.items():
+        f = _bar_frame(df)
+        for p in ema_periods:
+            f[f'ema/{int(p)}'] = ema(df['Close'], p).to_numpy(dtype=float)
+        frames[t] = f
+    return Panel.from_frames(frames, index=timeline).to_arrays()
+
+def _columns(arrays, tickers):
+    """tickers 在面板中的列号"""
+    names = {str(t): j for j, t in enumerate(arrays['tickers'])}
+    missing = [t for t in tickers if t not in names]
+    if missing:
+        raise KeyError(f"面板中没有这些标的: {missing}")
+    return np.array([names[t] for t in tickers], dtype=np.intp)
+
+def _take(arrays, name, cols):
+    """按 tickers 顺序取列；顺序与面板一致时直接返回视图，不复制"""
+    a = arrays[name]
+    if len(cols) == a.shape[1] and np.array_equal(cols, np.arange(a.shape[1])):
+        return a
+    return a[:, cols]
+
+def adaptive_thresholds(arrays, tickers, base_level=35, percentile=20, mode='static', window=None):
+    """
+    每个标的的自适应 RSI 阈值 (只用该标的自己的 K 线)
+    :param mode: static 返回标量；rolling / expanding 返回与该标的自身 K 线逐位对齐的阈值数组
+    """
+    cols = _columns(arrays, tickers)
+    valid, rsi = arrays['valid'], arrays['rsi']
+    frames = {t: pd.DataFrame({'RSI': rsi[valid[:, j], j]}) for t, j in zip(tickers, cols)}
+    if mode == 'static':
+        return {t: ThresholdOptimizer.get_adaptive_threshold(frames[t], base_level=base_level, percentile=percentile)
+                for t in tickers}
+    rolling = ThresholdOptimizer.get_rolling_thresholds(frames, window=window if mode == 'rolling' else None,
+                                                        base_level=base_level, percentile=percentile)
+    return {t: rolling[t].to_numpy() for t in tickers}
+
+def _thresholds(arrays, tickers, p, base_level):
+    """阈值对齐到面板：static 为 (N,) 向量，rolling / expanding 为 T × N 数组"""
+    thresholds = adaptive_thresholds(arrays, tickers, base_level, p['percentile'], p['threshold_mode'], p['threshold_window'])
+    return _threshold_panel(arrays, tickers, thresholds)
+
+def _threshold_panel(arrays, tickers, thresholds):
+    if all(np.ndim(thresholds[t]) == 0 for t in tickers):
+        return np.array([thresholds[t] for t in tickers], dtype=float)
+    cols = _columns(arrays, tickers)
+    valid = arrays['valid']
+    out = np.full((len(arrays['timeline']), len(tickers)), np.nan)
+    for n, (t, j) in enumerate(zip(tickers, cols)):
+        out[valid[:, j], n] = thresholds[t]
+    return out
+
+def _portfolio(p, tickers):
+    slots = p['num_slots'] or len(tickers)
+    risk = None
+    if p['max_corr'] is not None or p['soft_corr'] is not None:
+        tracker = RollingCorrelation(tickers, p['corr_window'], p['corr_min_periods'])
+        risk = CorrelationGuard(tracker, p['max_corr'], p['soft_corr'], p['min_scale'])
+    if p['portfolio'] == 'array':
+        return ArrayPositionManager(p['initial_cash'], num_slots=slots, tickers=tickers, log_dir=p['log_dir'], risk=risk)
+    return PositionManager(p['initial_cash'], num_slots=slots, log_dir=p['log_dir'], risk=risk)
+
+def _feed_risk(pm, close, valid, k):
+    """把第 k 行 (含) 及之前尚未输入的收盘价逐行喂给相关性跟踪器 (未启用时无操作)"""
+    if pm.risk is None:
+        return
+    tracker = pm.risk.tracker
+    for r in range(tracker.rows_seen, k + 1):
+        tracker.update(np.where(valid[r], close[r], np.nan))
+
+def _resume(p, strategy, tickers, panels):
+    """检查点 (params['checkpoint_dir'])：返回 (SimCheckpoint 或 None, 已处理的行数, 状态 或 None)"""
+    if not p['checkpoint_dir']:
+        return None, 0, None
+    ckpt = SimCheckpoint(p['checkpoint_dir'], strategy, p, tickers, panels)
+    done, state = ckpt.load()
+    return ckpt, done, state
+
+def _candidates(hits):
+    """{时间轴行号: {出现候选信号的列号}}"""
+    candidates_at = {}
+    for k, n in zip(*np.nonzero(hits)):
+        candidates_at.setdefault(int(k), set()).add(int(n))
+    return candidates_at
+
+
+# ================= 15min 策略 =================
+def build_entry_signals(arrays, tickers, ema_period, threshold):
+    """
+    一次性用 T × N 数组运算构建所有标的的入场信号，替代逐 bar 的 shift / 日线扫描
+    :param threshold: (N,) 或 T × N 阈值
+    :return: dict，所有数组的列顺序与 tickers 一致
+    """
+    cols = _columns(arrays, tickers)
+    close = _take(arrays, 'close', cols)
+    rsi = _take(arrays, 'rsi', cols)
+    daily_ema = _take(arrays, f'daily_ema/{int(ema_period)}', cols)
+
+    # 第一层：RSI 上穿阈值 (NaN 比较结果为 False，与逐 bar 判断一致)
+    rsi_cross = (_take(arrays, 'prev_rsi', cols) < threshold) & (rsi >= threshold)
+
+    return {
+        'valid': _take(arrays, 'valid', cols),
+        'close': close,
+        'rsi': rsi,
+        'atr': _take(arrays, 'atr', cols),
+        'daily_ema': daily_ema,
+        # 只有存在日线数据的穿越才会进入信号审计
+        'candidate': rsi_cross & (_take(arrays, 'has_daily', cols) > 0) & _take(arrays, 'valid', cols),
+        'trend_ok': close > daily_ema,
+        'breakout': close > _take(arrays, 'prev_high', cols),  # 第三层：突破前一根 K 线高点
+    }
+
+def simulate_intraday(arrays, tickers, params=None, thresholds=None):
+    """
+    15min 多股资金管理回测
+    :param thresholds: adaptive_thresholds 的结果，默认按 params 计算
+    :return: (PositionManager, equity_curve)
+    """
+    p = dict(INTRADAY_DEFAULTS, **(params or {}))
+    if thresholds is None:
+        thr = _thresholds(arrays, tickers, p, p['rsi_buy_level'])
+    else:
+        thr = _threshold_panel(arrays, tickers, thresholds)
+    k_atr = p['atr_multiplier']
+
+    sig = build_entry_signals(arrays, tickers, p['ema_period'], thr)
+    valid, close, rsi, atr = sig['valid'], sig['close'], sig['rsi'], sig['atr']
+    daily_ema, trend_ok, breakout = sig['daily_ema'], sig['trend_ok'], sig['breakout']
+    cols = _columns(arrays, tickers)
+    low, open_ = _take(arrays, 'low', cols), _take(arrays, 'open', cols)
+
+    # 检查点：模拟输入的前 done 行与上次运行一致时，从上次结束处继续，只处理新增的行
+    ckpt, done, state = _resume(p, 'intraday', tickers, dict(sig, low=low, open=open_, timeline=arrays['timeline']))
+    if state is not None and done == ckpt.rows:
+        return state['pm'], state['equity_curve']  # 没有新 K 线：直接返回缓存结果
+    pm = state['pm'] if state is not None else _portfolio(p, tickers)
+    held = state['open_stops'] if state is not None else {}  # 检查点时仍持仓的列号 -> 当前止损
+    candidate = sig['candidate'].copy()
+    candidate[:done] = False
+    candidates_at = _candidates(candidate)
+
+    # 追踪止损只取决于入场点之后该标的自身的价格路径：对所有可能的入场一次性算出离场行号与离场价
+    er, en = np.nonzero(candidate & trend_ok & breakout)
+    stops = close[er, en] - atr[er, en] * k_atr
+    # 检查点时仍持仓的标的：从已处理的最后一行、以当时的止损继续推进
+    hn = np.array(sorted(held), dtype=en.dtype)
+    er = np.concatenate((er, np.full(len(hn), done - 1, dtype=er.dtype)))
+    en = np.concatenate((en, hn))
+    stops = np.concatenate((stops, np.array([held[n] for n in hn], dtype=float)))
+    exit_row, exit_price, exit_stop, by_low = trailing_stop_exits(
+        close, atr, er, stops, k_atr, en, low=low, open_=open_,
+        intrabar=p['intrabar_exits'] or p['minute_store'] is not None, with_kind=True)
+    exit_time = np.full(len(er), -1, dtype=np.int64)  # 分钟级离场时刻，-1 表示按离场 K 线的时间
+    if p['minute_store'] is not None:
+        # 盘中触发的止损在该 K 线内按 1 分钟数据回放 (没有分钟数据的 K 线保留原近似)
+        hit = np.flatnonzero(by_low)
+        hit_ts, fill = replay_stop_exits(p['minute_store'], tickers, arrays['timeline'], exit_row[hit], en[hit],
+                                         exit_stop[hit], p['bar_interval'], chunk_rows=p['replay_chunk_rows'])
+        ok = hit_ts >= 0
+        exit_time[hit[ok]] = hit_ts[ok]
+        exit_price[hit[ok]] = fill[ok]
+    exit_of = {(int(a), int(b)): (int(r), x, int(ts), stop)
+               for a, b, r, x, ts, stop in zip(er, en, exit_row, exit_price, exit_time, exit_stop)}
+    pending_exit = {int(n): exit_of[(done - 1, int(n))] for n in hn}  # 持仓列号 -> (离场行号, 离场价, 分钟级离场时刻, 止损)
+
+    # 只访问有事件的行：出现候选信号的行 + 持仓的预定离场行 (权益曲线事后由账本重建)
+    tl = timeline(arrays)
+    rows = sorted(candidates_at) + [r for r, _, _, _ in pending_exit.values() if r >= 0]
+    heapq.heapify(rows)
+    last = -1
+    while rows:
+        k = heapq.heappop(rows)
+        if k == last: continue
+        last = k
+        t_point = tl[k]
+        _feed_risk(pm, close, valid, k)  # 相关矩阵只用到当根收盘为止的数据
+        # 只访问当根离场的持仓与出现候选信号的标的，保持 tickers 原有顺序
+        visit = {n for n, (r, _, _, _) in pending_exit.items() if r == k} | candidates_at.get(k, set())
+
+        for n in sorted(visit):
+            if not valid[k, n]: continue
+
+            t = tickers[n]
+            price = close[k, n]
+
+            # --- 1. 持仓管理 (止损/追踪，离场点已由 exit_kernel 预先算出) ---
+            if t in pm.positions:
+                if pending_exit[n][0] == k:
+                    _, exit_px, exit_ns, _ = pending_exit.pop(n)
+                    pm.close(t, exit_px, t_point if exit_ns < 0 else pd.Timestamp(exit_ns))
+
+            # --- 2. 信号扫描 (此处必为 RSI 上穿阈值的候选 bar) ---
+            else:
+                pm.signal_log.append({
+                    'Time': t_point,
+                    'Ticker': t,
+                    'Price': round(price, 2),
+                    'Daily_EMA': round(daily_ema[k, n], 2),
+                    'RSI': round(rsi[k, n], 2),
+                    'Trend_OK': trend_ok[k, n],
+                    'Slot_Available': pm.can_open(t)
+                })
+                # 第二层：日线趋势过滤；第三层：突破前高确认
+                if trend_ok[k, n] and breakout[k, n] and pm.can_open(t):
+                    if pm.open(t, price, price - (atr[k, n] * k_atr), t_point):
+                        pending_exit[n] = exit_of[(k, n)]
+                        if pending_exit[n][0] >= 0:
+                            heapq.heappush(rows, pending_exit[n][0])
+
+    # 剩下的都是到数据结尾仍未离场的持仓：写回 exit_kernel 推进到最后一行的追踪止损
+    for n, (r, _, _, stop) in pending_exit.items():
+        if r < 0:
+            pm.update_trailing_stop(tickers[n], stop)
+    _feed_risk(pm, close, valid, len(tl) - 1)  # 推进到数据结尾，检查点续跑时从下一行接着更新
+    pm.flush_logs()
+    equity_curve = equity_ledger(pm, arrays, tickers, p['initial_cash'])['equity'].to_numpy()
+    if ckpt is not None:
+        # 记录未离场持仓的当前止损供下次续跑
+        ckpt.save(pm=pm, equity_curve=equity_curve, open_stops={n: e[3] for n, e in pending_exit.items()})
+    return pm, equity_curve
+
+
+# ================= 日线策略 =================
+def simulate_daily(arrays, tickers, params=None, thresholds=None, verbose=False):
+    """
+    日线趋势 + 特赦入场回测，从时间轴第 params['warmup'] 行开始
+    :return: (PositionManager, equity_curve, 最后一个交易日的价格快照)
+    """
+    p = dict(DAILY_DEFAULTS, **(params or {}))
+    if thresholds is None:
+        thr = _thresholds(arrays, tickers, p, p['base_level'])
+    else:
+        thr = _threshold_panel(arrays, tickers, thresholds)
+    start = p['warmup']
+
+    cols = _columns(arrays, tickers)
+    valid = _take(arrays, 'valid', cols)
+    close, atr = _take(arrays, 'close', cols), _take(arrays, 'atr', cols)
+    rsi, prev_rsi = _take(arrays, 'rsi', cols), _take(arrays, 'prev_rsi', cols)
+    # 路径 A: 标准趋势入场 (EMA 支撑 + RSI 上穿阈值)
+    trend = (close > _take(arrays, f'ema/{int(p["ema_period"])}', cols)) & (prev_rsi < thr) & (rsi >= thr)
+    # 路径 B: 特赦入场 (RSI 曾跌破特赦线，且收复前日高点，不看均线)
+    amnesty = (prev_rsi < p['amnesty_level']) & (close > _take(arrays, 'prev_high', cols))
+    hits = (trend | amnesty) & valid
+    hits[:start] = False
+    last = len(arrays['timeline']) - 1
+    prices_snapshot = {t: close[last, n] for n, t in enumerate(tickers) if last >= start and valid[last, n]}
+
+    # 检查点：模拟输入的前 done 行与上次运行一致时只处理新增的行，没有新行时直接返回缓存结果
+    ckpt, done, state = _resume(p, 'daily', tickers, {'timeline': arrays['timeline'], 'valid': valid, 'close': close,
+                                                      'atr': atr, 'hits': hits, 'amnesty': amnesty})
+    if state is not None and done == ckpt.rows:
+        return state['pm'], state['equity_curve'], prices_snapshot
+    pm = state['pm'] if state is not None else _portfolio(p, tickers)
+    new_hits = hits.copy()
+    new_hits[:done] = False
+    candidates_at = _candidates(new_hits)
+
+    tl = timeline(arrays)
+    for k in sorted(candidates_at):
+        t_now = tl[k]
+        _feed_risk(pm, close, valid, k)
+        for n in sorted(candidates_at[k]):
+            t = tickers[n]
+            if not pm.can_open(t):
+                continue
+            # 特赦入场是逆势交易，使用更窄的止损
+            multiplier = p['amnesty_stop'] if amnesty[k, n] else p['trend_stop']
+            pm.open(t, close[k, n], close[k, n] - (atr[k, n] * multiplier), t_now)
+            if amnesty[k, n] and verbose:
+                print(f"🚑 {t} 触发特赦入场 (RSI < {p['amnesty_level']}) | 时间: {t_now.date()}")
+
+    _feed_risk(pm, close, valid, len(tl) - 1)
+    pm.flush_logs()
+    equity_curve = equity_ledger(pm, arrays, tickers, p['initial_cash'], start)['equity'].to_numpy()
+    if ckpt is not None:
+        ckpt.save(pm=pm, equity_curve=equity_curve)
+    return pm, equity_curve, prices_snapshot
+
+
+# ================= 权益账本 =================
+def equity_ledger(pm, arrays, tickers, initial_cash, start=0):
+    """
+    由 pm.ledger 的持仓区间在收盘价面板上重建逐 bar 账本 (缺失 K 线按前向填充价格估值)
+    :return: DataFrame[equity, cash, market_value, exposure, drawdown]，索引为时间轴第 start 行起
+             可用 ledger.resample_equity 降采样到日线等任意周期
+    """
+    cols = _columns(arrays, tickers)
+    return build_equity(pm.ledger, timeline(arrays, start), tickers,
+                        _take(arrays, 'close', cols)[start:], _take(arrays, 'valid', cols)[start:], initial_cash)
+
+
+# ================= 绩效汇总 =================
+def summarize(pm, equity_curve, initial_cash):
+    """收益 / 最大回撤 / 入场次数 / 胜率"""
+    eq = np.asarray(equity_curve, dtype=float)
+    final = eq[-1] if len(eq) else float(initial_cash)
+    drawdown = (eq / np.maximum.accumulate(eq) - 1).min() if len(eq) else 0.0
+    pnl = pm.closed_pnl()
+    return {
+        'total_return': float(final / initial_cash - 1),
+        'max_drawdown': float(drawdown),
+        'trades': pm.n_trades + len(pm.positions),
+        'closed_trades': len(pnl),
+        'win_rate': float((pnl > 0).mean()) if len(pnl) else np.nan,
+        'final_equity': float(final),
+    }
+
+
+def signal_breakdown(signal_log):
+    """
+    信号拦截统计 (日志可为内存列表或 ColumnarLog，后者逐块查询)
+    :return: {'total': 总信号数, 'trend_blocked': 趋势不符, 'slot_blocked': 趋势符合但坑位不足}
+    """
+    trend = lambda df: ~df['Trend_OK'].astype(bool)
+    slot = lambda df: df['Trend_OK'].astype(bool) & ~df['Slot_Available'].astype(bool)
+    if isinstance(signal_log, ColumnarLog):
+        flags = ['Trend_OK', 'Slot_Available']
+        return {'total': len(signal_log),
+                'trend_blocked': signal_log.count(trend, columns=flags),
+                'slot_blocked': signal_log.count(slot, columns=flags)}
+    df = pd.DataFrame(list(signal_log))
+    if df.empty:
+        return {'total': 0, 'trend_blocked': 0, 'slot_blocked': 0}
+    return {'total': len(df), 'trend_blocked': int(trend(df).sum()), 'slot_blocked': int(slot(df).sum())}
+
+
+def _records_frame(log, where=None):
+    """
+    成交 / 信号日志转 DataFrame
+    :param where: 可选过滤条件 predicate(df) -> bool Series (ColumnarLog 逐块过滤)
+    """
+    if isinstance(log, ColumnarLog):
+        return log.read() if where is None else log.filter(where)
+    df = pd.DataFrame(list(log))
+    return df if where is None or df.empty else df[where(df)].reset_index(drop=True)
+
+
+# ================= 回测结果 =================
+class BacktestResult:
+    """backtest.run_backtest / backtest_d.run_daily_backtest 的返回值，绩效与账本按需计算"""
+
+    def __init__(self, strategy, pm, equity_curve, arrays, tickers, params, start=0,
+                 thresholds=None, prices_snapshot=None):
+        self.strategy = strategy
+        self.pm = pm
+        self.equity_curve = np.asarray(equity_curve, dtype=float)
+        self.arrays = arrays
+        self.tickers = list(tickers)
+        self.params = params
+        self.start = start
+        self.thresholds = thresholds
+        self.prices_snapshot = prices_snapshot
+        self._stats = None
+        self._ledger = None
+
+    @property
+    def timeline(self):
+        return timeline(self.arrays, self.start)
+
+    @property
+    def final_equity(self):
+        return float(self.equity_curve[-1]) if len(self.equity_curve) else float(self.params['initial_cash'])
+
+    @property
+    def stats(self):
+        """summarize 的结果: total_return / max_drawdown / trades / closed_trades / win_rate / final_equity"""
+        if self._stats is None:
+            self._stats = summarize(self.pm, self.equity_curve, self.params['initial_cash'])
+        return self._stats
+
+    @property
+    def ledger(self):
+        """逐 bar 账本 DataFrame[equity, cash, market_value, exposure, drawdown]"""
+        if self._ledger is None:
+            self._ledger = equity_ledger(self.pm, self.arrays, self.tickers, self.params['initial_cash'], self.start)
+        return self._ledger
+
+    def trades(self, where=None):
+        return _records_frame(self.pm.closed_trades, where)
+
+    def signals(self, where=None):
+        return _records_frame(self.pm.signal_log, where)
+
+    def last_prices(self):
+        """每个标的最后一根有效 K 线的收盘价"""
+        cols = _columns(self.arrays, self.tickers)
+        close, valid = _take(self.arrays, 'close', cols), _take(self.arrays, 'valid', cols)
+        return {t: close[valid[:, n], n][-1] for n, t in enumerate(self.tickers) if valid[:, n].any()}
+
+    def signal_breakdown(self):
+        return signal_breakdown(self.pm.signal_log)
+
+    def __repr__(self):
+        return (f"BacktestResult({self.strategy}, final_equity={self.final_equity:.2f}, "
+                f"trades={self.pm.n_trades}, open={len(self.pm.positions)})")
+
@@ -0,0 +1,160 @@
+# exit_kernel.py
+# 追踪止损离场内核：给定一批入场 (入场行号 / 列号 / 初始止损) 和 Close / ATR 数组，一次性算出每笔的离场行号与离场价。
+# 规则与回测主循环一致：入场后的每根 K 线先把止损上移到 max(止损, Close - ATR × k)，再以 Close <= 止损离场；
+# 可选盘中离场：当根 Low 触及上一根结束时的止损即按止损价离场 (若开盘已跳空低于止损则按开盘价)。
+# NaN 语义与 PositionManager.update_trailing_stop 中的 Python max 相同：NaN 候选值不更新止损 (无 K 线的行自然跳过)，
+# 初始止损为 NaN 则止损永远为 NaN，不会离场。
+# 安装了 numba 时使用编译版逐笔循环，否则使用按窗口批量推进的 numpy 版本，两者结果相同。
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba 为可选依赖
+    numba = None
+
+MAX_WINDOW = 4096
+BATCH_ELEMENTS = 262_144  # numpy 版本每批最多推进 入场数 × 窗口长度 个元素 (每个临时数组约 2MB)
+
+
+def _as_2d(a):
+    a = np.asarray(a, dtype=float)
+    return a[:, None] if a.ndim == 1 else a
+
+
+def _loop(close, atr, low, open_, rows, cols, stops, k, intrabar, exit_row, exit_price, final_stop, by_low):
+    """逐笔逐 bar 的参考实现 (numba 编译后即为快速路径)"""
+    T = close.shape[0]
+    for n in range(rows.shape[0]):
+        j = cols[n]
+        stop = stops[n]
+        exit_row[n] = -1
+        exit_price[n] = np.nan
+        by_low[n] = False
+        for r in range(rows[n] + 1, T):
+            if intrabar and low[r, j] <= stop:
+                exit_row[n] = r
+                exit_price[n] = open_[r, j] if open_[r, j] < stop else stop
+                by_low[n] = True
+                break
+            cand = close[r, j] - atr[r, j] * k
+            if cand > stop:
+                stop = cand
+            if close[r, j] <= stop:
+                exit_row[n] = r
+                exit_price[n] = close[r, j]
+                break
+        final_stop[n] = stop
+
+
+_loop_compiled = numba.njit(cache=True, nogil=True)(_loop) if numba is not None else None
+
+
+def _advance(close, atr, low, open_, cols, k, intrabar, pending, w, start, exit_row, exit_price, final_stop, by_low):
+    """把 pending 中的入场各推进一个长度为 w 的窗口，就地写入离场结果，返回仍未离场的入场"""
+    T = close.shape[0]
+    r = start[pending, None] + np.arange(w)
+    inside = r < T
+    r = np.minimum(r, T - 1)
+    c = cols[pending, None]
+    px = np.where(inside, close[r, c], np.nan)
+    cand = px - atr[r, c] * k
+    # 运行中的止损: fmax 忽略 NaN 候选值，与 Python max(stop, NaN) == stop 一致
+    path = np.fmax.accumulate(np.concatenate((final_stop[pending, None], cand), axis=1), axis=1)
+    prev, path = path[:, :-1], path[:, 1:]
+    hit_close = px <= path
+    hit = hit_close
+    if intrabar:
+        hit_low = inside & (low[r, c] <= prev)
+        hit = hit_low | hit_close
+    any_hit = hit.any(axis=1)
+    first = hit.argmax(axis=1)
+
+    done = pending[any_hit]
+    f = first[any_hit]
+    exit_row[done] = start[done] + f
+    rows_idx = np.arange(len(pending))[any_hit]
+    price = px[rows_idx, f]
+    stop_at = path[rows_idx, f]
+    if intrabar:
+        low_hit = hit_low[rows_idx, f]
+        level = prev[rows_idx, f]
+        gap_open = open_[r[rows_idx, f], c[rows_idx, 0]]
+        price = np.where(low_hit, np.where(gap_open < level, gap_open, level), price)
+        stop_at = np.where(low_hit, level, stop_at)
+        by_low[done] = low_hit
+    exit_price[done] = price
+    final_stop[done] = stop_at
+
+    still = pending[~any_hit]
+    final_stop[still] = path[~any_hit, -1]
+    start[still] += w
+    return still[start[still] < T]
+
+
+def _windowed(close, atr, low, open_, rows, cols, stops, k, intrabar, window=64, budget=BATCH_ELEMENTS):
+    """
+    numpy 版本：所有未离场的入场按窗口推进，窗口长度逐轮翻倍
+    每轮按 入场数 × 窗口长度 <= budget 分批推进，峰值内存与入场数量无关
+    """
+    T = close.shape[0]
+    E = len(rows)
+    exit_row = np.full(E, -1, dtype=np.int64)
+    exit_price = np.full(E, np.nan)
+    final_stop = stops.astype(float).copy()
+    by_low = np.zeros(E, dtype=bool)
+
+    start = rows + 1
+    # 初始止损为 NaN 时止损永远为 NaN，不会离场
+    pending = np.flatnonzero(~np.isnan(final_stop) & (start < T))
+    w = window
+    while pending.size:
+        batch = max(1, budget // w)
+        pending = np.concatenate([
+            _advance(close, atr, low, open_, cols, k, intrabar, pending[a:a + batch], w, start,
+                     exit_row, exit_price, final_stop, by_low)
+            for a in range(0, len(pending), batch)])
+        w = min(w * 2, MAX_WINDOW)
+    return exit_row, exit_price, final_stop, by_low
+
+
+def trailing_stop_exits(close, atr, entry_rows, entry_stops, multiplier, entry_cols=None,
+                        low=None, open_=None, intrabar=False, use_numba=None, with_kind=False):
+    """
+    批量计算追踪止损离场
+    :param close / atr: 单个标的的 1-D 数组，或 时间 × 标的 的 2-D 面板 (无 K 线处为 NaN)
+    :param entry_rows: 每笔入场所在行 (当行不更新止损，从下一行开始)
+    :param entry_stops: 每笔的初始止损
+    :param multiplier: ATR 倍数 k
+    :param entry_cols: 2-D 面板时每笔所在列
+    :param low / open_: intrabar=True 时需要 (open_ 可省略，省略时触及止损一律按止损价成交)
+    :param use_numba: None 表示安装了 numba 就用
+    :param with_kind: True 时额外返回 by_low 掩码 (盘中 Low 触及止损离场，此时止损即为该 K 线内生效的止损价)
+    :return: (离场行号 (-1 表示到数据结尾仍未离场), 离场价 (未离场为 NaN), 离场时 / 数据结尾时的止损[, by_low])
+    """
+    close, atr = _as_2d(close), _as_2d(atr)
+    rows = np.asarray(entry_rows, dtype=np.int64)
+    cols = np.zeros(len(rows), dtype=np.int64) if entry_cols is None else np.asarray(entry_cols, dtype=np.int64)
+    stops = np.asarray(entry_stops, dtype=float)
+    if intrabar:
+        if low is None:
+            raise ValueError("intrabar=True 需要 low 数组")
+        low = _as_2d(low)
+        open_ = np.full_like(low, np.inf) if open_ is None else _as_2d(open_)
+    else:
+        low = open_ = close[:0]
+
+    if use_numba is None:
+        use_numba = _loop_compiled is not None
+    if use_numba:
+        if _loop_compiled is None:
+            raise ImportError("未安装 numba")
+        exit_row = np.empty(len(rows), dtype=np.int64)
+        exit_price = np.empty(len(rows))
+        final_stop = np.empty(len(rows))
+        by_low = np.empty(len(rows), dtype=np.bool_)
+        _loop_compiled(close, atr, low, open_, rows, cols, stops, float(multiplier), bool(intrabar),
+                       exit_row, exit_price, final_stop, by_low)
+    else:
+        exit_row, exit_price, final_stop, by_low = _windowed(close, atr, low, open_, rows, cols, stops,
+                                                             float(multiplier), intrabar)
+    return (exit_row, exit_price, final_stop, by_low) if with_kind else (exit_row, exit_price, final_stop)
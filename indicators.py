@@ -0,0 +1,311 @@
+# indicators.py
+# 流式 O(1) 指标库：每个指标对象既可以逐 bar 增量更新 (update)，也可以一次性批量计算整段数组 (batch)。
+# 两种模式使用与 pandas ewm / rolling 相同的递推公式，结果逐位一致；batch 之后对象状态等同于逐个 update 完所有数据，
+# 因此可以先用历史数据 batch 预热，再在实盘中逐 bar update。
+import bisect
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def _center_of_mass(span=None, com=None):
+    # 与 pandas 相同的换算顺序，保证 alpha 逐位一致
+    if span is not None:
+        return (span - 1) / 2.0
+    if com is not None:
+        return float(com)
+    raise ValueError("必须指定 span 或 com")
+
+
+class EMA:
+    """
+    指数移动平均，等价于 pd.Series.ewm(span/com, adjust, min_periods).mean()
+    """
+
+    def __init__(self, span=None, com=None, adjust=False, min_periods=0):
+        self.com = _center_of_mass(span, com)
+        self.alpha = 1.0 / (1.0 + self.com)
+        self.adjust = adjust
+        self.min_periods = max(int(min_periods), 1)
+        self.reset()
+
+    def reset(self):
+        self.weighted = np.nan  # 内部加权均值
+        self.old_wt = 1.0       # 历史观测的累计权重
+        self.nobs = 0
+        self.value = np.nan
+
+    def update(self, x):
+        """输入一个新值，O(1) 更新并返回当前 EMA"""
+        x = float(x)
+        is_obs = x == x
+        self.nobs += is_obs
+        if self.weighted == self.weighted:
+            # ignore_na=False：缺失值同样让历史权重衰减
+            self.old_wt *= 1.0 - self.alpha
+            if is_obs:
+                new_wt = 1.0 if self.adjust else self.alpha
+                if self.weighted != x:
+                    self.weighted = (self.old_wt * self.weighted + new_wt * x) / (self.old_wt + new_wt)
+                self.old_wt = self.old_wt + new_wt if self.adjust else 1.0
+        elif is_obs:
+            self.weighted = x
+        self.value = self.weighted if self.nobs >= self.min_periods else np.nan
+        return self.value
+
+    def batch(self, values):
+        """
+        批量计算整段数组，并把对象状态推进到最后一个值之后
+        :return: np.ndarray
+        """
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return values.copy()
+        if self.nobs or self.weighted == self.weighted:
+            # 已有状态时只能接着递推
+            return np.array([self.update(x) for x in values])
+
+        ewm = pd.Series(values).ewm(com=self.com, adjust=self.adjust)
+        raw = ewm.mean().to_numpy()
+        is_obs = ~np.isnan(values)
+        nobs = np.cumsum(is_obs)
+        out = np.where(nobs >= self.min_periods, raw, np.nan)
+
+        # 恢复递推状态
+        self.nobs = int(nobs[-1])
+        self.weighted = raw[-1]
+        self.value = out[-1]
+        if self.adjust:
+            self.old_wt = self._replay_weight(is_obs)
+        else:
+            # adjust=False 时观测后权重复位为 1，之后的缺失值继续衰减
+            last_obs = len(values) - 1 - int(np.argmax(is_obs[::-1])) if self.nobs else len(values) - 1
+            self.old_wt = (1.0 - self.alpha) ** (len(values) - 1 - last_obs)
+        return out
+
+    def _replay_weight(self, is_obs):
+        """按 update 的递推顺序重放累计权重 (收敛到不动点后提前结束)"""
+        start = int(np.argmax(is_obs)) if is_obs.any() else len(is_obs)
+        old_wt = 1.0
+        decay = 1.0 - self.alpha
+        for k in range(start + 1, len(is_obs)):
+            nxt = old_wt * decay + (1.0 if is_obs[k] else 0.0)
+            if nxt == old_wt and is_obs[k:].all():
+                break
+            old_wt = nxt
+        return old_wt
+
+
+class RSI:
+    """
+    Wilder RSI：涨跌幅分别做 com=period-1 的 EMA (adjust=True)，等价于 monitor.py / 回测中的 pandas 写法
+    """
+
+    def __init__(self, period=14, min_periods=0):
+        self.period = period
+        self.gain = EMA(com=period - 1, adjust=True, min_periods=min_periods)
+        self.loss = EMA(com=period - 1, adjust=True, min_periods=min_periods)
+        self.prev_close = np.nan
+        self.value = np.nan
+
+    @staticmethod
+    def _rsi(avg_gain, avg_loss):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 100 - (100 / (1 + np.divide(avg_gain, avg_loss)))
+
+    def update(self, close):
+        close = float(close)
+        delta = close - self.prev_close
+        # 与 delta.where(delta > 0, 0) 一致：首个 bar 的 NaN 也记为 0
+        g = self.gain.update(delta if delta > 0 else 0.0)
+        l = self.loss.update(-delta if delta < 0 else 0.0)
+        self.prev_close = close
+        self.value = float(self._rsi(g, l))
+        return self.value
+
+    def batch(self, closes):
+        closes = np.asarray(closes, dtype=float)
+        if len(closes) == 0:
+            return closes.copy()
+        delta = np.diff(closes, prepend=self.prev_close)
+        g = self.gain.batch(np.where(delta > 0, delta, 0.0))
+        l = self.loss.batch(np.where(delta < 0, -delta, 0.0))
+        self.prev_close = closes[-1]
+        out = self._rsi(g, l)
+        self.value = float(out[-1])
+        return out
+
+
+class RollingMean:
+    """
+    固定窗口简单均值，等价于 rolling(window).mean()；内部为环形缓冲区，
+    并维护 Kahan 补偿的滑动和与窗口内 NaN 的个数 (与 pandas rolling mean 相同的补偿求和)，单次更新 O(1)
+    """
+
+    def __init__(self, window=14):
+        self.window = window
+        self.buf = deque(maxlen=window)
+        self.total = 0.0
+        self.comp = 0.0      # Kahan 补偿项
+        self.nans = 0        # 窗口内 NaN 的个数
+        self.value = np.nan
+
+    def _add(self, x):
+        y = x - self.comp
+        t = self.total + y
+        self.comp = (t - self.total) - y
+        self.total = t
+
+    def update(self, x):
+        x = float(x)
+        if len(self.buf) == self.window:
+            old = self.buf[0]  # 即将被挤出窗口
+            if old != old:
+                self.nans -= 1
+            else:
+                self._add(-old)
+        self.buf.append(x)
+        if x != x:
+            self.nans += 1
+        else:
+            self._add(x)
+        if len(self.buf) < self.window or self.nans:
+            self.value = np.nan
+        else:
+            self.value = self.total / self.window
+        return self.value
+
+    def _resync(self):
+        """按缓冲区重建滑动和与 NaN 计数 (batch 之后)"""
+        self.total = self.comp = 0.0
+        self.nans = 0
+        for v in self.buf:
+            if v != v:
+                self.nans += 1
+            else:
+                self._add(v)
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return values.copy()
+        head = np.array(self.buf, dtype=float)
+        full = np.concatenate((head, values))
+        out = pd.Series(full).rolling(self.window).mean().to_numpy()[len(head):]
+        self.buf.extend(full[-self.window:].tolist())
+        self._resync()
+        self.value = out[-1]
+        return out
+
+
+class SimpleATR:
+    """简化版 ATR：(High - Low) 的 N 周期简单均值"""
+
+    def __init__(self, period=14):
+        self.mean = RollingMean(period)
+        self.value = np.nan
+
+    def update(self, high, low):
+        self.value = self.mean.update(float(high) - float(low))
+        return self.value
+
+    def batch(self, highs, lows):
+        out = self.mean.batch(np.asarray(highs, dtype=float) - np.asarray(lows, dtype=float))
+        self.value = self.mean.value
+        return out
+
+
+class MACD:
+    """MACD (fast/slow/signal 均为 adjust=False 的 EMA)，返回 (macd_line, signal_line, hist)"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(span=fast)
+        self.slow = EMA(span=slow)
+        self.signal = EMA(span=signal)
+        self.value = (np.nan, np.nan, np.nan)
+
+    def update(self, close):
+        line = self.fast.update(close) - self.slow.update(close)
+        sig = self.signal.update(line)
+        self.value = (line, sig, line - sig)
+        return self.value
+
+    def batch(self, closes):
+        line = self.fast.batch(closes) - self.slow.batch(closes)
+        sig = self.signal.batch(line)
+        hist = line - sig
+        if len(hist):
+            self.value = (line[-1], sig[-1], hist[-1])
+        return line, sig, hist
+
+
+class RollingQuantile:
+    """
+    滚动分位数 (有序窗口)，等价于 rolling(window, min_periods).quantile(q) 的线性插值；window=None 为扩展窗口
+    窗口内有效值保存在有序数组中，二分查找插入/删除，不会逐 bar 重新排序
+    """
+
+    def __init__(self, q, window=None, min_periods=1):
+        self.q = q
+        self.window = window
+        self.min_periods = max(int(min_periods), 1)
+        self.buf = deque()  # 滚动窗口内的原始值（含 NaN）
+        self.sorted = []    # 窗口内的有效值，升序
+        self.value = np.nan
+
+    def _quantile(self):
+        n = len(self.sorted)
+        if n < self.min_periods:
+            return np.nan
+        idx_f = self.q * (n - 1)
+        idx = int(idx_f)
+        vlow = self.sorted[idx]
+        if idx_f == idx:
+            return vlow
+        return vlow + (self.sorted[idx + 1] - vlow) * (idx_f - idx)
+
+    def update(self, x):
+        x = float(x)
+        if x == x:
+            bisect.insort(self.sorted, x)
+        if self.window is not None:
+            self.buf.append(x)
+            if len(self.buf) > self.window:
+                old = self.buf.popleft()
+                if old == old:
+                    del self.sorted[bisect.bisect_left(self.sorted, old)]
+        self.value = self._quantile()
+        return self.value
+
+    def batch(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return values.copy()
+        if self.sorted or self.buf:
+            return np.array([self.update(x) for x in values])
+        s = pd.Series(values)
+        roller = s.expanding(self.min_periods) if self.window is None else s.rolling(self.window, self.min_periods)
+        out = roller.quantile(self.q).to_numpy()
+        tail = values if self.window is None else values[-self.window:]
+        if self.window is not None:
+            self.buf.extend(tail)
+        self.sorted = sorted(v for v in tail if v == v)
+        self.value = out[-1]
+        return out
+
+
+# ================= pandas 便捷接口 =================
+def ema(series, span, adjust=False):
+    return pd.Series(EMA(span=span, adjust=adjust).batch(series), index=series.index)
+
+def calculate_rsi(series, period=14, min_periods=0):
+    return pd.Series(RSI(period, min_periods=min_periods).batch(series), index=series.index)
+
+def simple_atr(df, period=14):
+    return pd.Series(SimpleATR(period).batch(df['High'], df['Low']), index=df.index)
+
+def calculate_macd(series, fast=12, slow=26, signal=9):
+    line, sig, hist = MACD(fast, slow, signal).batch(series)
+    idx = series.index
+    return pd.Series(line, index=idx), pd.Series(sig, index=idx), pd.Series(hist, index=idx)
@@ -0,0 +1,98 @@
+# intrabar.py
+# 分钟级止损回放：信号仍在 15min K 线上生成，盘中 Low 触及止损的那根 K 线内部再用 1 分钟 K 线回放，
+# 找出第一次触及止损的分钟与成交价 (该分钟开盘已跳空低于止损则按开盘价)，替代 "按止损价 / 15min 开盘价" 的近似。
+# 1 分钟数据从本地 K 线仓库 (bar_store.BarStore 的 memmap) 逐标的按时间顺序分块读取：每次只把一块拷入内存，
+# 没有待查询 K 线的区段直接跳过，内存占用与数据总量无关。
+import numpy as np
+import pandas as pd
+
+from bar_store import BarStore, COLUMNS
+
+OPEN, LOW = COLUMNS.index('Open'), COLUMNS.index('Low')
+CHUNK_ROWS = 200_000   # 每块 1 分钟 K 线行数 (约 2 年单个标的的 2 成)
+
+
+def _first_touch(ts, bars, bar_start, bar_end, level):
+    """块内向量化查找：每个查询窗口 [bar_start, bar_end) 中第一根 Low <= level 的分钟"""
+    a = np.searchsorted(ts, bar_start, side='left')
+    b = np.searchsorted(ts, bar_end, side='left')
+    hit_ts = np.full(len(a), -1, dtype=np.int64)
+    fill = np.full(len(a), np.nan)
+    w = int((b - a).max(initial=0))
+    if w == 0:
+        return hit_ts, fill
+    idx = a[:, None] + np.arange(w)
+    inside = idx < b[:, None]
+    idx = np.minimum(idx, len(ts) - 1)
+    # NaN 止损的比较结果为 False，不会触发
+    hit = inside & (bars[idx, LOW] <= level[:, None])
+    found = hit.any(axis=1)
+    rows = idx[found, hit[found].argmax(axis=1)]
+    gap_open = bars[rows, OPEN]
+    hit_ts[found] = ts[rows]
+    fill[found] = np.where(gap_open < level[found], gap_open, level[found])
+    return hit_ts, fill
+
+
+def replay_ticker(store, ticker, bar_start, bar_end, level, interval='1m', chunk_rows=CHUNK_ROWS):
+    """
+    单个标的的止损回放
+    :param bar_start / bar_end: 每个查询的 K 线起止时间 (int64 纳秒，左闭右开)，按 bar_start 升序
+    :param level: 该 K 线内生效的止损价
+    :return: (触发分钟的时间戳 (int64 纳秒，-1 表示没有分钟数据触及), 成交价 (未触及为 NaN))
+    """
+    bar_start = np.asarray(bar_start, dtype=np.int64)
+    bar_end = np.asarray(bar_end, dtype=np.int64)
+    level = np.asarray(level, dtype=float)
+    hit_ts = np.full(len(bar_start), -1, dtype=np.int64)
+    fill = np.full(len(bar_start), np.nan)
+    ts_all, bars_all = store.arrays(ticker, interval)
+    n = len(ts_all)
+
+    q = 0
+    while q < len(bar_start) and n:
+        # 从第一个未处理查询所在位置读一块；之前没有查询的区段不读
+        lo = int(np.searchsorted(ts_all, bar_start[q], side='left'))
+        if lo == n:
+            break
+        hi = min(lo + chunk_rows, n)
+        # 只处理窗口完全落在块内的查询 (块之后的 K 线时间都大于块的最后一根)
+        limit = ts_all[hi - 1] if hi < n else np.iinfo(np.int64).max
+        q_end = q + int(np.searchsorted(bar_end[q:], limit, side='right'))
+        if q_end == q:
+            # 单根 K 线的分钟数超过块大小：把块延长到该 K 线结束
+            hi = int(np.searchsorted(ts_all, bar_end[q], side='left'))
+            q_end = q + 1
+        ts = np.array(ts_all[lo:hi])
+        bars = np.array(bars_all[lo:hi])
+        hit_ts[q:q_end], fill[q:q_end] = _first_touch(ts, bars, bar_start[q:q_end], bar_end[q:q_end], level[q:q_end])
+        q = q_end
+    return hit_ts, fill
+
+
+def replay_stop_exits(source, tickers, timeline, exit_rows, exit_cols, levels, bar_interval='15min',
+                      interval='1m', chunk_rows=CHUNK_ROWS):
+    """
+    批量回放盘中触发的止损
+    :param source: BarStore 或其根目录
+    :param tickers: exit_cols 对应的标的名
+    :param timeline: 策略 K 线时间轴 (int64 纳秒，K 线起始时间)
+    :param exit_rows / exit_cols: 离场 K 线的行号与列号 (exit_kernel 中 by_low 的离场)
+    :param levels: 该 K 线内生效的止损价
+    :param bar_interval: 策略 K 线周期，决定回放窗口 [起始, 起始 + 周期)
+    :return: (触发分钟的时间戳 (int64 纳秒，-1 表示没有分钟数据或未触及，调用方保留原近似), 成交价)
+    """
+    store = source if isinstance(source, BarStore) else BarStore(source)
+    exit_rows = np.asarray(exit_rows, dtype=np.int64)
+    exit_cols = np.asarray(exit_cols, dtype=np.int64)
+    levels = np.asarray(levels, dtype=float)
+    start = np.asarray(timeline, dtype=np.int64)[exit_rows]
+    end = start + pd.Timedelta(bar_interval).value
+    hit_ts = np.full(len(exit_rows), -1, dtype=np.int64)
+    fill = np.full(len(exit_rows), np.nan)
+    for n in np.unique(exit_cols):
+        mine = np.flatnonzero(exit_cols == n)
+        mine = mine[np.argsort(start[mine], kind='stable')]
+        hit_ts[mine], fill[mine] = replay_ticker(store, tickers[n], start[mine], end[mine], levels[mine],
+                                                 interval, chunk_rows)
+    return hit_ts, fill
@@ -0,0 +1,118 @@
+# ledger.py
+# 事后逐 bar 盯市账本：回测循环只记录持仓区间 (开仓时刻 / 平仓时刻 / 股数) 与现金变动，
+# 结束后在价格面板上一次性重建整条权益曲线、持仓市值、仓位暴露与回撤。
+# 缺失 K 线的标的按最近一次收盘价 (前向填充) 估值，而不是按买入价。
+import numpy as np
+import pandas as pd
+
+def _ns(time):
+    return pd.Timestamp(time).value
+
+
+class Ledger:
+    """持仓区间与现金流水 (由 PositionManager 在 open / close 时写入)"""
+
+    def __init__(self):
+        self.tickers = []
+        self.entry_time = []
+        self.exit_time = []    # -1 表示仍在持仓
+        self.shares = []
+        self.cost = []
+        self.exit_value = []
+        self.open_ids = {}     # ticker -> 当前持仓所在的区间序号
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def open(self, ticker, time, shares, cost):
+        self.open_ids[ticker] = len(self.tickers)
+        self.tickers.append(ticker)
+        self.entry_time.append(_ns(time))
+        self.exit_time.append(-1)
+        self.shares.append(float(shares))
+        self.cost.append(float(cost))
+        self.exit_value.append(0.0)
+
+    def close(self, ticker, time, value):
+        i = self.open_ids.pop(ticker)
+        self.exit_time[i] = _ns(time)
+        self.exit_value[i] = float(value)
+
+    def intervals(self):
+        """持仓区间明细 DataFrame"""
+        exit_time = np.asarray(self.exit_time, dtype='int64')
+        return pd.DataFrame({
+            'Ticker': self.tickers,
+            'Entry Time': pd.to_datetime(np.asarray(self.entry_time, dtype='int64')),
+            'Exit Time': pd.to_datetime(np.where(exit_time < 0, pd.NaT.value, exit_time)),
+            'Shares': self.shares,
+            'Cost': self.cost,
+            'Exit Value': self.exit_value,
+        })
+
+
+def _rows(index_ns, times):
+    """时间戳所在 K 线的行号 (盘中成交如分钟级止损记入所在 K 线)，未平仓 (-1) 记为时间轴末尾之后"""
+    times = np.asarray(times, dtype='int64')
+    rows = np.maximum(np.searchsorted(index_ns, times, side='right') - 1, 0)
+    return np.where(times < 0, len(index_ns), rows)
+
+
+def _ffill_column(close, valid):
+    """单列收盘价前向填充 (首个有效 K 线之前为 NaN)"""
+    T = len(close)
+    last = np.maximum.accumulate(np.where(valid, np.arange(T), -1))
+    return np.where(last >= 0, close[np.maximum(last, 0)], np.nan)
+
+
+def build_equity(ledger, index, tickers, close, valid, initial_cash):
+    """
+    在价格面板上重建逐 bar 账户状态
+    :param index: 时间轴 (DatetimeIndex)，行数与 close / valid 相同
+    :param tickers: close / valid 的列名
+    :param close / valid: 时间 × 标的 的收盘价与有效掩码
+    :return: DataFrame[equity, cash, market_value, exposure, drawdown]，索引为 index
+    """
+    index = pd.DatetimeIndex(index)
+    T = len(index)
+    index_ns = index.as_unit('ns').asi8
+    entry = _rows(index_ns, ledger.entry_time)
+    exit_ = _rows(index_ns, ledger.exit_time)
+    shares = np.asarray(ledger.shares, dtype=float)
+
+    # 现金：开仓当根扣除成本，平仓当根加回平仓市值
+    flows = np.zeros(T + 1)
+    np.add.at(flows, entry, -np.asarray(ledger.cost, dtype=float))
+    np.add.at(flows, exit_, np.asarray(ledger.exit_value, dtype=float))
+    cash = initial_cash + np.cumsum(flows[:T])
+
+    # 持仓市值：每个涉及的标的一次 "股数差分 → 累加 × 前向填充价格"，区间为 [开仓行, 平仓行)
+    market_value = np.zeros(T)
+    col = {t: n for n, t in enumerate(tickers)}
+    ids = np.array([col[t] for t in ledger.tickers], dtype=np.intp)
+    for n in np.unique(ids):
+        mine = ids == n
+        held = np.zeros(T + 1)
+        np.add.at(held, entry[mine], shares[mine])
+        np.add.at(held, exit_[mine], -shares[mine])
+        held = np.cumsum(held[:T])
+        px = _ffill_column(close[:, n], valid[:, n])
+        market_value += np.where(held != 0, held * np.nan_to_num(px), 0.0)
+
+    equity = cash + market_value
+    with np.errstate(invalid='ignore', divide='ignore'):
+        exposure = np.where(equity != 0, market_value / equity, np.nan)
+        drawdown = equity / np.maximum.accumulate(equity) - 1 if T else equity
+    return pd.DataFrame({'equity': equity, 'cash': cash, 'market_value': market_value,
+                         'exposure': exposure, 'drawdown': drawdown}, index=index)
+
+
+def resample_equity(frame, rule='1D'):
+    """
+    把逐 bar 账本降采样到任意周期 (如 15min → 日线)
+    权益 / 现金 / 市值 / 暴露取周期末值，回撤取周期内最深值
+    """
+    r = frame.resample(rule)
+    out = r[['equity', 'cash', 'market_value', 'exposure']].last()
+    out['drawdown'] = r['drawdown'].min()
+    return out.dropna(subset=['equity'])
@@ -0,0 +1,154 @@
+# live_state.py
+# 实盘监控的逐标的滚动状态：有界环形缓冲区 + 增量指标。
+# 首次扫描用历史数据批量预热，之后每次只处理新增的 K 线；最新一根（可能尚未收盘）只在指标副本上试算，
+# 下一次扫描拿到它的修正值后再正式提交，因此盘中未完成 K 线不会污染指标状态。
+# 可选的日线 EMA (EMA_DAILY) 由已提交的 15min K 线经 resampler.Resampler 增量合成日线后计算，只含当日之前已完成的日线。
+import copy
+from collections import deque
+
+import numpy as np
+
+from bar_store import ADJUST_RTOL
+from indicators import EMA, RSI, MACD, RollingQuantile
+from resampler import Resampler
+from threshold_optimizer import ThresholdOptimizer
+
+FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+class LiveIndicators:
+    """监控用的一组指标：RSI / 动态 EMA / MACD，可选 RSI 滚动分位数阈值"""
+
+    def __init__(self, rsi_period=14, ema_period=200, threshold_window=None, percentile=20):
+        """
+        :param threshold_window: 设置后额外维护最近 N 根 K 线 RSI 的滚动分位数阈值 (RSI_Threshold)
+        """
+        self.rsi = RSI(rsi_period, min_periods=rsi_period)
+        self.ema = EMA(span=ema_period)
+        self.macd = MACD()
+        self.threshold = RollingQuantile(percentile / 100, threshold_window, min(100, threshold_window)) \
+            if threshold_window else None
+
+    def _threshold(self, value):
+        return float(ThresholdOptimizer.clamp_threshold(value))
+
+    def update(self, close):
+        line, _, hist = self.macd.update(close)
+        rsi = self.rsi.update(close)
+        return {
+            'Close': float(close),
+            'RSI': rsi,
+            'EMA_DYNAMIC': self.ema.update(close),
+            'MACD': line,
+            'MACD_Hist': hist,
+            'RSI_Threshold': self._threshold(self.threshold.update(rsi)) if self.threshold else np.nan,
+        }
+
+    def batch(self, closes):
+        """批量预热，返回最后一根的指标值"""
+        if len(closes) == 0:
+            return None
+        rsi = self.rsi.batch(closes)
+        self.ema.batch(closes)
+        line, _, hist = self.macd.batch(closes)
+        return {
+            'Close': float(closes[-1]),
+            'RSI': self.rsi.value,
+            'EMA_DYNAMIC': float(self.ema.value),
+            'MACD': float(line[-1]),
+            'MACD_Hist': float(hist[-1]),
+            'RSI_Threshold': self._threshold(self.threshold.batch(rsi)[-1]) if self.threshold else np.nan,
+        }
+
+
+class TickerState:
+    def __init__(self, rsi_period=14, ema_period=200, maxlen=512, threshold_window=None, percentile=20,
+                 daily_ema_period=None):
+        """
+        :param maxlen: 环形缓冲区保留的已提交 K 线数量
+        :param threshold_window / percentile: 见 LiveIndicators
+        :param daily_ema_period: 设置后额外维护由 15min K 线合成的日线 EMA (EMA_DAILY)，否则该列为 NaN
+        """
+        self.rsi_period = rsi_period
+        self.ema_period = ema_period
+        self.daily_ema_period = daily_ema_period
+        self.threshold_window = threshold_window
+        self.percentile = percentile
+        self.bars = deque(maxlen=maxlen)  # 已提交 K 线: (ts, Open, High, Low, Close, Volume)
+        self.reset()
+
+    def reset(self):
+        self.ind = LiveIndicators(self.rsi_period, self.ema_period, self.threshold_window, self.percentile)
+        self.daily = Resampler('1d', (self.daily_ema_period,)) if self.daily_ema_period else None
+        self.bars.clear()
+        self.count = 0        # 已提交 K 线总数（含已滚出缓冲区的）
+        self.tip_ts = None    # 最新一根 K 线的时间戳
+        self.tip = None
+        self.prev = None      # 最后一根已提交 K 线的指标值
+        self.last = None      # 最新一根 K 线（试算）的指标值
+
+    @property
+    def num_bars(self):
+        return self.count + (self.tip is not None)
+
+    def seed(self, df):
+        """全量重建：用历史数据批量预热指标"""
+        self.reset()
+        if df.empty:
+            return
+        values = df[list(FIELDS)].to_numpy(dtype=float)
+        committed = values[:-1]
+        self.prev = self.ind.batch(committed[:, 3])
+        if self.daily is not None:
+            self.daily.batch(df.iloc[:-1])
+        if self.prev is not None:
+            self.prev['EMA_DAILY'] = self._daily_ema()
+        self.count = len(committed)
+        for ts, row in zip(df.index[:-1][-self.bars.maxlen:], committed[-self.bars.maxlen:]):
+            self.bars.append((ts, *row))
+        self._set_tip(df.index[-1], values[-1])
+
+    def _daily_ema(self, ts=None):
+        """:param ts: 尚未提交的 K 线时间 (试算)；None 表示最后一根已提交的 K 线"""
+        if self.daily is None:
+            return np.nan
+        if ts is None:
+            return float(self.daily.ema(self.daily_ema_period))
+        return float(self.daily.peek_ema(ts, self.daily_ema_period))
+
+    def _commit(self, ts, row):
+        self.prev = self.ind.update(row[3])
+        if self.daily is not None:
+            self.daily.update(ts, row)
+        self.prev['EMA_DAILY'] = self._daily_ema()
+        self.bars.append((ts, *row))
+        self.count += 1
+
+    def _set_tip(self, ts, row):
+        self.tip_ts = ts
+        self.tip = row
+        self.last = copy.deepcopy(self.ind).update(row[3])
+        self.last['EMA_DAILY'] = self._daily_ema(ts)
+
+    def ingest(self, df):
+        """
+        增量处理新数据 (df 需按时间升序，且应包含上次的最新一根)
+        :return: False 表示检测到缺口或历史被改写 (新数据与已有状态无法衔接)，调用方应重新 seed
+        """
+        if self.tip_ts is None:
+            self.seed(df)
+            return True
+        lo = int(np.searchsorted(df.index.values, np.datetime64(self.tip_ts), side='left'))
+        new = df.iloc[lo:]
+        if new.empty or new.index[0] != self.tip_ts:
+            return False
+        if lo and self.bars and df.index[lo - 1] == self.bars[-1][0] and \
+                not np.isclose(df['Close'].iat[lo - 1], self.bars[-1][4], rtol=ADJUST_RTOL):
+            # 已提交的 K 线与仓库不一致 (如除权 / 拆股后本地历史被重写)，指标状态作废
+            return False
+        values = new[list(FIELDS)].to_numpy(dtype=float)
+        # 上次的最新一根已有修正值，连同之后除最后一根外的 K 线一起提交
+        for ts, row in zip(new.index[:-1], values[:-1]):
+            self._commit(ts, row)
+        self._set_tip(new.index[-1], values[-1])
+        return True
@@ -0,0 +1,180 @@
+# log_writer.py
+# 只追加的分块列式日志：记录先按列缓存在内存中，每满 chunk_size 条写出一个分块文件 (安装了 pyarrow 时为 Parquet，
+# 否则为 pickle 的 DataFrame)，内存占用只与 chunk_size 有关。对外表现为可 append / len / 迭代的列表，
+# 统计分析通过 scan / count / filter 按分块查询文件，不需要把全部记录读回内存。
+import glob
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+# Parquet 读写需要 pyarrow；只探测是否安装，真正写文件时才由 pandas 导入
+HAS_PARQUET = importlib.util.find_spec('pyarrow') is not None
+
+# PositionManager 两类日志的列类型
+SIGNAL_SCHEMA = {
+    'Time': 'datetime64[ns]',
+    'Ticker': 'str',
+    'Price': 'float64',
+    'Daily_EMA': 'float64',
+    'RSI': 'float64',
+    'Trend_OK': 'bool',
+    'Slot_Available': 'bool',
+}
+TRADE_SCHEMA = {
+    'Ticker': 'str',
+    'Buy Price': 'float64',
+    'Buy Time': 'datetime64[ns]',
+    'Close Price': 'float64',
+    'Close Time': 'datetime64[ns]',
+    'Total Buy Cost': 'float64',
+    'Total Close Value': 'float64',
+    'pnl_pct': 'float64',   # 收益率 (小数)，导出时由 format_trades 格式化为百分比文本
+    'PnL Cash': 'float64',
+}
+
+
+def format_trades(df):
+    """导出 CSV / 报告用：由数值列 pnl_pct 生成百分比文本列 'PnL %'"""
+    return df.assign(**{'PnL %': df['pnl_pct'].map('{:.2%}'.format)})
+
+
+def _infer_dtype(value):
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return 'datetime64[ns]'
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int64'
+    if isinstance(value, (float, np.floating)):
+        return 'float64'
+    return 'str'
+
+
+class ColumnarLog:
+    def __init__(self, path, schema=None, chunk_size=10000, fmt=None, mode='w'):
+        """
+        :param path: 分块文件所在目录
+        :param schema: {列名: dtype}，None 表示按第一条记录推断
+        :param chunk_size: 每个分块的记录数 (即内存中最多缓存的记录数)
+        :param fmt: 'parquet' / 'pickle'，默认有 pyarrow 时用 parquet
+        :param mode: 'w' 清空目录中已有的分块；'a' 在已有分块之后继续追加
+        """
+        self.path = path
+        self.schema = dict(schema) if schema else None
+        self.chunk_size = chunk_size
+        self.fmt = fmt or ('parquet' if HAS_PARQUET else 'pickle')
+        self.ext = '.parquet' if self.fmt == 'parquet' else '.pkl'
+        os.makedirs(path, exist_ok=True)
+        if mode == 'w':
+            for f in self._parts():
+                os.remove(f)
+        self.parts = self._parts()
+        self.flushed = sum(len(self._read(f)) for f in self.parts)
+        self._reset_buffer()
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.path, f'part-*{self.ext}')))
+
+    def _reset_buffer(self):
+        self.buffer = {c: [] for c in self.schema} if self.schema else None
+        self.buffered = 0
+
+    # ---------- 写入 ----------
+    def append(self, record):
+        if self.schema is None:
+            self.schema = {k: _infer_dtype(v) for k, v in record.items()}
+        if self.buffer is None:
+            self._reset_buffer()
+        for c, values in self.buffer.items():
+            values.append(record.get(c))
+        self.buffered += 1
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def extend(self, records):
+        for r in records:
+            self.append(r)
+
+    def _column(self, values, dtype):
+        if dtype.startswith('datetime64'):
+            return pd.Series(pd.to_datetime(values))  # 保留时区信息
+        return pd.Series(values, dtype=dtype)
+
+    def _buffer_frame(self):
+        if not self.buffered:
+            return pd.DataFrame({c: pd.Series([], dtype=d) for c, d in (self.schema or {}).items()})
+        return pd.DataFrame({c: self._column(self.buffer[c], self.schema[c]) for c in self.schema})
+
+    def flush(self):
+        """把缓存写成一个新的分块文件"""
+        if not self.buffered:
+            return
+        df = self._buffer_frame()
+        name = os.path.join(self.path, f'part-{len(self.parts):05d}{self.ext}')
+        if self.fmt == 'parquet':
+            df.to_parquet(name, index=False)
+        else:
+            df.to_pickle(name)
+        self.parts.append(name)
+        self.flushed += self.buffered
+        self._reset_buffer()
+
+    close = flush
+
+    # ---------- 读取 / 查询 ----------
+    def _read(self, f, columns=None):
+        if self.fmt == 'parquet':
+            return pd.read_parquet(f, columns=columns)
+        df = pd.read_pickle(f)
+        return df if columns is None else df[columns]
+
+    def scan(self, columns=None):
+        """按分块依次产出 DataFrame (含尚未写出的缓存)"""
+        for f in self.parts:
+            yield self._read(f, columns)
+        if self.buffered:
+            df = self._buffer_frame()
+            yield df if columns is None else df[columns]
+
+    def read(self, columns=None):
+        """读出全部记录 (只取需要的列)"""
+        frames = list(self.scan(columns))
+        if not frames:
+            return self._buffer_frame() if columns is None else self._buffer_frame()[columns]
+        return pd.concat(frames, ignore_index=True)
+
+    to_frame = read
+
+    def count(self, predicate, columns=None):
+        """满足 predicate(chunk) -> bool Series 的记录数"""
+        return int(sum(predicate(df).sum() for df in self.scan(columns)))
+
+    def filter(self, predicate, columns=None):
+        """满足条件的记录 (逐块过滤后拼接)"""
+        frames = [df[predicate(df)] for df in self.scan(columns)]
+        frames = [df for df in frames if len(df)]
+        return pd.concat(frames, ignore_index=True) if frames else self._buffer_frame().iloc[:0]
+
+    def to_csv(self, path, transform=None, **kwargs):
+        """
+        逐块写出 CSV，不把全部记录读回内存
+        :param transform: 可选，写出前对每个分块的变换 transform(df) -> DataFrame (如 format_trades)
+        """
+        kwargs.setdefault('index', False)
+        transform = transform or (lambda df: df)
+        first = True
+        for df in self.scan():
+            transform(df).to_csv(path, mode='w' if first else 'a', header=first, **kwargs)
+            first = False
+        if first:
+            transform(self._buffer_frame()).to_csv(path, **kwargs)
+
+    # ---------- 列表兼容 ----------
+    def __len__(self):
+        return self.flushed + self.buffered
+
+    def __iter__(self):
+        for df in self.scan():
+            yield from df.to_dict('records')
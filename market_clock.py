@@ -0,0 +1,155 @@
+# market_clock.py
+# 交易时段日历 + 按 K 线收盘对齐的调度器。
+# 一次性预计算约一年的开盘 / 收盘时刻 (含提前收盘的半天交易日)，存为两个 int64 纳秒 (UTC) 数组，
+# 之后的 "是否开盘 / 下一次触发时刻" 都只是 searchsorted，不再每次构建 pandas_market_calendars 日程。
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _utc_ns(ts):
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+    return ts.value
+
+
+def _utc(ns):
+    return pd.Timestamp(int(ns), tz='UTC')
+
+
+class SessionCalendar:
+    def __init__(self, opens, closes):
+        """
+        :param opens / closes: 各交易时段的开盘 / 收盘时刻 (UTC 纳秒)，升序
+        """
+        self.opens = np.asarray(opens, dtype='int64')
+        self.closes = np.asarray(closes, dtype='int64')
+
+    @classmethod
+    def from_schedule(cls, schedule):
+        """由 pandas_market_calendars 的 schedule (market_open / market_close 列) 构建"""
+        opens = pd.DatetimeIndex(schedule['market_open']).tz_convert('UTC')
+        closes = pd.DatetimeIndex(schedule['market_close']).tz_convert('UTC')
+        return cls(opens.as_unit('ns').asi8, closes.as_unit('ns').asi8)
+
+    @classmethod
+    def nyse(cls, start=None, days=366, name='NYSE'):
+        """从 start (默认今天前一周) 起约 days 天的交易日历"""
+        import pandas_market_calendars as mcal  # 延迟导入
+        start = pd.Timestamp(start or pd.Timestamp.now(tz='UTC')).normalize().tz_localize(None) - pd.Timedelta(days=7)
+        schedule = mcal.get_calendar(name).schedule(start_date=start, end_date=start + pd.Timedelta(days=days))
+        return cls.from_schedule(schedule)
+
+    @classmethod
+    def weekdays(cls, start=None, days=366, open_time='09:30', close_time='16:00', tz='America/New_York'):
+        """简化日历：周一至周五固定时段，不含节假日 (pandas_market_calendars 不可用时的兜底)"""
+        start = pd.Timestamp(start or pd.Timestamp.now(tz='UTC')).normalize().tz_localize(None) - pd.Timedelta(days=7)
+        dates = pd.bdate_range(start, periods=days * 5 // 7)
+        opens = pd.DatetimeIndex(dates + pd.Timedelta(open_time + ':00')).tz_localize(tz).tz_convert('UTC')
+        closes = pd.DatetimeIndex(dates + pd.Timedelta(close_time + ':00')).tz_localize(tz).tz_convert('UTC')
+        return cls(opens.as_unit('ns').asi8, closes.as_unit('ns').asi8)
+
+    def __len__(self):
+        return len(self.opens)
+
+    @property
+    def end(self):
+        return _utc(self.closes[-1]) if len(self) else None
+
+    def session_at(self, ts):
+        """ts 所在交易时段的序号，不在交易时段内返回 -1"""
+        t = _utc_ns(ts)
+        i = int(np.searchsorted(self.opens, t, side='right')) - 1
+        return i if i >= 0 and t < self.closes[i] else -1
+
+    def is_open(self, ts):
+        return self.session_at(ts) >= 0
+
+    def next_open(self, ts):
+        """ts 之后 (含) 的下一次开盘，超出已缓存范围返回 None"""
+        i = int(np.searchsorted(self.opens, _utc_ns(ts), side='left'))
+        return _utc(self.opens[i]) if i < len(self) else None
+
+    def next_bar_close(self, ts, interval, settle=pd.Timedelta(0)):
+        """
+        ts 之后的下一个 "K 线收盘 + settle" 时刻 (UTC)
+        K 线从开盘起按 interval 切分，最后一根在收盘时结束 (半天交易日同样适用)
+        :return: (触发时刻, 对应的 K 线收盘时刻)，超出已缓存范围返回 (None, None)
+        """
+        t = _utc_ns(ts)
+        iv, st = pd.Timedelta(interval).value, pd.Timedelta(settle).value
+        # 第一个 "收盘 + settle" 晚于 ts 的时段
+        i = int(np.searchsorted(self.closes + st, t, side='right'))
+        if i >= len(self):
+            return None, None
+        open_, close = int(self.opens[i]), int(self.closes[i])
+        k = max(1, (t - st - open_) // iv + 1)
+        bar_close = min(open_ + k * iv, close)
+        return _utc(bar_close + st), _utc(bar_close)
+
+
+class BarCloseScheduler:
+    def __init__(self, interval='15min', settle='10s', calendar_factory=None, refresh_margin='30D',
+                 clock=None, sleep=time.sleep, max_sleep=300):
+        """
+        :param interval: K 线周期
+        :param settle: 收盘后等待多久再扫描 (等数据源出齐最后一根 K 线)
+        :param calendar_factory: 返回 SessionCalendar 的函数，默认 NYSE，不可用时退回简化日历
+        :param refresh_margin: 缓存日历剩余不足该时长时重新构建
+        :param max_sleep: 单次 sleep 上限 (秒)，长时间休眠后 (如系统挂起) 仍能按真实时间重新对齐
+        """
+        self.interval = pd.Timedelta(interval)
+        self.settle = pd.Timedelta(settle)
+        self.calendar_factory = calendar_factory or self._default_calendar
+        self.refresh_margin = pd.Timedelta(refresh_margin)
+        self.clock = clock or (lambda: pd.Timestamp.now(tz='UTC'))
+        self.sleep = sleep
+        self.max_sleep = max_sleep
+        self._calendar = None
+
+    @staticmethod
+    def _default_calendar():
+        try:
+            return SessionCalendar.nyse()
+        except ImportError:
+            print("⚠️ 未安装 pandas_market_calendars，使用不含节假日的简化交易日历")
+            return SessionCalendar.weekdays()
+
+    @property
+    def calendar(self):
+        now = self.clock()
+        if self._calendar is None or not len(self._calendar) or self._calendar.end - self.refresh_margin < now:
+            self._calendar = self.calendar_factory()
+        return self._calendar
+
+    def is_open(self, ts=None):
+        return self.calendar.is_open(self.clock() if ts is None else ts)
+
+    def next_fire(self, ts=None):
+        return self.calendar.next_bar_close(self.clock() if ts is None else ts, self.interval, self.settle)
+
+    def _sleep_until(self, target):
+        while True:
+            remaining = (target - self.clock()).total_seconds()
+            if remaining <= 0:
+                return
+            self.sleep(min(remaining, self.max_sleep))
+
+    def run(self, job, max_runs=None):
+        """在每根 K 线收盘 + settle 时运行 job；休市期间一直睡到下一个交易时段"""
+        runs = 0
+        while max_runs is None or runs < max_runs:
+            now = self.clock()
+            fire, bar_close = self.next_fire(now)
+            if fire is None:
+                # 缓存日历已用完，强制重建
+                self._calendar = None
+                fire, bar_close = self.next_fire(now)
+                if fire is None:
+                    raise RuntimeError("交易日历为空，无法调度")
+            if not self.is_open(now):
+                print(f"💤 休市中，下一次扫描: {fire.tz_convert('America/New_York'):%Y-%m-%d %H:%M:%S} (美东)")
+            self._sleep_until(fire)
+            job()
+            runs += 1
@@ -0,0 +1,181 @@
+# metrics.py
+# 实盘监控的延迟指标：分阶段计时、直方图 (Prometheus 风格固定桶 + 最近样本的精确分位数)、计数器，
+# 导出为 Prometheus 文本格式 (可配合 node_exporter textfile collector) 或 JSON 快照；另提供单次扫描的 cProfile 钩子。
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# 秒级桶：覆盖单个标的的毫秒级计算到整轮 15 分钟周期的延迟
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 1800)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir=2048):
+        """
+        :param buckets: 累计桶上界 (秒)
+        :param reservoir: 保留最近多少个样本用于计算精确分位数
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = float('-inf')
+        self.recent = deque(maxlen=reservoir)
+
+    def observe(self, value):
+        for k, le in enumerate(self.buckets):
+            if value <= le:
+                self.counts[k] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def quantiles(self, qs=QUANTILES):
+        if not self.recent:
+            return {q: float('nan') for q in qs}
+        values = np.percentile(np.fromiter(self.recent, dtype=float), [q * 100 for q in qs])
+        return dict(zip(qs, values.tolist()))
+
+    def cumulative(self):
+        """Prometheus 的累计桶计数"""
+        return np.cumsum(self.counts).tolist()
+
+
+class Metrics:
+    """线程安全的指标注册表；带 ticker 标签的观测值会同时计入 ticker="all" 的汇总序列"""
+
+    def __init__(self, namespace='mytradingbot', buckets=DEFAULT_BUCKETS, reservoir=2048):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.reservoir = reservoir
+        self.histograms = {}   # (名称, 标签元组) -> Histogram
+        self.counters = {}     # (名称, 标签元组) -> 数值
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def _label_sets(self, labels):
+        if labels.get('ticker') not in (None, 'all'):
+            return [labels, dict(labels, ticker='all')]
+        return [labels]
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            for ls in self._label_sets(labels):
+                key = self._key(name, ls)
+                hist = self.histograms.get(key)
+                if hist is None:
+                    hist = self.histograms[key] = Histogram(self.buckets, self.reservoir)
+                hist.observe(float(value))
+
+    @contextlib.contextmanager
+    def timer(self, name='stage_seconds', **labels):
+        """计时上下文，耗时 (秒) 记入直方图"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            for ls in self._label_sets(labels):
+                key = self._key(name, ls)
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = float(value)
+
+    # ---------- 导出 ----------
+    def snapshot(self):
+        """JSON 友好的快照: {名称: [{labels, count, sum, max, p50, p90, p99}]}"""
+        out = {'time': time.time(), 'histograms': {}, 'counters': {}, 'gauges': {}}
+        with self.lock:
+            for (name, labels), h in sorted(self.histograms.items()):
+                entry = {'labels': dict(labels), 'count': h.count, 'sum': h.sum, 'max': h.max}
+                entry.update({f'p{int(q * 100)}': v for q, v in h.quantiles().items()})
+                out['histograms'].setdefault(name, []).append(entry)
+            for (name, labels), v in sorted(self.counters.items()):
+                out['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': v})
+            for (name, labels), v in sorted(self.gauges.items()):
+                out['gauges'].setdefault(name, []).append({'labels': dict(labels), 'value': v})
+        return out
+
+    @staticmethod
+    def _fmt_labels(labels, **extra):
+        items = list(labels) + list(extra.items())
+        if not items:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+    def to_prometheus(self):
+        """Prometheus 文本格式；最近样本的分位数额外导出为 {名称}_recent{quantile=...} 仪表"""
+        ns = self.namespace
+        lines = []
+        with self.lock:
+            by_name = {}
+            for (name, labels), h in sorted(self.histograms.items()):
+                by_name.setdefault(name, []).append((labels, h))
+            for name, series in by_name.items():
+                metric = f'{ns}_{name}'
+                lines.append(f'# TYPE {metric} histogram')
+                for labels, h in series:
+                    for le, c in zip(h.buckets, h.cumulative()):
+                        lines.append(f'{metric}_bucket{self._fmt_labels(labels, le=le)} {c}')
+                    lines.append(f'{metric}_bucket{self._fmt_labels(labels, le="+Inf")} {h.count}')
+                    lines.append(f'{metric}_sum{self._fmt_labels(labels)} {h.sum}')
+                    lines.append(f'{metric}_count{self._fmt_labels(labels)} {h.count}')
+                lines.append(f'# TYPE {metric}_recent gauge')
+                for labels, h in series:
+                    for q, v in h.quantiles().items():
+                        lines.append(f'{metric}_recent{self._fmt_labels(labels, quantile=q)} {v}')
+            for kind, store in (('counter', self.counters), ('gauge', self.gauges)):
+                seen = set()
+                for (name, labels), v in sorted(store.items()):
+                    metric = f'{ns}_{name}'
+                    if metric not in seen:
+                        lines.append(f'# TYPE {metric} {kind}')
+                        seen.add(metric)
+                    lines.append(f'{metric}{self._fmt_labels(labels)} {v}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """按扩展名导出：.json 为 JSON 快照，其余为 Prometheus 文本；先写临时文件再替换，避免读到半个文件"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        text = json.dumps(self.snapshot(), indent=2, ensure_ascii=False) if path.endswith('.json') else self.to_prometheus()
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+def profile_call(fn, path=None, top=25):
+    """
+    用 cProfile 运行一次 fn，打印按累计耗时排序的前 top 个函数
+    :param path: 可选，保存 .prof 文件 (可用 snakeviz / pstats 查看)
+    """
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(fn)
+    finally:
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            prof.dump_stats(path)
+        stream = io.StringIO()
+        pstats.Stats(prof, stream=stream).sort_stats('cumulative').print_stats(top)
+        print(stream.getvalue())
@@ -1,15 +1,20 @@
-import yfinance as yf
+import numpy as np
 import pandas as pd
-import schedule
 import time
-import random
 import json
 import os  # 导入 os 库来设置环境变量
+from collections import deque
 from datetime import datetime
-from notifier import send_telegram_msg
-import pandas_market_calendars as mcal
+from notifier import TelegramNotifier
+from bar_store import BarStore
+from data_feed import ConcurrentFeed
+from live_state import TickerState
+from state_store import StateStore
+from screener import Snapshot, Screener, LONG_RULE, SHORT_RULE, overview
+from risk import RollingCorrelation
+from market_clock import BarCloseScheduler
+from metrics import Metrics, profile_call
 from datetime import datetime, timezone
-import pytz
 
 # ================= 配置加载 =================
 def load_config():
@@ -25,7 +30,68 @@ RSI_OVERSOLD = CONFIG['rsi_oversold']
 RSI_OVERBOUGHT = CONFIG['rsi_overbought']
 # 从配置中动态读取周期，如果不存在则默认使用 200
 ema_p = CONFIG.get('ema_period', 200)
+# 可选：用最近 N 根 K 线 RSI 的滚动分位数替代固定超卖线 (不设置则使用 RSI_OVERSOLD)
+ADAPTIVE_WINDOW = CONFIG.get('adaptive_oversold_window')
+ADAPTIVE_PERCENTILE = CONFIG.get('adaptive_oversold_percentile', 20)
+# 由 15min K 线增量合成日线，维护当日之前已完成日线上的 EMA (快照列 EMA_DAILY，可用于自定义筛选)；设为空则不计算
+DAILY_EMA_PERIOD = CONFIG.get('daily_ema_period', 20)
 PROXY_URL = CONFIG.get('proxy_url') # 使用 .get 防止 key 不存在报错
+# 本地 K 线仓库，每次扫描只增量补齐新 K 线
+BAR_STORE = BarStore(CONFIG.get('bar_store_dir', 'data/bars'))
+# 并发拉取：线程池 + 令牌桶限流，替代逐个标的随机 sleep
+# 延迟指标：分阶段耗时 / K 线收盘到信号送达 Telegram 的延迟，每轮扫描后导出 (.json 为 JSON 快照，其余为 Prometheus 文本)
+METRICS = Metrics()
+METRICS_PATH = CONFIG.get('metrics_path', 'data/metrics.prom')
+LATENCY_BUDGET = CONFIG.get('latency_budget', 60)  # 单轮扫描耗时预算 (秒)，超出时告警并计数
+# 该文件存在时对下一轮扫描做一次 cProfile (结果保存为同名 .prof)，随后删除该文件
+PROFILE_TRIGGER = CONFIG.get('profile_trigger', 'data/profile_next_scan')
+MARKET_TZ = CONFIG.get('market_tz', 'America/New_York')  # K 线时间戳所在时区 (去时区后的交易所本地时间)
+BAR_INTERVAL = pd.Timedelta(minutes=15)
+# Telegram 推送：后台线程 + 连接池，同一轮扫描的信号合并发送，扫描循环不等待网络
+NOTIFIER = TelegramNotifier.from_config(CONFIG, metrics=METRICS)
+# 调度：缓存一年的交易时段 (含半天交易日)，在每根 K 线收盘 + settle_seconds 时扫描，休市时睡到下一个时段
+SCHEDULER = BarCloseScheduler(interval=BAR_INTERVAL, settle=pd.Timedelta(seconds=CONFIG.get('settle_seconds', 10)))
+FEED = ConcurrentFeed(
+    store=BAR_STORE,
+    max_workers=CONFIG.get('fetch_workers', 8),
+    rate=CONFIG.get('fetch_rate', 2.0),
+    burst=CONFIG.get('fetch_burst', 4),
+    batch_size=CONFIG.get('fetch_batch_size', 20),
+    metrics=METRICS,
+)
+# 逐标的滚动状态：启动后每次扫描只读回最近 SCAN_TAIL 根 K 线做增量更新
+LIVE_STATE = {}
+SCAN_TAIL = CONFIG.get('scan_tail', 64)
+# 持久化状态 (SQLite)：每轮扫描后 checkpoint 指标状态与最近信号，重启时恢复；
+# 设为空则不持久化，信号去重仍在内存中进行
+STATE_PATH = CONFIG.get('state_path', 'data/monitor_state.sqlite')
+STATE_FINGERPRINT = (f"rsi={RSI_PERIOD}/ema={ema_p}/window={ADAPTIVE_WINDOW}/pct={ADAPTIVE_PERCENTILE}"
+                     f"/daily_ema={DAILY_EMA_PERIOD}")
+STATE_STORE = StateStore(STATE_PATH or ':memory:', STATE_FINGERPRINT)
+DELIVERIES = deque()  # 后台发送线程回报的信号投递结果 (ticker, direction, bar_ts, ok)，由主线程写入 STATE_STORE
+DIRTY = set()  # 本轮扫描中更新过状态的标的
+# 横截面快照：每个标的一行 (最新 / 前一根指标)，多空规则与自定义筛选每轮对全部标的一次向量化求值
+SNAPSHOT = Snapshot()
+SCREENER = Screener({'oversold': 'RSI_Threshold' if ADAPTIVE_WINDOW else RSI_OVERSOLD,
+                     'overbought': RSI_OVERBOUGHT})
+SCREENER.register('long', LONG_RULE).register('short', SHORT_RULE)
+SCREENS = {}  # 自定义筛选 {名称: 表达式}，如 {"深度超卖": "RSI < 25 and Close > EMA_DYNAMIC"}、{"日线多头": "Close > EMA_DAILY"}
+for _name, _expr in CONFIG.get('screens', {}).items():
+    if _name in SCREENER.rules:
+        print(f"⚠️ 自定义筛选 {_name} 与内置规则重名，已忽略")
+        continue
+    try:
+        SCREENER.register(_name, _expr)
+        SCREENS[_name] = _expr
+    except ValueError as e:
+        print(f"⚠️ {e}，已忽略")
+SCREEN_HITS = {name: set() for name in SCREENS}  # 上一轮各筛选命中的标的，只推送新进入的
+SNAPSHOT_PATH = CONFIG.get('snapshot_path', 'data/market_snapshot.csv')  # 每轮导出快照表；设为空则不导出
+OVERVIEW_TRIGGER = CONFIG.get('overview_trigger', 'data/overview_next_scan')  # 文件存在时推送一次市场概览
+# 整个关注列表 15min 收益率的滚动相关矩阵，每根新收盘 K 线增量更新一次；信号消息中列出与之高度相关的标的
+CORR_ALERT = CONFIG.get('corr_alert', 0.8)  # 相关系数达到该值的标的列入信号消息；设为空则不跟踪
+CORRELATION = RollingCorrelation(WATCHLIST, CONFIG.get('corr_window', 100)) if CORR_ALERT else None
+CORR_TS = None  # 已输入相关矩阵的最新一根 K 线时间
 
 # 设置代理
 if PROXY_URL:
@@ -35,117 +101,284 @@ if PROXY_URL:
 # ================= 2. 交易时间网关 =================
 def is_market_open():
     try:
-        nyse = mcal.get_calendar('NYSE')
-        now_utc = datetime.now(pytz.utc)
-        schedule_df = nyse.schedule(start_date=now_utc, end_date=now_utc)
-        if schedule_df.empty: return False
-        return nyse.open_at_time(schedule_df, now_utc)
-    except:
+        return SCHEDULER.is_open()
+    except Exception:
         return False
     
-# ================= 核心算法 =================
-def calculate_rsi(series, period=14):
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0))
-    loss = (-delta.where(delta < 0, 0))
-    avg_gain = gain.ewm(com=period - 1, min_periods=period).mean()
-    avg_loss = loss.ewm(com=period - 1, min_periods=period).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-    
-def calculate_macd(series, fast=12, slow=26, signal=9):
-    exp1 = series.ewm(span=fast, adjust=False).mean()
-    exp2 = series.ewm(span=slow, adjust=False).mean()
-    macd_line = exp1 - exp2
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    hist = macd_line - signal_line
-    return macd_line, signal_line, hist
-    
 # ================= 监控逻辑 (更新索引修复) =================
-def fetch_and_check():
+def seed_state(ticker):
+    """从本地仓库取最近 59 天 15 分钟 K 线，全量重建该标的的指标状态"""
+    df = closed_bars(BAR_STORE.load(ticker, '15m', start=pd.Timestamp.now() - pd.Timedelta(days=59)))
+    state = TickerState(RSI_PERIOD, ema_p, threshold_window=ADAPTIVE_WINDOW, percentile=ADAPTIVE_PERCENTILE,
+                        daily_ema_period=DAILY_EMA_PERIOD)
+    state.seed(df)
+    LIVE_STATE[ticker] = state
+    return state
+
+def restore_state():
+    """从 checkpoint 恢复各标的的指标状态 (热启动)，之后的扫描只需衔接停机期间的新 K 线"""
+    if not STATE_PATH:
+        return 0
+    restored = {t: s for t, s in STATE_STORE.load_states().items() if t in WATCHLIST}
+    LIVE_STATE.update(restored)
+    return len(restored)
+
+def update_state(ticker, df):
+    """
+    增量更新；首次出现或检测到缺口时回退为全量重建
+    只输入已收盘的 K 线：状态的最新一根 (last) 即刚收盘的 K 线，信号不会在刚开盘的 K 线上判断
+    """
+    df = closed_bars(df)
+    state = LIVE_STATE.get(ticker)
+    if state is not None and not state.ingest(df):
+        # 停机时间超过 SCAN_TAIL 根 K 线：从本地仓库读回最后一根已提交 K 线之后的全部 K 线再衔接
+        start = state.bars[-1][0] if state.bars else state.tip_ts
+        if not state.ingest(closed_bars(BAR_STORE.load(ticker, '15m', start=start))):
+            print(f"⚠️ {ticker}: 数据出现缺口或历史已重写，重新预热指标")
+            state = None
+    if state is None:
+        state = seed_state(ticker)
+    DIRTY.add(ticker)
+    return state
+
+def market_now():
+    return pd.Timestamp.now(tz=MARKET_TZ).tz_localize(None)
+
+def closed_bars(df):
+    """去掉仍在形成中的最后一根 K 线 (K 线收盘后扫描时数据源通常已返回刚开盘的下一根)"""
+    if len(df) and df.index[-1] + BAR_INTERVAL > market_now():
+        return df.iloc[:-1]
+    return df
+
+def last_close(state):
+    """最近一根已收盘 K 线的收盘时刻 (没有已收盘 K 线时返回 None)"""
+    now = market_now()
+    if state.tip_ts is not None and state.tip_ts + BAR_INTERVAL <= now:
+        closed = state.tip_ts
+    elif state.bars:
+        closed = state.bars[-1][0]
+    else:
+        return None
+    return closed + BAR_INTERVAL
+
+def bar_lag(state):
+    """最近一根已收盘 K 线的收盘时刻距现在的秒数 (没有已收盘 K 线时返回 None)"""
+    closed = last_close(state)
+    return None if closed is None else (market_now() - closed).total_seconds()
+
+def delivery_callbacks(ticker, direction, bar_ts, closed):
+    """
+    信号消息的 (on_sent, on_failed) 回调，在通知后台线程中执行：
+    送达时记录 K 线收盘到消息送达的延迟 (含排队、限流等待与重试)；投递结果交给主线程确认 / 撤销去重登记
+    """
+    def on_sent():
+        if closed is not None:
+            METRICS.observe('signal_lag_seconds', (market_now() - closed).total_seconds(), ticker=ticker)
+        DELIVERIES.append((ticker, direction, bar_ts, True))
+
+    def on_failed():
+        DELIVERIES.append((ticker, direction, bar_ts, False))
+
+    return on_sent, on_failed
+
+def apply_deliveries():
+    """把已回报的投递结果写入 STATE_STORE (SQLite 连接只在主线程使用)：送达则确认，失败则撤销登记以便重新推送"""
+    while DELIVERIES:
+        ticker, direction, bar_ts, ok = DELIVERIES.popleft()
+        if ok:
+            STATE_STORE.confirm_signal(ticker, direction, bar_ts)
+        else:
+            STATE_STORE.release_signal(ticker, direction, bar_ts)
+            METRICS.inc('signal_send_failures_total', ticker=ticker)
+
+def update_correlation(tickers):
+    """把各标的新提交 (已收盘) 的 K 线按时间对齐，逐根推进滚动相关矩阵；首次调用时用缓冲区中的历史 K 线预热"""
+    global CORR_TS
+    if CORRELATION is None:
+        return
+    t0 = time.perf_counter()
+    closes = {}  # {K 线时间: {ticker: 收盘价}}
+    for t in tickers:
+        for ts, _, _, _, close, _ in reversed(LIVE_STATE[t].bars):
+            if CORR_TS is not None and ts <= CORR_TS:
+                break
+            closes.setdefault(ts, {})[t] = close
+    # 晚于 CORR_TS 到达的旧 K 线视为缺失；预热时只需窗口长度的 K 线
+    for ts in sorted(closes)[-(CORRELATION.window + 1):]:
+        CORRELATION.update([closes[ts].get(t, np.nan) for t in WATCHLIST])
+        CORR_TS = ts
+    METRICS.observe('stage_seconds', time.perf_counter() - t0, stage='correlation')
+
+def correlated_note(ticker):
+    """信号消息附注：关注列表中与该标的高度相关的标的"""
+    if CORRELATION is None:
+        return ''
+    peers = CORRELATION.top(ticker, k=3, min_corr=CORR_ALERT)
+    return f"\n🔹 高相关: {', '.join(f'{t} {rho:.2f}' for t, rho in peers)}" if peers else ''
+
+def check_signals(tickers):
+    """
+    对本轮扫描到的标的一次性求多空掩码与自定义筛选，再逐个处理命中的信号
+    :return: Screener.evaluate 的结果 (行为标的，列为规则名)
+    """
+    t0 = time.perf_counter()
+    apply_deliveries()
+    df = SNAPSHOT.frame(tickers)
+    masks = SCREENER.evaluate(df)
+    eligible = SCREENER.eligible(df).to_numpy()
+    METRICS.observe('stage_seconds', time.perf_counter() - t0, stage='signal')
+
+    lines = []
+    rows = zip(df.index, eligible, masks['long'].to_numpy(), masks['short'].to_numpy(),
+               df['Close'].to_numpy(), df['RSI'].to_numpy(), df['EMA_DYNAMIC'].to_numpy())
+    for ticker, ok, is_long, is_short, curr_price, curr_rsi, curr_ema in rows:
+        if not ok:
+            lines.append(f"⚠️ {ticker}: 无数据")
+            continue
+
+        # 1. 做多：趋势向上 (Price > EMA200) + RSI超卖 + MACD柱状图回升/金叉
+        # 2. 做空：趋势向下 (Price < EMA200) + RSI超买 + MACD柱状图走弱/死叉
+        if is_long:
+            direction = 'long'
+            msg = (f"🚀 *[多头信号] {ticker}*\n"
+                   f"🔹 价格: ${curr_price:.2f} (在EMA{ema_p}之上)\n"
+                   f"🔹 RSI: {curr_rsi:.2f} (超卖回升)\n"
+                   f"🔹 MACD: 柱状图转强" + correlated_note(ticker))
+        elif is_short:
+            direction = 'short'
+            msg = (f"📉 *[空头信号] {ticker}*\n"
+                   f"🔹 价格: ${curr_price:.2f} (在EMA{ema_p}之下)\n"
+                   f"🔹 RSI: {curr_rsi:.2f} (超买拐头)\n"
+                   f"🔹 MACD: 柱状图转弱" + correlated_note(ticker))
+        else:
+            STATE_STORE.end_setup(ticker)
+            lines.append(f"{ticker:5} | Price: {curr_price:7.2f} | RSI: {curr_rsi:5.2f} | 趋势: {'UP' if curr_price > curr_ema else 'DOWN'}")
+            continue
+
+        state = LIVE_STATE[ticker]
+        if not STATE_STORE.claim_signal(ticker, direction, state.tip_ts, msg):
+            # 同一形态在连续 K 线上持续成立：已推送 (或正在推送)，不再重复
+            METRICS.inc('signals_suppressed_total', ticker=ticker)
+            lines.append(f"{ticker:5} | {direction} 信号形态持续中 (已推送)，跳过")
+            continue
+        lines.append(f"Bingo! {ticker} 触发复合信号")
+        on_sent, on_failed = delivery_callbacks(ticker, direction, state.tip_ts, last_close(state))
+        NOTIFIER.submit(msg, on_sent=on_sent, on_failed=on_failed)
+        METRICS.inc('signals_total', ticker=ticker)
+
+    # 3. 自定义筛选：只推送本轮新进入的标的
+    for name in SCREENS:
+        hits = masks.index[masks[name].to_numpy()]
+        new = [t for t in hits if t not in SCREEN_HITS[name]]
+        SCREEN_HITS[name] = set(hits)
+        if new:
+            METRICS.inc('screen_hits_total', len(new), screen=name)
+            NOTIFIER.submit(f"🔎 *[筛选] {name}*\n" + "\n".join(
+                f"🔹 {t}: ${df.at[t, 'Close']:.2f} | RSI {df.at[t, 'RSI']:.2f}" for t in new))
+            lines.append(f"🔎 {name}: 新进入 {', '.join(new)}")
+    if lines:
+        print("\n".join(lines))
+    return masks
+
+def publish_snapshot(masks):
+    """导出快照表 (附本轮各规则命中列)；存在触发文件时推送一次市场概览"""
+    df = SNAPSHOT.frame()
+    if SNAPSHOT_PATH:
+        try:
+            os.makedirs(os.path.dirname(SNAPSHOT_PATH) or '.', exist_ok=True)
+            df.join(masks).to_csv(SNAPSHOT_PATH)
+        except OSError as e:
+            print(f"⚠️ 快照导出失败: {e}")
+    if OVERVIEW_TRIGGER and os.path.exists(OVERVIEW_TRIGGER):
+        os.remove(OVERVIEW_TRIGGER)
+        NOTIFIER.submit(overview(df, masks))
+
+def scan_watchlist():
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"\n[{now}]扫描中...")
     
-    for ticker in WATCHLIST:
+    # 并发批量拉取（令牌桶限流），每个标的数据一到就立即计算
+    start = time.perf_counter()
+    scanned = []
+    for ticker, df in FEED.scan(WATCHLIST, '15m', period='59d', tail=SCAN_TAIL):
+        # fetch: 从本轮开始到该标的数据到达的耗时 (含排队与限流)
+        METRICS.observe('stage_seconds', time.perf_counter() - start, stage='fetch', ticker=ticker)
         try:
-            # 随机延迟防止被封 IP
-            time.sleep(random.uniform(2, 5)) 
-
-            # 下载最近 5 天 15 分钟 K 线
-            df = yf.download(
-                ticker, 
-                period='59d', 
-                interval='15m', 
-                progress=False
-            )
-            
-            # --- 拍扁多重索引列名 ---
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            
-            # 使用 .empty 明确判断
-            if df.empty or len(df) < 200:
+            if df is None:
+                METRICS.inc('fetch_failures_total', ticker=ticker)
                 print(f"⚠️ {ticker}: 无数据")
                 continue
-                
-            # --- 指标计算 ---
-            close = df['Close']
-            df['RSI'] = calculate_rsi(close, CONFIG['rsi_period'])
-            # 动态计算指标
-            df['EMA_DYNAMIC'] = close.ewm(span=ema_p, adjust=False).mean()
-            df['MACD'], _, df['MACD_Hist'] = calculate_macd(close)
-
-            # --- 信号提取 ---
-            last = df.iloc[-1]
-            prev = df.iloc[-2]
-            
-            curr_price = float(last['Close'])
-            curr_rsi = float(last['RSI'])
-            # 信号逻辑中使用动态均线
-            curr_ema = float(last['EMA_DYNAMIC'])
-            curr_hist = float(last['MACD_Hist'])
-            prev_hist = float(prev['MACD_Hist'])
-
-            # --- 增强型交易逻辑 ---
-            msg = ""
-            
-            # 1. 做多策略：趋势向上 (Price > EMA200) + RSI超卖 + MACD柱状图回升/金叉
-            if curr_price > curr_ema:
-                if curr_rsi <= RSI_OVERSOLD and curr_hist > prev_hist:
-                    msg = (f"🚀 *[多头信号] {ticker}*\n"
-                           f"🔹 价格: ${curr_price:.2f} (在EMA{ema_p}之上)\n"
-                           f"🔹 RSI: {curr_rsi:.2f} (超卖回升)\n"
-                           f"🔹 MACD: 柱状图转强")
-
-            # 2. 做空策略：趋势向下 (Price < EMA200) + RSI超买 + MACD柱状图走弱/死叉
-            elif curr_price < curr_ema:
-                if curr_rsi >= RSI_OVERBOUGHT and curr_hist < prev_hist:
-                    msg = (f"📉 *[空头信号] {ticker}*\n"
-                           f"🔹 价格: ${curr_price:.2f} (在EMA{ema_p}之下)\n"
-                           f"🔹 RSI: {curr_rsi:.2f} (超买拐头)\n"
-                           f"🔹 MACD: 柱状图转弱")
-
-            if msg:
-                print(f"Bingo! {ticker} 触发复合信号")
-                send_telegram_msg(msg)
-            else:
-                print(f"{ticker:5} | Price: {curr_price:7.2f} | RSI: {curr_rsi:5.2f} | 趋势: {'UP' if curr_price > curr_ema else 'DOWN'}")
-
+            with METRICS.timer(stage='indicators', ticker=ticker):
+                state = update_state(ticker, df)
+            lag = bar_lag(state)
+            if lag is not None:
+                METRICS.observe('bar_lag_seconds', lag, ticker=ticker)
+            SNAPSHOT.update(ticker, state)
+            scanned.append(ticker)
         except Exception as e:
+            METRICS.inc('scan_errors_total', ticker=ticker)
             print(f"❌ {ticker} 错误: {e}")
 
+    try:
+        update_correlation(scanned)
+    except Exception as e:
+        METRICS.inc('scan_errors_total')
+        print(f"❌ 相关矩阵更新错误: {e}")
+
+    # 全部标的到齐后一次性判断信号
+    try:
+        masks = check_signals(scanned)
+        publish_snapshot(masks)
+    except Exception as e:
+        METRICS.inc('scan_errors_total')
+        print(f"❌ 信号筛选错误: {e}")
+
+def checkpoint():
+    """保存本轮更新过的指标状态 (设置了 STATE_PATH 时)，并提交信号去重记录"""
+    try:
+        with METRICS.timer(stage='checkpoint'):
+            apply_deliveries()
+            STATE_STORE.checkpoint({t: LIVE_STATE[t] for t in DIRTY if t in LIVE_STATE} if STATE_PATH else None)
+        DIRTY.clear()
+    except Exception as e:
+        METRICS.inc('checkpoint_failures_total')
+        print(f"⚠️ 状态 checkpoint 失败: {e}")
+
+def fetch_and_check():
+    """一轮扫描 + 延迟预算检查 + 指标导出"""
+    t0 = time.perf_counter()
+    with NOTIFIER.batch():
+        if PROFILE_TRIGGER and os.path.exists(PROFILE_TRIGGER):
+            os.remove(PROFILE_TRIGGER)
+            profile_call(scan_watchlist, path=f"{PROFILE_TRIGGER}.prof")
+        else:
+            scan_watchlist()
+    checkpoint()
+    elapsed = time.perf_counter() - t0
+
+    METRICS.observe('scan_seconds', elapsed)
+    METRICS.set('last_scan_seconds', elapsed)
+    METRICS.set('last_scan_timestamp', time.time())
+    if LATENCY_BUDGET and elapsed > LATENCY_BUDGET:
+        METRICS.inc('budget_violations_total')
+        print(f"⚠️ 本轮扫描耗时 {elapsed:.1f}s，超出预算 {LATENCY_BUDGET}s")
+    if METRICS_PATH:
+        try:
+            METRICS.export(METRICS_PATH)
+        except OSError as e:
+            print(f"⚠️ 指标导出失败: {e}")
+
 # ================= 运行区 =================
 if __name__ == "__main__":
     print(f"🚀 机器人已启动。当前监控: {WATCHLIST}")    
+    restored = restore_state()
+    if restored:
+        print(f"♻️ 已从 {STATE_PATH} 恢复 {restored} 个标的的指标状态")
 
     if is_market_open():
-        print(f"   检查频率: 每 15 分钟") 
-        # 启动先跑一次
-        fetch_and_check()
-        schedule.every(15).minutes.do(fetch_and_check)
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        print(f"   检查频率: 每根 15 分钟 K 线收盘后 {SCHEDULER.settle.total_seconds():.0f} 秒")
     else:
         print(f"非交易时间，股票现价：")
-        fetch_and_check()
+    # 启动先跑一次，之后与 K 线收盘对齐
+    fetch_and_check()
+    SCHEDULER.run(fetch_and_check)
@@ -1,51 +1,244 @@
-import requests
+import atexit
+import contextlib
 import json
+import queue
+import threading
+import time
 
-def send_telegram_msg(message):
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import TokenBucket
+
+TELEGRAM_LIMIT = 4096  # 单条消息最大字符数
+_STOP = object()
+
+
+def _split(text, limit):
+    """超长的单条消息按行切分，单行仍超长时硬切"""
+    if len(text) <= limit:
+        return [text]
+    pieces, current = [], ''
+    for line in text.split('\n'):
+        while len(line) > limit:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            pieces.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _coalesce(messages, limit, sep):
+    """:return: [(合并后的消息, [最后一段落在该条中的原消息下标])]"""
+    chunks, current, ends = [], '', []
+    for i, message in enumerate(messages):
+        for piece in _split(message, limit):
+            if current and len(current) + len(sep) + len(piece) <= limit:
+                current += sep + piece
+            else:
+                if current:
+                    chunks.append((current, ends))
+                    ends = []
+                current = piece
+        ends.append(i)
+    if current:
+        chunks.append((current, ends))
+    return chunks
+
+
+def coalesce(messages, limit=TELEGRAM_LIMIT, sep='\n\n'):
+    """把多条消息合并成尽量少的若干条，每条不超过 limit (只在消息边界处拼接，不拆坏 Markdown)"""
+    return [chunk for chunk, _ in _coalesce(messages, limit, sep)]
+
+
+class TelegramNotifier:
+    def __init__(self, token, chat_id, proxy_url=None, base_url='https://api.telegram.org',
+                 timeout=10, max_retries=5, backoff=1.0, rate=1.0, metrics=None):
+        """
+        :param base_url: Bot API 地址，可指向本地替身 HTTP 服务做测试
+        :param max_retries: 429 / 5xx / 网络异常时的最大重试次数
+        :param backoff: 非 429 失败的指数退避基数 (秒)；429 按服务端返回的 retry_after 等待
+        :param rate: 每秒最多发送的消息数 (Telegram 对同一会话约 1 条/秒)
+        :param metrics: 可选 metrics.Metrics，记录发送耗时 (stage=notify) 与排队时间
+        """
+        self.token = token
+        self.chat_id = chat_id
+        self.url = f"{base_url.rstrip('/')}/bot{token}/sendMessage"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate, 1)
+        self.metrics = metrics
+        self.sleep = time.sleep
+
+        # 复用连接池，避免每条消息重新握手
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        if proxy_url:
+            self.session.proxies = {"http": proxy_url, "https": proxy_url}
+
+        self.queue = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+        self._batch = None
+        self._warned = False
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """:param config: 配置 dict 或 config.json 路径"""
+        if isinstance(config, str):
+            with open(config, 'r') as f:
+                config = json.load(f)
+        return cls(config.get('telegram_token'), config.get('telegram_chat_id'), config.get('proxy_url'),
+                   base_url=config.get('telegram_api_url', 'https://api.telegram.org'), **kwargs)
+
+    @property
+    def enabled(self):
+        return bool(self.token and self.chat_id)
+
+    # ---------- 同步发送 ----------
+    def send(self, message):
+        """同步发送一条消息 (含限流与重试)，返回 Telegram 的响应 dict，失败返回 None"""
+        if not self.enabled:
+            if not self._warned:
+                print("❌ 错误：未在 config.json 中配置 Telegram 参数")
+                self._warned = True
+            return None
 
-    try:
-        # 1. 加载配置
-        with open('config.json', 'r') as f:
-            config = json.load(f)
-        
-        token = config.get('telegram_token')
-        chat_id = config.get('telegram_chat_id')
-        proxy_url = config.get('proxy_url') # 获取代理地址
-        
-        if not token or not chat_id:
-            print("❌ 错误：未在 config.json 中配置 Telegram 参数")
-            return
-
-        # 2. 构造请求地址和内容
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
         payload = {
-            "chat_id": chat_id,
+            "chat_id": self.chat_id,
             "text": message,
             "parse_mode": "Markdown"
         }
-        
-        # 3. 配置代理字典
-        proxies = None
-        if proxy_url:
-            proxies = {
-                "http": proxy_url,
-                "https": proxy_url
-            }
-        
-        # 4. 发送请求（传入 proxies 参数）
-        response = requests.post(
-            url, 
-            json=payload, 
-            proxies=proxies, 
-            timeout=10
-        )
-        
-        # 检查是否发送成功
-        result = response.json()
-        if not result.get("ok"):
-            print(f"❌ Telegram 返回错误: {result.get('description')}")
-        
-        return result
-        
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            t0 = time.perf_counter()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                result = response.json()
+            except (requests.RequestException, ValueError) as e:
+                result, response, error = None, None, e
+            else:
+                error = None
+            finally:
+                if self.metrics is not None:
+                    self.metrics.observe('stage_seconds', time.perf_counter() - t0, stage='notify')
+
+            if error is None and response.status_code != 429 and response.status_code < 500:
+                if not result.get("ok"):
+                    print(f"❌ Telegram 返回错误: {result.get('description')}")
+                return result
+
+            if attempt >= self.max_retries:
+                print(f"❌ Telegram 发送失败 (已重试 {attempt} 次): {error or result}")
+                return result
+            if error is None and response.status_code == 429:
+                # 被限流：按服务端给出的 retry_after 等待
+                wait = (result or {}).get('parameters', {}).get('retry_after', self.backoff * 2 ** attempt)
+                print(f"⏳ Telegram 限流，{wait}s 后重试")
+            else:
+                wait = self.backoff * 2 ** attempt
+            self.sleep(wait)
+            attempt += 1
+
+    # ---------- 后台队列 ----------
+    def _start(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name='telegram-notifier', daemon=True)
+                self.worker.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                message, queued_at, callbacks = item
+                if self.metrics is not None:
+                    self.metrics.observe('notify_queue_seconds', time.monotonic() - queued_at)
+                try:
+                    result = self.send(message)
+                except Exception as e:
+                    print(f"❌ Telegram 发送异常: {e}")
+                    result = None
+                ok = bool(result and result.get("ok"))
+                for on_sent, on_failed in callbacks:
+                    callback = on_sent if ok else on_failed
+                    if callback is not None:
+                        callback()
+            except Exception as e:
+                print(f"❌ Telegram 发送异常: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _enqueue(self, message, callbacks=()):
+        self._start()
+        self.queue.put((message, time.monotonic(), list(callbacks)))
+
+    def submit(self, message, on_sent=None, on_failed=None):
+        """
+        非阻塞提交；处于 batch() 中时先暂存，批次结束时合并发送
+        :param on_sent: 可选回调，在后台线程中于该消息 (所在的合并消息) 发送成功后调用，如记录端到端延迟
+        :param on_failed: 可选回调，重试用尽或发送异常时在后台线程中调用，如撤销信号去重登记
+        """
+        callbacks = [(on_sent, on_failed)] if on_sent is not None or on_failed is not None else []
+        with self.lock:
+            if self._batch is not None:
+                self._batch.append((message, callbacks))
+                return
+        self._enqueue(message, callbacks)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """收集一轮扫描中的所有消息，结束时合并为不超过长度上限的若干条再入队"""
+        with self.lock:
+            self._batch = []
+        try:
+            yield self
+        finally:
+            with self.lock:
+                items, self._batch = self._batch, None
+            for chunk, ends in _coalesce([m for m, _ in items], TELEGRAM_LIMIT, '\n\n'):
+                self._enqueue(chunk, [cb for i in ends for cb in items[i][1]])
+
+    def flush(self):
+        """阻塞直到队列中的消息全部处理完"""
+        self.queue.join()
+
+    def close(self, timeout=30):
+        """发送完剩余消息后停止后台线程"""
+        with self.lock:
+            worker, self.worker = self.worker, None
+        if worker is not None:
+            self.queue.put(_STOP)
+            worker.join(timeout)
+
+
+_DEFAULT = None
+
+def default_notifier():
+    """按 config.json 创建的全局实例 (配置只读取一次)"""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = TelegramNotifier.from_config('config.json')
+    return _DEFAULT
+
+
+def send_telegram_msg(message):
+    """兼容旧接口：同步发送，复用全局实例的配置与连接池"""
+    try:
+        return default_notifier().send(message)
     except Exception as e:
-        print(f"❌ Telegram 发送异常: {e}")
\ No newline at end of file
+        print(f"❌ Telegram 发送异常: {e}")
@@ -0,0 +1,81 @@
+# panel.py
+# 时间 × 标的 对齐面板：以所有标的时间戳的并集为统一时间轴，每个字段存为连续的二维 float64 数组 (T × N)，
+# 另有 valid 掩码标记该标的在该时刻是否有 K 线。模拟时按整数行号 / 列号取值，不再做逐 bar 的 pandas 标签查找。
+import numpy as np
+import pandas as pd
+
+
+def union_index(frames):
+    """所有标的时间戳的并集（升序）"""
+    stamps = [df.index.values.astype('datetime64[ns]') for df in frames.values() if len(df)]
+    if not stamps:
+        return pd.DatetimeIndex([])
+    return pd.DatetimeIndex(np.unique(np.concatenate(stamps)))
+
+
+class Panel:
+    def __init__(self, index, tickers, fields, valid):
+        """
+        :param index: 统一时间轴 (DatetimeIndex，长度 T)
+        :param tickers: 列顺序 (长度 N)
+        :param fields: {字段名: T × N float64 数组}
+        :param valid: T × N bool 数组
+        """
+        self.index = index
+        self.tickers = list(tickers)
+        self.columns = {t: j for j, t in enumerate(self.tickers)}
+        self.fields = fields
+        self.valid = valid
+
+    @classmethod
+    def from_frames(cls, frames, fields=None, index=None):
+        """
+        :param frames: {ticker: DataFrame}，列顺序即 frames 的顺序
+        :param fields: 需要的列，默认取第一个 DataFrame 的全部列
+        :param index: 指定时间轴，默认为全部标的时间戳的并集；不在时间轴上的 K 线会被丢弃
+        """
+        tickers = list(frames)
+        if fields is None:
+            fields = list(frames[tickers[0]].columns) if tickers else []
+        index = union_index(frames) if index is None else pd.DatetimeIndex(index)
+        T, N = len(index), len(tickers)
+
+        data = {f: np.full((T, N), np.nan) for f in fields}
+        valid = np.zeros((T, N), dtype=bool)
+        for j, t in enumerate(tickers):
+            df = frames[t]
+            rows = index.get_indexer(df.index)
+            keep = rows >= 0
+            rows = rows[keep]
+            valid[rows, j] = True
+            for f in fields:
+                data[f][rows, j] = df[f].to_numpy(dtype=float)[keep]
+        return cls(index, tickers, data, valid)
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def column(self, field, ticker):
+        """某个标的在时间轴上的一列 (无数据处为 NaN)"""
+        return self.fields[field][:, self.columns[ticker]]
+
+    def compact(self, field, ticker):
+        """某个标的自己的序列 (只含有 K 线的行)"""
+        j = self.columns[ticker]
+        return self.fields[field][self.valid[:, j], j]
+
+    def to_arrays(self):
+        """转成引擎使用的扁平数组字典 (可直接放入共享内存)"""
+        arrays = {
+            'timeline': np.asarray(self.index.values.astype('datetime64[ns]').view('int64')),
+            'tickers': np.array(self.tickers, dtype=str),
+            'valid': self.valid,
+        }
+        arrays.update(self.fields)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, fields=None):
+        names = [k for k in arrays if k not in ('timeline', 'tickers', 'valid')] if fields is None else fields
+        index = pd.DatetimeIndex(arrays['timeline'].view('datetime64[ns]'))
+        return cls(index, [str(t) for t in arrays['tickers']], {f: arrays[f] for f in names}, arrays['valid'])
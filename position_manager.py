@@ -1,23 +1,67 @@
 # position_manager.py
+from collections.abc import Mapping
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from ledger import Ledger
+from log_writer import SIGNAL_SCHEMA, TRADE_SCHEMA, ColumnarLog
+
+
+def _signal_log(log_dir, chunk_size):
+    """log_dir 为 None 时用内存列表，否则写入 {log_dir}/signals 下的分块列式文件"""
+    if log_dir is None:
+        return []
+    return ColumnarLog(os.path.join(log_dir, 'signals'), SIGNAL_SCHEMA, chunk_size)
+
 
 class PositionManager:
         
-    def __init__(self, total_cash, num_slots=5):
+    def __init__(self, total_cash, num_slots=5, log_dir=None, chunk_size=10000, risk=None):
+        """
+        :param log_dir: 信号 / 成交日志目录，None 表示保存在内存列表中
+        :param chunk_size: 日志每积累多少条写出一个分块
+        :param risk: risk.CorrelationGuard，拒绝 / 缩减与现有持仓高度相关的入场；None 表示不限制
+        """
         self.initial_cash = total_cash
         self.current_cash = total_cash
         self.num_slots = num_slots
         self.slot_size = total_cash / num_slots
         self.positions = {}  # 结构: {ticker: {buy_price, shares, trailing_stop, entry_value}}
-        self.closed_trades = [] # 记录已完成的交易数据
-        self.signal_log = []  # 新增：记录所有触发过的信号
+        # 记录已完成的交易数据
+        self.closed_trades = [] if log_dir is None else ColumnarLog(os.path.join(log_dir, 'trades'), TRADE_SCHEMA, chunk_size)
+        self.signal_log = _signal_log(log_dir, chunk_size)  # 新增：记录所有触发过的信号
+        self.ledger = Ledger()  # 持仓区间与现金流水，回测结束后由 ledger.build_equity 重建权益曲线
+        self.risk = risk
+
+    @property
+    def n_trades(self):
+        """已平仓交易笔数"""
+        return len(self.closed_trades)
+
+    def closed_pnl(self):
+        """已平仓交易的盈亏金额数组 (与 closed_trades 的 'PnL Cash' 相同，分块日志只读该列)"""
+        if isinstance(self.closed_trades, ColumnarLog):
+            return self.closed_trades.read(['PnL Cash'])['PnL Cash'].to_numpy(dtype=float)
+        return np.array([t['PnL Cash'] for t in self.closed_trades], dtype=float)
+
+    def flush_logs(self):
+        """把日志缓存写到磁盘 (内存列表模式下无操作)"""
+        for log in (self.closed_trades, self.signal_log):
+            if isinstance(log, ColumnarLog):
+                log.flush()
         
     def can_open(self, ticker):
-        """是否有空位且未持有该股"""
-        return len(self.positions) < self.num_slots and ticker not in self.positions
+        """是否有空位、未持有该股且与现有持仓的相关性未超限"""
+        return (len(self.positions) < self.num_slots and ticker not in self.positions
+                and (self.risk is None or self.risk.allows(ticker, self.positions)))
 
     def open(self, ticker, price, trailing_stop, time):
-        """开仓逻辑"""
-        shares = self.slot_size // price
+        """开仓逻辑 (与现有持仓相关性较高时按 risk.scale 缩减仓位)"""
+        size = self.slot_size if self.risk is None else self.slot_size * self.risk.scale(ticker, self.positions)
+        shares = size // price
         if shares <= 0: return False
         
         cost = shares * price
@@ -29,6 +73,7 @@ class PositionManager:
             'entry_time': time
         }
         self.current_cash -= cost
+        self.ledger.open(ticker, time, shares, cost)
         return True
 
     def update_trailing_stop(self, ticker, new_stop):
@@ -42,6 +87,7 @@ class PositionManager:
                 pos = self.positions.pop(ticker)
                 exit_value = pos['shares'] * price
                 self.current_cash += exit_value
+                self.ledger.close(ticker, time, exit_value)
                 
                 pnl_pct = (price - pos['buy_price']) / pos['buy_price']
                 
@@ -54,7 +100,7 @@ class PositionManager:
                     'Close Time': time,
                     'Total Buy Cost': round(pos['entry_value'], 2),
                     'Total Close Value': round(exit_value, 2),
-                    'PnL %': f"{pnl_pct:.2%}",
+                    'pnl_pct': pnl_pct,
                     'PnL Cash': round(exit_value - pos['entry_value'], 2)
                 })
                 return True
@@ -63,4 +109,245 @@ class PositionManager:
     def get_total_value(self, current_prices):
         """计算当前账户总价值 (现金 + 持仓市值)"""
         market_value = sum(self.positions[t]['shares'] * current_prices.get(t, self.positions[t]['buy_price']) for t in self.positions)
-        return self.current_cash + market_value
\ No newline at end of file
+        return self.current_cash + market_value
+
+
+# ================= 数组版仓位管理 =================
+# 成交记录的类型化结构：只保存数值，导出时才格式化
+TRADE_DTYPE = np.dtype([
+    ('ticker_id', 'i4'),
+    ('buy_price', 'f8'),
+    ('buy_time', 'i8'),      # 纳秒时间戳
+    ('close_price', 'f8'),
+    ('close_time', 'i8'),
+    ('shares', 'f8'),
+    ('entry_value', 'f8'),
+    ('exit_value', 'f8'),
+])
+
+
+def _ns(time):
+    return pd.Timestamp(time).value
+
+
+class _PositionsView(Mapping):
+    """只读视图，兼容 PositionManager.positions 的 dict 用法 (in / len / [ticker]['trailing_stop'] / items)"""
+
+    def __init__(self, pm):
+        self._pm = pm
+
+    def __getitem__(self, ticker):
+        pm = self._pm
+        i = pm.ids.get(ticker)
+        if i is None or not pm.held[i]:
+            raise KeyError(ticker)
+        return {
+            'buy_price': pm.buy_price[i],
+            'shares': pm.shares[i],
+            'trailing_stop': pm.trailing_stop[i],
+            'entry_value': pm.entry_value[i],
+            'entry_time': pd.Timestamp(pm.entry_time[i]),
+        }
+
+    def __contains__(self, ticker):
+        i = self._pm.ids.get(ticker)
+        return i is not None and bool(self._pm.held[i])
+
+    def __iter__(self):
+        return (self._pm.tickers[i] for i in self._pm.held_ids())
+
+    def __len__(self):
+        return self._pm.open_count
+
+
+class ArrayPositionManager:
+    """
+    数组版仓位管理：坑位 / 股数 / 成本 / 止损 / 现金保存在按 ticker id 索引的 NumPy 数组中，
+    提供全持仓向量化估值与追踪止损更新；can_open / open / close / update_trailing_stop 语义与 PositionManager 一致，可直接替换
+    """
+
+    def __init__(self, total_cash, num_slots=5, tickers=(), trade_capacity=256, log_dir=None, chunk_size=10000,
+                 risk=None):
+        self.initial_cash = total_cash
+        self.current_cash = total_cash
+        self.num_slots = num_slots
+        self.slot_size = total_cash / num_slots
+        self.tickers = []
+        self.ids = {}
+        self.held = np.zeros(0, dtype=bool)
+        self.shares = np.zeros(0)
+        self.buy_price = np.zeros(0)
+        self.trailing_stop = np.zeros(0)
+        self.entry_value = np.zeros(0)
+        self.entry_time = np.zeros(0, dtype='i8')
+        self.open_seq = np.zeros(0, dtype='i8')  # 开仓顺序，保证逐个遍历时与 dict 插入顺序一致
+        self._seq = 0
+        self.open_count = 0
+        self._trades = np.zeros(trade_capacity, dtype=TRADE_DTYPE)
+        self._n_trades = 0
+        self.signal_log = _signal_log(log_dir, chunk_size)
+        self.ledger = Ledger()
+        self.risk = risk
+        self.positions = _PositionsView(self)
+        for t in tickers:
+            self.ticker_id(t)
+
+    def ticker_id(self, ticker):
+        """返回 ticker 的数组下标，新标的自动扩容登记"""
+        i = self.ids.get(ticker)
+        if i is None:
+            i = self.ids[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+            self.held = np.append(self.held, False)
+            for name in ('shares', 'buy_price', 'trailing_stop', 'entry_value', 'entry_time', 'open_seq'):
+                setattr(self, name, np.append(getattr(self, name), 0))
+        return i
+
+    def held_ids(self):
+        """当前持仓的 id，按开仓顺序排列"""
+        ids = np.flatnonzero(self.held)
+        return ids[np.argsort(self.open_seq[ids], kind='stable')]
+
+    # ---------- 与 PositionManager 相同的接口 ----------
+    def can_open(self, ticker):
+        """是否有空位、未持有该股且与现有持仓的相关性未超限"""
+        return (self.open_count < self.num_slots and ticker not in self.positions
+                and (self.risk is None or self.risk.allows(ticker, self._held_tickers())))
+
+    def _held_tickers(self):
+        return [self.tickers[i] for i in self.held_ids()]
+
+    def open(self, ticker, price, trailing_stop, time):
+        """开仓逻辑 (与现有持仓相关性较高时按 risk.scale 缩减仓位)"""
+        size = self.slot_size if self.risk is None else self.slot_size * self.risk.scale(ticker, self._held_tickers())
+        shares = size // price
+        if shares <= 0: return False
+
+        i = self.ticker_id(ticker)
+        cost = shares * price
+        self.held[i] = True
+        self.shares[i] = shares
+        self.buy_price[i] = price
+        self.trailing_stop[i] = trailing_stop
+        self.entry_value[i] = cost
+        self.entry_time[i] = _ns(time)
+        self.open_seq[i] = self._seq
+        self._seq += 1
+        self.open_count += 1
+        self.current_cash -= cost
+        self.ledger.open(ticker, time, shares, cost)
+        return True
+
+    def update_trailing_stop(self, ticker, new_stop):
+        """动态更新追踪止损位（只升不降）"""
+        if ticker in self.positions:
+            i = self.ids[ticker]
+            self.trailing_stop[i] = max(self.trailing_stop[i], new_stop)
+
+    def close(self, ticker, price, time):
+        """平仓逻辑"""
+        if ticker not in self.positions:
+            return False
+        self._close_id(self.ids[ticker], price, _ns(time))
+        return True
+
+    def _close_id(self, i, price, time_ns):
+        exit_value = self.shares[i] * price
+        self.current_cash += exit_value
+        if self._n_trades == len(self._trades):
+            self._trades = np.concatenate((self._trades, np.zeros(len(self._trades), dtype=TRADE_DTYPE)))
+        self._trades[self._n_trades] = (i, self.buy_price[i], self.entry_time[i], price, time_ns,
+                                        self.shares[i], self.entry_value[i], exit_value)
+        self._n_trades += 1
+        self.ledger.close(self.tickers[i], time_ns, exit_value)
+        self.held[i] = False
+        self.open_count -= 1
+
+    def flush_logs(self):
+        """把信号日志缓存写到磁盘 (成交记录本身就是紧凑的类型化数组)"""
+        if isinstance(self.signal_log, ColumnarLog):
+            self.signal_log.flush()
+
+    def get_total_value(self, current_prices):
+        """计算当前账户总价值 (现金 + 持仓市值)，缺失价格按买入价估值"""
+        market_value = sum(self.shares[i] * current_prices.get(self.tickers[i], self.buy_price[i])
+                           for i in self.held_ids())
+        return self.current_cash + market_value
+
+    # ---------- 向量化接口 (prices 为按 ticker id 对齐的数组，NaN 表示缺失) ----------
+    def mark_to_market(self, prices):
+        """全持仓一次性估值，缺失价格按买入价估值"""
+        n = len(self.tickers)
+        px = np.asarray(prices, dtype=float)[:n]
+        px = np.where(np.isnan(px), self.buy_price, px)
+        return self.current_cash + float(np.sum(self.shares * px, where=self.held))
+
+    def update_trailing_stops(self, new_stops):
+        """全持仓一次性更新追踪止损（只升不降，NaN 不更新）"""
+        new_stops = np.asarray(new_stops, dtype=float)[:len(self.tickers)]
+        raise_ = self.held & (new_stops > self.trailing_stop)
+        self.trailing_stop[raise_] = new_stops[raise_]
+
+    def stops_hit(self, prices):
+        """返回价格触及止损的持仓 id"""
+        px = np.asarray(prices, dtype=float)[:len(self.tickers)]
+        return np.flatnonzero(self.held & (px <= self.trailing_stop))
+
+    def close_ids(self, ids, prices, time):
+        """按 id 批量平仓，成交价取 prices[id]"""
+        t = _ns(time)
+        for i in ids:
+            if self.held[i]:
+                self._close_id(i, prices[i], t)
+
+    # ---------- 导出 ----------
+    @property
+    def trades(self):
+        """类型化成交记录 (结构化数组视图)"""
+        return self._trades[:self._n_trades]
+
+    def trades_frame(self):
+        """数值型成交明细 DataFrame"""
+        tr = self.trades
+        df = pd.DataFrame({
+            'Ticker': np.array(self.tickers, dtype=object)[tr['ticker_id']] if len(tr) else [],
+            'Buy Time': pd.to_datetime(tr['buy_time']),
+            'Buy Price': tr['buy_price'],
+            'Close Time': pd.to_datetime(tr['close_time']),
+            'Close Price': tr['close_price'],
+            'Shares': tr['shares'],
+            'Total Buy Cost': tr['entry_value'],
+            'Total Close Value': tr['exit_value'],
+        })
+        df['PnL Cash'] = df['Total Close Value'] - df['Total Buy Cost']
+        df['pnl_pct'] = (df['Close Price'] - df['Buy Price']) / df['Buy Price']
+        return df
+
+    @property
+    def n_trades(self):
+        """已平仓交易笔数 (不构造 closed_trades 记录)"""
+        return self._n_trades
+
+    def closed_pnl(self):
+        """已平仓交易的盈亏金额数组，直接由类型化成交记录计算 (与 closed_trades 一样保留两位小数)"""
+        tr = self.trades
+        return np.round(tr['exit_value'] - tr['entry_value'], 2)
+
+    @property
+    def closed_trades(self):
+        """与 PositionManager.closed_trades 相同格式的记录（仅在导出时格式化）"""
+        records = []
+        for r in self.trades:
+            pnl_pct = (r['close_price'] - r['buy_price']) / r['buy_price']
+            records.append({
+                'Ticker': self.tickers[r['ticker_id']],
+                'Buy Price': round(r['buy_price'], 2),
+                'Buy Time': pd.Timestamp(r['buy_time']),
+                'Close Price': round(r['close_price'], 2),
+                'Close Time': pd.Timestamp(r['close_time']),
+                'Total Buy Cost': round(r['entry_value'], 2),
+                'Total Close Value': round(r['exit_value'], 2),
+                'pnl_pct': pnl_pct,
+                'PnL Cash': round(r['exit_value'] - r['entry_value'], 2)
+            })
+        return records
@@ -0,0 +1,30 @@
+# ratelimit.py
+# 限流工具：行情拉取 (data_feed) 与 Telegram 推送 (notifier) 共用的令牌桶。
+import threading
+import time
+
+
+class TokenBucket:
+    """线程安全的令牌桶：平均每秒 rate 个请求，允许 capacity 个突发"""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """阻塞直到拿到令牌"""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
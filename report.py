@@ -0,0 +1,149 @@
+# report.py
+# 无界面回测报告：净值 / 回撤 / 收益分布图输出为 PNG，并生成一个内嵌图片与绩效摘要的 HTML。
+# 超过 max_points 的序列先用 LTTB (Largest-Triangle-Three-Buckets) 降采样再绘图，保留峰谷形状；
+# matplotlib 只在真正生成报告时才导入，并固定使用 Agg 后端，不依赖显示器。
+import base64
+import html
+import os
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 2000
+
+
+# ================= 1. 降采样 =================
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样
+    :param x / y: 等长 1-D 数组 (x 单调递增)
+    :param threshold: 目标点数 (含首尾两点)
+    :return: 选中点的下标 (升序)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x - x[0]
+    # 中间 n - 2 个点平均分成 threshold - 2 个桶 (threshold < n 时每个桶至少一个点)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.intp)
+    # 每个桶的 "下一桶" 均值点 (三角形的第三个顶点，最后一个桶的下一桶只含末点)，用前缀和一次算出
+    nxt_lo, nxt_hi = edges[1:], np.append(edges[2:], n)
+    cx, cy = np.concatenate(([0.0], np.cumsum(x))), np.concatenate(([0.0], np.cumsum(y)))
+    avg_x = (cx[nxt_hi] - cx[nxt_lo]) / (nxt_hi - nxt_lo)
+    avg_y = (cy[nxt_hi] - cy[nxt_lo]) / (nxt_hi - nxt_lo)
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        px, py = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[b]) * (py - y[a]) - (x[a] - px) * (avg_y[b] - y[a]))
+        # NaN 视为面积最小，不会被选中
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[b + 1] = a
+    return selected
+
+
+def downsample(series, max_points=MAX_POINTS):
+    """对 Series 做 LTTB 降采样 (DatetimeIndex 按真实时间间隔计算)，点数不超过 max_points 时原样返回"""
+    if len(series) <= max_points:
+        return series
+    index = series.index
+    x = index.as_unit('ns').asi8 if isinstance(index, pd.DatetimeIndex) else np.arange(len(series))
+    return series.iloc[lttb(x, series.to_numpy(dtype=float), max_points)]
+
+
+# ================= 2. 报告数据 =================
+def trade_returns(ledger, last_prices=None):
+    """
+    单笔收益率：已平仓按平仓市值 / 成本，未平仓按 last_prices 的浮动盈亏
+    :param ledger: pm.ledger
+    :param last_prices: {ticker: 最新价}，None 表示只统计已平仓交易
+    """
+    exit_time = np.asarray(ledger.exit_time, dtype='int64')
+    cost = np.asarray(ledger.cost, dtype=float)
+    closed = exit_time >= 0
+    returns = list(np.asarray(ledger.exit_value, dtype=float)[closed] / cost[closed] - 1)
+    if last_prices is not None:
+        for i in np.flatnonzero(~closed):
+            px = last_prices.get(ledger.tickers[i])
+            if px is not None:
+                returns.append(ledger.shares[i] * px / cost[i] - 1)
+    return np.asarray(returns, dtype=float)
+
+
+def _pyplot():
+    import matplotlib  # 延迟导入
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+# ================= 3. 绘图 =================
+def plot_equity(equity, initial_cash, path, title, max_points=MAX_POINTS):
+    """净值 + 回撤两联图 (回撤在全量数据上计算后再降采样)"""
+    plt = _pyplot()
+    drawdown = equity / equity.cummax() - 1
+    eq, dd = downsample(equity, max_points), downsample(drawdown, max_points)
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+    ax1.plot(eq.index, eq.to_numpy(), color='#27ae60', label='Total Equity')
+    ax1.fill_between(eq.index, initial_cash, eq.to_numpy(), where=eq.to_numpy() > initial_cash, color='green', alpha=0.1)
+    ax1.set_title(title)
+    ax1.set_ylabel("Total Asset ($)")
+    ax1.grid(True, alpha=0.2)
+    ax2.fill_between(dd.index, dd.to_numpy(), 0, color='#e74c3c', alpha=0.3)
+    ax2.set_ylabel("Drawdown %")
+    ax2.grid(True, alpha=0.2)
+    fig.savefig(path, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_returns(returns, path, bins=20):
+    """单笔收益分布直方图"""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.hist(returns, bins=bins, color='skyblue', edgecolor='white')
+    ax.axvline(0, color='red', linestyle='--')
+    ax.set_title("Return Distribution (Realized + Unrealized)")
+    ax.grid(True, alpha=0.2)
+    fig.savefig(path, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+
+
+def _html(title, stats, images):
+    rows = ''.join(f"<tr><th>{html.escape(str(k))}</th><td>{html.escape(str(v))}</td></tr>" for k, v in stats.items())
+    figs = ''
+    for name in images:
+        with open(name, 'rb') as f:
+            data = base64.b64encode(f.read()).decode('ascii')
+        figs += f'<p><img src="data:image/png;base64,{data}" alt="{html.escape(os.path.basename(name))}"></p>\n'
+    return (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+            "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}"
+            "th,td{border:1px solid #ccc;padding:4px 10px;text-align:left}img{max-width:100%}</style></head>\n"
+            f"<body><h1>{html.escape(title)}</h1>\n<table>{rows}</table>\n{figs}</body></html>\n")
+
+
+def write_report(out_dir, equity, initial_cash, returns=None, stats=None, title="Backtest Report",
+                 max_points=MAX_POINTS):
+    """
+    生成报告文件
+    :param out_dir: 输出目录 (不存在则创建)
+    :param equity: 以时间为索引的净值 Series
+    :param returns: 单笔收益率数组 (trade_returns)，为空时不画分布图
+    :param stats: 写进 HTML 摘要表的 {名称: 值}
+    :return: {'equity': png, 'returns': png (可能没有), 'html': html} 路径
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {'equity': os.path.join(out_dir, 'equity.png')}
+    plot_equity(equity, initial_cash, paths['equity'], title, max_points)
+    if returns is not None and len(returns):
+        paths['returns'] = os.path.join(out_dir, 'returns.png')
+        plot_returns(returns, paths['returns'])
+    paths['html'] = os.path.join(out_dir, 'report.html')
+    with open(paths['html'], 'w', encoding='utf-8') as f:
+        f.write(_html(title, stats or {}, [p for k, p in paths.items() if k != 'html']))
+    return paths
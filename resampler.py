@@ -0,0 +1,177 @@
+# resampler.py
+# 多周期重采样：由 15min 基础 K 线增量合成 1h / 日线 K 线及其指标，并为每根基础 K 线预计算 "as-of" 行号，
+# 即当根 K 线收盘时已经 *完成* 的最后一根高周期 K 线。高周期指标只在完成的 K 线上计算，回测中不会看到当天收盘后的值。
+# 回测 (engine.intraday_arrays / backtest.load_data) 用 Resampler.batch 由本地 15min 历史合成日线，省去单独下载；
+# 实盘 (live_state.TickerState) 随 15min K 线逐根 update，维护当日之前已完成日线上的 EMA。
+import copy
+
+import numpy as np
+import pandas as pd
+
+from bar_store import COLUMNS
+from indicators import EMA
+
+SESSION_OFFSET = pd.Timedelta(minutes=30)  # 小时线按 09:30 开盘对齐: 09:30-10:30, ..., 15:30-16:00
+
+
+def period_keys(index, rule):
+    """每根基础 K 线所属高周期 K 线的起始时间"""
+    index = pd.DatetimeIndex(index)
+    if rule in ('1d', 'D', '1D'):
+        return index.normalize()
+    if rule in ('1h', 'h', '1H'):
+        return (index - SESSION_OFFSET).floor('1h') + SESSION_OFFSET
+    return index.floor(rule)
+
+
+def period_key(ts, rule):
+    """单根 K 线的 period_keys (逐根增量更新时避免构造 DatetimeIndex)"""
+    ts = pd.Timestamp(ts)
+    if rule in ('1d', 'D', '1D'):
+        return ts.normalize()
+    if rule in ('1h', 'h', '1H'):
+        return (ts - SESSION_OFFSET).floor('1h') + SESSION_OFFSET
+    return ts.floor(rule)
+
+
+def group_ids(index, rule):
+    """:return: (每根基础 K 线的高周期组号 (从 0 递增), 各组的起始时间)"""
+    keys = period_keys(index, rule)
+    if not len(keys):
+        return np.zeros(0, dtype=np.intp), keys
+    new = np.concatenate(([True], keys.values[1:] != keys.values[:-1]))
+    return np.cumsum(new) - 1, keys[new]
+
+
+def _aggregate(values, starts):
+    """按组起始行号聚合 OHLCV 数组 (开=首根开, 高=最高, 低=最低, 收=末根收, 量=求和)，返回 (组数, 5)"""
+    ends = np.concatenate((starts[1:], [len(values)])) - 1
+    return np.column_stack((
+        values[starts, 0],
+        np.maximum.reduceat(values[:, 1], starts),
+        np.minimum.reduceat(values[:, 2], starts),
+        values[ends, 3],
+        np.add.reduceat(values[:, 4], starts),
+    ))
+
+
+def resample(df, rule='1d'):
+    """把基础 K 线聚合为高周期 OHLCV"""
+    groups, keys = group_ids(df.index, rule)
+    if not len(groups):
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([]))
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+    return pd.DataFrame(_aggregate(df[COLUMNS].to_numpy(dtype=float), starts), index=keys, columns=COLUMNS)
+
+
+def asof_positions(index, higher_index, rule='1d'):
+    """
+    每根基础 K 线可用的最后一根 *已完成* 高周期 K 线在 higher_index 中的位置 (-1 表示没有)
+    只取起始时间早于当根所在周期的 K 线，即当前仍在进行中的日线 / 小时线不可见
+    """
+    keys = period_keys(index, rule)
+    return np.searchsorted(pd.DatetimeIndex(higher_index).values, keys.values, side='left') - 1
+
+
+class Resampler:
+    """增量重采样：逐根喂入基础 K 线，高周期 K 线完成时更新其指标"""
+
+    def __init__(self, rule='1d', ema_periods=()):
+        self.rule = rule
+        self.emas = {int(p): EMA(span=p) for p in ema_periods}
+        self.keys = []         # 已完成高周期 K 线的起始时间
+        self.bars = []         # 已完成高周期 K 线 (Open, High, Low, Close, Volume)
+        self.ema_values = {p: [] for p in self.emas}
+        self.current_key = None
+        self.current = None
+
+    def _key(self, ts):
+        return period_key(ts, self.rule)
+
+    def _finish(self):
+        self.keys.append(self.current_key)
+        self.bars.append(tuple(self.current))
+        for p, e in self.emas.items():
+            self.ema_values[p].append(e.update(self.current[3]))
+
+    def update(self, ts, bar):
+        """
+        :param bar: (Open, High, Low, Close, Volume)
+        :return: 本次喂入导致完成的高周期 K 线 (key, bar)，没有则为 None
+        """
+        key = self._key(ts)
+        finished = None
+        if self.current_key is not None and key != self.current_key:
+            self._finish()
+            finished = (self.current_key, self.bars[-1])
+            self.current_key = None
+        if self.current_key is None:
+            self.current_key, self.current = key, list(map(float, bar))
+        else:
+            c = self.current
+            c[1], c[2], c[3], c[4] = max(c[1], float(bar[1])), min(c[2], float(bar[2])), float(bar[3]), c[4] + float(bar[4])
+        return finished
+
+    @property
+    def asof(self):
+        """当前可见的最后一根已完成高周期 K 线的位置 (-1 表示没有)"""
+        return len(self.bars) - 1
+
+    def ema(self, period):
+        """最后一根已完成高周期 K 线上的 EMA"""
+        values = self.ema_values[int(period)]
+        return values[-1] if values else np.nan
+
+    def peek_ema(self, ts, period):
+        """
+        尚未喂入的基础 K 线 ts 可见的 EMA (不改变状态)：ts 开启新周期时，当前进行中的 K 线视为已完成
+        用于实盘中仍在形成的最新一根 K 线的试算
+        """
+        if self.current_key is None or self._key(ts) == self.current_key:
+            return self.ema(period)
+        return copy.copy(self.emas[int(period)]).update(self.current[3])
+
+    def batch(self, df):
+        """
+        批量处理一段基础 K 线，状态与逐根 update 相同 (直接在数组上聚合，不构造中间 DataFrame)
+        :return: 每根基础 K 线的 as-of 位置；已完成的高周期 K 线见 frame()
+        """
+        if df.empty:
+            return np.zeros(0, dtype=np.intp)
+        keys = period_keys(df.index, self.rule)
+        values = df[COLUMNS].to_numpy(dtype=float)
+        pos_head = np.zeros(0, dtype=np.intp)
+        if self.current_key is not None:
+            # 衔接上一批未完成的 K 线：开头属于同一周期的几根逐根处理 (期间 as-of 不变)
+            same = keys.values == np.datetime64(self.current_key)
+            head = len(df) if same.all() else int(np.argmin(same))
+            for ts, row in zip(df.index[:head], values[:head]):
+                self.update(ts, row)
+            pos_head = np.full(head, self.asof, dtype=np.intp)
+            if head == len(df):
+                return pos_head
+            self._finish()
+            self.current_key = None
+            keys, values = keys[head:], values[head:]
+
+        base = len(self.bars)
+        new = np.concatenate(([True], keys.values[1:] != keys.values[:-1]))
+        starts = np.flatnonzero(new)
+        bars = _aggregate(values, starts)
+        done = bars[:-1]  # 最后一组视为仍在进行中
+        self.keys.extend(keys[starts[:-1]])
+        self.bars.extend(map(tuple, done.tolist()))
+        for p, e in self.emas.items():
+            if len(done):
+                self.ema_values[p].extend(e.batch(done[:, 3]).tolist())
+        self.current_key = keys[starts[-1]]
+        self.current = bars[-1].tolist()
+        groups = np.cumsum(new) - 1
+        return np.concatenate((pos_head, base + groups - 1))
+
+    def frame(self):
+        """已完成的高周期 K 线 (含 EMA 列)"""
+        df = pd.DataFrame(self.bars, index=pd.DatetimeIndex(self.keys), columns=COLUMNS)
+        for p, values in self.ema_values.items():
+            df[f'EMA_{p}'] = values
+        return df
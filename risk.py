@@ -0,0 +1,149 @@
+# risk.py
+# 组合相关性风险：RollingCorrelation 在固定窗口内增量维护整个股票池收益率的协方差 / 相关矩阵，
+# 每根 K 线只对 "新进入窗口的一行" 与 "移出窗口的一行" 做秩二更新 (O(N²))，不重算整个窗口；
+# 缺失 K 线按成对有效样本计算 (两个标的都有收益率的行才计入)。
+# CorrelationGuard 据此在入场时拒绝或缩减与现有持仓高度相关的仓位，由 PositionManager / ArrayPositionManager 调用。
+import numpy as np
+
+
+class RollingCorrelation:
+    def __init__(self, tickers, window=100, min_periods=20):
+        """
+        :param tickers: 股票池 (update 输入的列顺序)
+        :param window: 滚动窗口 (收益率行数)
+        :param min_periods: 成对有效样本少于该数量时相关系数为 NaN
+        """
+        self.tickers = list(tickers)
+        self.ids = {t: i for i, t in enumerate(self.tickers)}
+        n = len(self.tickers)
+        self.window = window
+        self.min_periods = min_periods
+        self.returns = np.zeros((window, n))  # 环形缓冲，缺失记为 0
+        self.mask = np.zeros((window, n))     # 1 表示该行该标的有收益率
+        self.pos = 0                          # 下一行写入位置
+        self.rows_seen = 0                    # 已输入的行数
+        self.last_price = np.full(n, np.nan)  # 每个标的自己序列上的前一个价格
+        # 成对累计量 (只累计 i、j 都有收益率的行)：
+        # count[i, j] 样本数；sum_x[i, j] = Σ r_i；sum_xx[i, j] = Σ r_i²；sum_xy[i, j] = Σ r_i r_j
+        self.count = np.zeros((n, n))
+        self.sum_x = np.zeros((n, n))
+        self.sum_xx = np.zeros((n, n))
+        self.sum_xy = np.zeros((n, n))
+
+    # ---------- 更新 ----------
+    def update(self, prices):
+        """输入一行价格 (按 tickers 对齐，NaN 表示该标的本根没有 K 线)，收益率相对该标的上一个价格计算"""
+        px = np.asarray(prices, dtype=float)
+        has = ~np.isnan(px)
+        ok = has & (self.last_price > 0)
+        r = np.zeros(len(px))
+        r[ok] = px[ok] / self.last_price[ok] - 1
+        self.last_price[has] = px[has]
+        self.update_returns(r, ok)
+
+    def update_returns(self, returns, valid=None):
+        """
+        直接输入一行收益率
+        :param valid: 有效掩码，默认为非 NaN
+        """
+        r = np.asarray(returns, dtype=float)
+        valid = ~np.isnan(r) if valid is None else np.asarray(valid, dtype=bool)
+        r = np.where(valid, r, 0.0)
+        m = valid.astype(float)
+
+        # 新行 +1，被挤出窗口的旧行 -1 (窗口未满时旧行全为 0)
+        R = np.stack((r, self.returns[self.pos]))
+        M = np.stack((m, self.mask[self.pos]))
+        sR = R * np.array([[1.0], [-1.0]])
+        sM = M * np.array([[1.0], [-1.0]])
+        self.count += M.T @ sM
+        self.sum_x += R.T @ sM
+        self.sum_xx += (R * R).T @ sM
+        self.sum_xy += R.T @ sR
+
+        self.returns[self.pos] = r
+        self.mask[self.pos] = m
+        self.pos = (self.pos + 1) % self.window
+        self.rows_seen += 1
+
+    # ---------- 查询 ----------
+    def _pairs(self, i, j):
+        """成对统计：返回 (样本数, 协方差分子, i 方差分子, j 方差分子)"""
+        c = self.count[i, j]
+        sx, sy = self.sum_x[i, j], self.sum_x[j, i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = self.sum_xy[i, j] - sx * sy / c
+            vx = self.sum_xx[i, j] - sx * sx / c
+            vy = self.sum_xx[j, i] - sy * sy / c
+        return c, cov, vx, vy
+
+    def _corr(self, i, j):
+        c, cov, vx, vy = self._pairs(i, j)
+        ok = (c >= self.min_periods) & (vx > 0) & (vy > 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rho = np.clip(cov / np.sqrt(vx * vy), -1.0, 1.0)
+        return np.where(ok, rho, np.nan)
+
+    def correlation(self):
+        """N × N 相关矩阵 (样本不足为 NaN)"""
+        n = len(self.tickers)
+        return self._corr(np.arange(n)[:, None], np.arange(n)[None, :])
+
+    def covariance(self):
+        """N × N 协方差矩阵 (样本方差，ddof=1；样本不足为 NaN)"""
+        n = len(self.tickers)
+        c, cov, _, _ = self._pairs(np.arange(n)[:, None], np.arange(n)[None, :])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(c >= self.min_periods, cov / (c - 1), np.nan)
+
+    def corr_with(self, ticker, others):
+        """ticker 与 others 中每个标的的相关系数 (O(len(others)))"""
+        i = self.ids[ticker]
+        j = np.array([self.ids[t] for t in others], dtype=np.intp)
+        return self._corr(i, j)
+
+    def top(self, ticker, k=3, min_corr=None):
+        """与 ticker 相关性最高的 k 个其他标的 [(ticker, 相关系数)]"""
+        others = [t for t in self.tickers if t != ticker]
+        rho = self.corr_with(ticker, others)
+        order = np.argsort(-np.nan_to_num(rho, nan=-np.inf), kind='stable')[:k]
+        return [(others[o], float(rho[o])) for o in order
+                if not np.isnan(rho[o]) and (min_corr is None or rho[o] >= min_corr)]
+
+
+class CorrelationGuard:
+    def __init__(self, tracker, max_corr=0.85, soft_corr=None, min_scale=0.5):
+        """
+        :param tracker: RollingCorrelation
+        :param max_corr: 与任一现有持仓的相关系数 >= 该值时拒绝入场 (None 表示不拒绝)
+        :param soft_corr: 相关系数在 [soft_corr, max_corr) 之间时仓位线性缩减，到 max_corr (未设置时为 1) 处缩至 min_scale
+        """
+        self.tracker = tracker
+        self.max_corr = max_corr
+        self.soft_corr = soft_corr
+        self.min_scale = min_scale
+
+    def max_corr_with(self, ticker, held):
+        """与现有持仓的最大相关系数 (无持仓 / 样本不足为 NaN)"""
+        ids = self.tracker.ids
+        others = [t for t in held if t != ticker and t in ids]
+        if ticker not in ids or not others:
+            return np.nan
+        rho = self.tracker.corr_with(ticker, others)
+        return np.nan if np.isnan(rho).all() else float(np.nanmax(rho))
+
+    def allows(self, ticker, held):
+        if self.max_corr is None:
+            return True
+        return not self.max_corr_with(ticker, held) >= self.max_corr
+
+    def scale(self, ticker, held):
+        """仓位缩放比例 (0, 1]"""
+        if self.soft_corr is None:
+            return 1.0
+        rho = self.max_corr_with(ticker, held)
+        if not rho >= self.soft_corr:
+            return 1.0
+        hi = 1.0 if self.max_corr is None else self.max_corr
+        frac = min((rho - self.soft_corr) / (hi - self.soft_corr), 1.0) if hi > self.soft_corr else 1.0
+        return 1.0 - frac * (1.0 - self.min_scale)
@@ -0,0 +1,184 @@
+# robustness.py
+# 回测结果稳健性分析：对单笔交易盈亏做 bootstrap / 交易顺序置换，对逐 bar 收益做 block bootstrap，
+# 批量生成数万条重采样路径 (一次一个 "样本数 × 交易数" 的 numpy 矩阵)，给出最终权益、最大回撤、胜率的置信区间。
+# 样本按块处理以限制内存，可选进程池并行 (每块用 SeedSequence 派生的独立随机流，结果与并行度无关)。
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+METHODS = ('bootstrap', 'block', 'permutation')
+METRICS = ('final_equity', 'max_drawdown', 'win_rate')
+BATCH_ELEMENTS = 2_000_000   # 每块最多 样本数 × 长度 个元素 (约 16MB float64)
+
+
+# ================= 1. 重采样下标 =================
+def resample_indices(rng, n, size, method='bootstrap', block=None):
+    """
+    :param n: 原序列长度
+    :param size: 样本数
+    :param method: bootstrap 独立有放回抽样 / block 循环移动块 bootstrap (保留自相关) / permutation 顺序置换
+    :param block: block 方法的块长，默认 ≈ n^(1/3)
+    :return: size × n 的下标矩阵
+    """
+    if method == 'bootstrap':
+        return rng.integers(0, n, size=(size, n))
+    if method == 'permutation':
+        return rng.permuted(np.broadcast_to(np.arange(n), (size, n)), axis=1)
+    if method == 'block':
+        block = int(block or max(1, round(n ** (1 / 3))))
+        starts = rng.integers(0, n, size=(size, -(-n // block)))
+        return ((starts[:, :, None] + np.arange(block)) % n).reshape(size, -1)[:, :n]
+    raise ValueError(f"未知的重采样方法: {method}")
+
+
+# ================= 2. 路径统计 =================
+def path_stats(samples, initial_cash, compound=False):
+    """
+    :param samples: size × n 的重采样序列 (compound=False 为逐笔盈亏金额，True 为逐期收益率)
+    :return: {'final_equity', 'max_drawdown', 'win_rate'}，每项为长度 size 的数组
+    """
+    if compound:
+        equity = initial_cash * np.cumprod(1 + samples, axis=1)
+    else:
+        equity = initial_cash + np.cumsum(samples, axis=1)
+    # 起点的 initial_cash 也参与回撤的 "历史最高"
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), initial_cash)
+    return {
+        'final_equity': equity[:, -1] if samples.shape[1] else np.full(len(samples), float(initial_cash)),
+        'max_drawdown': np.minimum((equity / peak - 1).min(axis=1, initial=0.0), 0.0),
+        'win_rate': (samples > 0).mean(axis=1) if samples.shape[1] else np.full(len(samples), np.nan),
+    }
+
+
+def _run_chunk(values, size, method, block, initial_cash, compound, seed):
+    rng = np.random.default_rng(seed)
+    values = np.asarray(values, dtype=float)
+    out = {m: [] for m in METRICS}
+    step = max(1, BATCH_ELEMENTS // max(len(values), 1))
+    for lo in range(0, size, step):
+        idx = resample_indices(rng, len(values), min(step, size - lo), method, block)
+        for m, v in path_stats(values[idx], initial_cash, compound).items():
+            out[m].append(v)
+    return {m: np.concatenate(v) for m, v in out.items()}
+
+
+def simulate(values, n_samples=10000, method='bootstrap', block=None, initial_cash=100000, compound=False,
+             seed=0, workers=None, chunk=None):
+    """
+    批量重采样
+    :param values: 逐笔盈亏金额 (compound=False) 或逐期收益率 (compound=True)，按时间顺序
+    :param workers: 进程数，None / 1 表示在当前进程计算
+    :param chunk: 每个任务 (独立随机流) 的样本数，默认为一个批次 (BATCH_ELEMENTS // 序列长度)；
+                  切分方式与 workers 无关，进程池只分发这些固定的块，因此结果不随并行度变化
+    :return: {指标: 长度 n_samples 的数组}
+    """
+    values = np.asarray(values, dtype=float)
+    workers = workers or 1
+    chunk = chunk or max(1, BATCH_ELEMENTS // max(len(values), 1))
+    sizes = [min(chunk, n_samples - lo) for lo in range(0, n_samples, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(values, s, method, block, initial_cash, compound, ss) for s, ss in zip(sizes, seeds)]
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_run_chunk, *zip(*args)))
+    else:
+        parts = [_run_chunk(*a) for a in args]
+    return {m: np.concatenate([p[m] for p in parts]) for m in METRICS}
+
+
+def confidence_intervals(samples, observed=None, levels=(0.05, 0.5, 0.95)):
+    """
+    :param samples: simulate 的结果
+    :param observed: 实际回测的 {指标: 值}
+    :return: DataFrame，行为指标，列为 observed / p5 / p50 / p95 / mean
+    """
+    rows = {}
+    for m, v in samples.items():
+        v = v[~np.isnan(v)]
+        row = {'observed': (observed or {}).get(m, np.nan)}
+        qs = np.quantile(v, levels) if len(v) else [np.nan] * len(levels)
+        row.update({f"p{round(q * 100):g}": x for q, x in zip(levels, qs)})
+        row['mean'] = v.mean() if len(v) else np.nan
+        rows[m] = row
+    return pd.DataFrame(rows).T
+
+
+# ================= 3. 回测结果接入 =================
+def trade_pnl(ledger):
+    """已平仓交易的盈亏金额，按平仓时间排序 (取自 pm.ledger，不受 closed_trades 的两位小数舍入影响)"""
+    exit_time = np.asarray(ledger.exit_time, dtype='int64')
+    closed = np.flatnonzero(exit_time >= 0)
+    closed = closed[np.argsort(exit_time[closed], kind='stable')]
+    return np.asarray(ledger.exit_value, dtype=float)[closed] - np.asarray(ledger.cost, dtype=float)[closed]
+
+
+def observed_stats(pnl, initial_cash):
+    return {m: float(v[0]) for m, v in path_stats(np.asarray(pnl, dtype=float)[None, :], initial_cash).items()}
+
+
+def analyze(result, n_samples=10000, block=None, seed=0, workers=None):
+    """
+    对 engine.BacktestResult 做三种重采样：
+    trades/bootstrap 单笔盈亏有放回抽样；trades/permutation 同一组交易换顺序 (最终权益不变，检验回撤对顺序的敏感度)；
+    bars/block 逐 bar 权益收益率的块 bootstrap (保留波动聚集)
+    :return: DataFrame，索引为 (方法, 指标)
+    """
+    initial_cash = result.params['initial_cash']
+    pnl = trade_pnl(result.pm.ledger)
+    observed = observed_stats(pnl, initial_cash)
+    tables = {}
+    for method in ('bootstrap', 'permutation'):
+        samples = simulate(pnl, n_samples, method, initial_cash=initial_cash, seed=seed, workers=workers)
+        tables[f'trades/{method}'] = confidence_intervals(samples, observed)
+
+    equity = np.asarray(result.equity_curve, dtype=float)
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(0)
+    samples = simulate(returns, n_samples, 'block', block, initial_cash, compound=True, seed=seed, workers=workers)
+    bar_observed = {m: float(v[0]) for m, v in path_stats(returns[None, :], initial_cash, compound=True).items()}
+    table = confidence_intervals(samples, bar_observed)
+    tables['bars/block'] = table.drop(index='win_rate')  # 逐 bar 收益的 "胜率" 没有意义
+    return pd.concat(tables, names=['method', 'metric'])
+
+
+def quick_stats(pnl, initial_cash, n_samples=1000, seed=0, level=0.05):
+    """参数扫描用的精简指标：交易 bootstrap 下最终权益 / 最大回撤的低分位数与亏损概率"""
+    samples = simulate(pnl, n_samples, 'bootstrap', initial_cash=initial_cash, seed=seed)
+    return {
+        f'final_equity_p{round(level * 100):g}': float(np.quantile(samples['final_equity'], level)),
+        f'max_drawdown_p{round(level * 100):g}': float(np.quantile(samples['max_drawdown'], level)),
+        'prob_loss': float((samples['final_equity'] < initial_cash).mean()),
+    }
+
+
+# ================= 命令行 =================
+def main():
+    parser = argparse.ArgumentParser(description="回测结果 bootstrap / 置换稳健性分析")
+    parser.add_argument('--strategy', choices=['intraday', 'daily'], default='intraday')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--samples', type=int, default=10000)
+    parser.add_argument('--block', type=int, default=None, help="block bootstrap 的块长 (bar 数)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    config['offline'] = True
+    if args.strategy == 'daily':
+        from backtest_d import run_daily_backtest
+        result = run_daily_backtest(config, verbose=False)
+    else:
+        from backtest import run_backtest
+        result = run_backtest(config, verbose=False)
+    print(result)
+    table = analyze(result, args.samples, args.block, args.seed, args.workers or os.cpu_count())
+    with pd.option_context('display.float_format', '{:,.4f}'.format):
+        print(table.to_string())
+
+
+if __name__ == "__main__":
+    main()
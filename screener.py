@@ -0,0 +1,129 @@
+# screener.py
+# 横截面指标快照 + 向量化筛选。
+# Snapshot 按列保存整个关注列表最新一根 / 前一根 K 线的指标 (每个标的一行，NumPy 数组按需扩容)，
+# Screener 把多空规则与用户自定义筛选写成 DataFrame.eval 表达式，一次对所有标的求出布尔掩码，
+# 耗时基本不随标的数量增长。同一张表也用于导出 / 生成 "市场概览" 消息。
+import numpy as np
+import pandas as pd
+
+FIELDS = ('Close', 'RSI', 'EMA_DYNAMIC', 'MACD', 'MACD_Hist', 'RSI_Threshold', 'EMA_DAILY')
+
+# 内置多空规则 (与原逐标的判断等价)；表达式中的裸名字优先解析为 params 中的参数，其次为列
+LONG_RULE = "Close > EMA_DYNAMIC and RSI <= oversold and MACD_Hist > prev_MACD_Hist"
+SHORT_RULE = "Close < EMA_DYNAMIC and RSI >= overbought and MACD_Hist < prev_MACD_Hist"
+
+
+class Snapshot:
+    def __init__(self, capacity=64):
+        self.tickers = []
+        self.rows = {}
+        self.columns = {c: np.full(capacity, np.nan) for c in FIELDS}
+        self.columns.update({f'prev_{c}': np.full(capacity, np.nan) for c in FIELDS})
+        self.num_bars = np.zeros(capacity, dtype=np.int64)
+        self.tip_ts = np.zeros(capacity, dtype='datetime64[ns]')
+
+    def _row(self, ticker):
+        i = self.rows.get(ticker)
+        if i is None:
+            i = self.rows[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+            if i == len(self.num_bars):
+                grow = lambda a, fill: np.concatenate((a, np.full(len(a), fill, dtype=a.dtype)))
+                self.columns = {c: grow(a, np.nan) for c, a in self.columns.items()}
+                self.num_bars = grow(self.num_bars, 0)
+                self.tip_ts = grow(self.tip_ts, np.datetime64('NaT'))
+        return i
+
+    def update(self, ticker, state):
+        """写入 live_state.TickerState 的最新 (last) / 前一根 (prev) 指标"""
+        i = self._row(ticker)
+        for prefix, values in (('', state.last), ('prev_', state.prev)):
+            for c in FIELDS:
+                self.columns[prefix + c][i] = np.nan if values is None else values[c]
+        self.num_bars[i] = state.num_bars
+        self.tip_ts[i] = np.datetime64('NaT') if state.tip_ts is None else np.datetime64(state.tip_ts, 'ns')
+
+    def frame(self, tickers=None):
+        """快照表 (索引为 ticker)；:param tickers: 只取这些标的 (按给定顺序，缺失的跳过)"""
+        n = len(self.tickers)
+        df = pd.DataFrame({c: a[:n] for c, a in self.columns.items()}, index=pd.Index(self.tickers, name='Ticker'))
+        df['num_bars'] = self.num_bars[:n]
+        df['tip_ts'] = self.tip_ts[:n]
+        if tickers is not None:
+            df = df.reindex([t for t in tickers if t in self.rows])
+        return df
+
+
+class Screener:
+    def __init__(self, params=None, min_bars=200):
+        """
+        :param params: 表达式可引用的参数 (如 oversold / overbought)；值为字符串时表示引用该列 (如自适应阈值 'RSI_Threshold')
+        :param min_bars: 已有 K 线少于该数量或缺少前一根指标的标的不参与筛选
+        """
+        self.params = dict(params or {})
+        self.min_bars = min_bars
+        self.rules = {}
+
+    def register(self, name, expr):
+        """
+        注册一条筛选规则 (DataFrame.eval 布尔表达式，可用列名、prev_ 列名与 params)
+        先对空快照试算一次：列名 / 参数拼写错误或语法错误时抛出 ValueError，不会等到扫描时才出错
+        """
+        try:
+            self._eval(Snapshot().frame(), expr)
+        except Exception as e:
+            raise ValueError(f"筛选规则 {name} 无效: {expr!r} ({type(e).__name__}: {e})") from e
+        self.rules[name] = expr
+        return self
+
+    def _resolvers(self, df):
+        return ({k: df[v] if isinstance(v, str) else v for k, v in self.params.items()},)
+
+    def _eval(self, df, expr):
+        return df.eval(expr, resolvers=self._resolvers(df))
+
+    def eligible(self, df):
+        return (df['num_bars'] >= self.min_bars) & df['prev_Close'].notna()
+
+    def evaluate(self, df, names=None):
+        """
+        :return: DataFrame[bool]，行为标的，列为规则名 (不满足 eligible 的标的全为 False)
+        """
+        ok = self.eligible(df).to_numpy()
+        masks = {}
+        for name in names or self.rules:
+            try:
+                hit = self._eval(df, self.rules[name])
+            except Exception as e:
+                # 单条规则求值失败只让该规则本轮无命中，不影响其他规则 (含内置多空规则)
+                print(f"⚠️ 筛选规则 {name} 求值失败: {e}")
+                hit = False
+            masks[name] = np.asarray(hit, dtype=bool) & ok
+        return pd.DataFrame(masks, index=df.index)
+
+    def query(self, df, expr):
+        """临时查询：返回满足表达式的行"""
+        return df[np.asarray(self._eval(df, expr), dtype=bool)]
+
+
+def overview(df, masks=None, top=5, max_hits=20):
+    """
+    市场概览消息 (Markdown)
+    :param df: Snapshot.frame()
+    :param masks: Screener.evaluate 的结果，用于列出各规则命中的标的 (每条规则最多列出 max_hits 个)
+    """
+    valid = df[df['Close'].notna()]
+    up = int((valid['Close'] > valid['EMA_DYNAMIC']).sum())
+    lines = [f"📊 *市场概览* ({len(valid)} 个标的)",
+             f"🔹 趋势: {up} 个在均线之上 / {len(valid) - up} 个在均线之下"]
+    if len(valid):
+        by_rsi = valid.sort_values('RSI')
+        fmt = lambda rows: ', '.join(f"{t} {r:.1f}" for t, r in rows['RSI'].items())
+        lines.append(f"🔹 RSI 最低: {fmt(by_rsi.head(top))}")
+        lines.append(f"🔹 RSI 最高: {fmt(by_rsi.tail(top).iloc[::-1])}")
+    if masks is not None:
+        for name in masks.columns:
+            hits = list(masks.index[masks[name].to_numpy()])
+            shown = ', '.join(hits[:max_hits]) + (f" 等 {len(hits)} 个" if len(hits) > max_hits else '')
+            lines.append(f"🔸 {name}: {shown or '无'}")
+    return '\n'.join(lines)
@@ -0,0 +1,134 @@
+# state_store.py
+# 监控进程的持久化状态 (SQLite)：逐标的的滚动指标状态 (TickerState) 与最近一次发出的信号。
+# 每轮扫描结束后在一个事务里做 checkpoint；重启时直接恢复指标状态，只需补齐停机期间的新 K 线，
+# 并且同一个 "信号形态" (条件在连续 K 线上持续成立) 只推送一次，重启后也不会重复推送。
+# 信号在提交推送时登记 (避免同一形态重复入队)，送达后确认；发送失败则撤销登记，条件仍成立时下一根 K 线重新推送。
+# path 为 ':memory:' 时只在进程内去重，不持久化。
+import os
+import pickle
+import sqlite3
+import time
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticker_state (
+    ticker      TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,     -- 指标参数，参数变化后旧状态作废
+    tip_ts      INTEGER,           -- 最新一根 K 线的时间戳 (纳秒)
+    num_bars    INTEGER NOT NULL,
+    state       BLOB NOT NULL,     -- pickle 后的 TickerState
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS last_signal (
+    ticker      TEXT PRIMARY KEY,
+    direction   TEXT NOT NULL,     -- long / short
+    setup_ts    INTEGER NOT NULL,  -- 本次形态首次触发的 K 线
+    last_ts     INTEGER NOT NULL,  -- 最近一次仍满足条件的 K 线
+    active      INTEGER NOT NULL,  -- 1: 条件仍在持续，同方向信号不再推送
+    sent_at     REAL NOT NULL,     -- 登记时间，送达后更新为送达时间
+    message     TEXT,
+    delivered   INTEGER NOT NULL DEFAULT 1  -- 0: 已登记、尚未确认送达
+);
+"""
+
+
+def _ns(ts):
+    return None if ts is None else pd.Timestamp(ts).value
+
+
+class StateStore:
+    def __init__(self, path='data/monitor_state.sqlite', fingerprint=''):
+        """
+        :param fingerprint: 指标参数的标识 (如 "rsi=14/ema=200/...")，与已保存状态不一致时丢弃旧状态
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.fingerprint = fingerprint
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(last_signal)")}
+        if 'delivered' not in columns:
+            self.conn.execute("ALTER TABLE last_signal ADD COLUMN delivered INTEGER NOT NULL DEFAULT 1")
+        # 上次运行退出时仍未确认送达的信号 (队列中的消息随进程丢失) 作废，条件仍成立时重新推送
+        self.conn.execute("DELETE FROM last_signal WHERE delivered = 0")
+        self.conn.commit()
+
+    # ---------- 指标状态 ----------
+    def load_states(self):
+        """:return: {ticker: TickerState}，参数不一致或无法反序列化的状态跳过 (调用方会重新预热)"""
+        states = {}
+        rows = self.conn.execute("SELECT ticker, fingerprint, state FROM ticker_state").fetchall()
+        for ticker, fingerprint, blob in rows:
+            if fingerprint != self.fingerprint:
+                continue
+            try:
+                states[ticker] = pickle.loads(blob)
+            except Exception as e:
+                print(f"⚠️ {ticker}: 状态恢复失败，将重新预热 ({e})")
+        return states
+
+    def save_states(self, states):
+        """写入 (不提交)；:param states: {ticker: TickerState}"""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO ticker_state (ticker, fingerprint, tip_ts, num_bars, state, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(t, self.fingerprint, _ns(s.tip_ts), s.num_bars, pickle.dumps(s, protocol=pickle.HIGHEST_PROTOCOL), now)
+             for t, s in states.items()])
+
+    # ---------- 信号去重 ----------
+    def last_signal(self, ticker):
+        row = self.conn.execute(
+            "SELECT direction, setup_ts, last_ts, active, sent_at, message, delivered FROM last_signal WHERE ticker = ?",
+            (ticker,)).fetchone()
+        if row is None:
+            return None
+        keys = ('direction', 'setup_ts', 'last_ts', 'active', 'sent_at', 'message', 'delivered')
+        return dict(zip(keys, row))
+
+    def claim_signal(self, ticker, direction, bar_ts, message=None):
+        """
+        登记一次信号 (未确认送达，见 confirm_signal / release_signal)
+        :return: True 表示新形态 (应推送)；False 表示同方向形态仍在持续或正在推送 (只更新 last_ts)
+        """
+        ts = _ns(bar_ts)
+        last = self.last_signal(ticker)
+        if last is not None and last['active'] and last['direction'] == direction:
+            self.conn.execute("UPDATE last_signal SET last_ts = ? WHERE ticker = ?", (max(ts, last['last_ts']), ticker))
+            return False
+        self.conn.execute(
+            "INSERT OR REPLACE INTO last_signal (ticker, direction, setup_ts, last_ts, active, sent_at, message, delivered) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?, 0)", (ticker, direction, ts, ts, time.time(), message))
+        return True
+
+    def confirm_signal(self, ticker, direction, bar_ts):
+        """claim_signal 登记的信号已送达"""
+        self.conn.execute(
+            "UPDATE last_signal SET delivered = 1, sent_at = ? WHERE ticker = ? AND direction = ? AND setup_ts = ?",
+            (time.time(), ticker, direction, _ns(bar_ts)))
+
+    def release_signal(self, ticker, direction, bar_ts):
+        """claim_signal 登记的信号发送失败：撤销登记，条件仍成立时下次视为新形态重新推送"""
+        self.conn.execute(
+            "DELETE FROM last_signal WHERE ticker = ? AND direction = ? AND setup_ts = ? AND delivered = 0",
+            (ticker, direction, _ns(bar_ts)))
+
+    def end_setup(self, ticker):
+        """条件不再成立：下次再触发视为新形态"""
+        self.conn.execute("UPDATE last_signal SET active = 0 WHERE ticker = ? AND active = 1", (ticker,))
+
+    # ---------- checkpoint ----------
+    def checkpoint(self, states=None):
+        """保存指标状态并提交本轮的全部写入 (单个事务)"""
+        if states:
+            self.save_states(states)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
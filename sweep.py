@@ -0,0 +1,206 @@
+# sweep.py
+# 并行参数扫描：网格或随机采样参数组合，进程池并行模拟。
+# K 线与预计算指标只在主进程准备一次，放进一块共享内存，工作进程直接映射为 numpy 视图，不做逐进程 pickle。
+import argparse
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import engine
+import robustness
+
+# 默认扫描空间
+INTRADAY_GRID = {
+    'ema_period': [100, 150, 200],
+    'rsi_buy_level': [35, 40],
+    'percentile': [10, 20, 30],
+    'atr_multiplier': [2.0, 3.0, 4.0, 5.0],
+}
+DAILY_GRID = {
+    'ema_period': [100, 150, 200],
+    'percentile': [10, 20, 30],
+    'base_level': [35],
+    'amnesty_level': [20, 25, 30],
+    'amnesty_stop': [2.0, 3.5],
+    'trend_stop': [2.0, 3.5],
+}
+
+
+# ================= 参数组合 =================
+def param_grid(grid):
+    """网格展开: {name: [取值]} -> [{name: 取值}]"""
+    names = list(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+def param_samples(space, n, seed=0):
+    """
+    随机采样: list 取值为离散候选，(lo, hi) 元组为均匀分布 (两端均为 int 时取整数)
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        combo = {}
+        for name, choices in space.items():
+            if isinstance(choices, tuple):
+                lo, hi = choices
+                combo[name] = rng.randint(lo, hi) if isinstance(lo, int) and isinstance(hi, int) else rng.uniform(lo, hi)
+            else:
+                combo[name] = rng.choice(choices)
+        samples.append(combo)
+    return samples
+
+
+# ================= 共享内存 =================
+class SharedArrays:
+    """把 {名称: ndarray} 打包进一块共享内存，meta 记录每个数组的偏移/形状/类型"""
+
+    def __init__(self, arrays):
+        self.meta = {}
+        offset = 0
+        for name, a in arrays.items():
+            a = np.ascontiguousarray(a)
+            self.meta[name] = (offset, a.shape, a.dtype.str)
+            offset += (a.nbytes + 63) // 64 * 64  # 64 字节对齐
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, a in arrays.items():
+            view = self._view(self.shm, self.meta[name])
+            view[...] = a
+
+    @staticmethod
+    def _view(shm, meta):
+        offset, shape, dtype = meta
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def attach(cls, name, meta):
+        """在工作进程中映射共享内存，返回 (shm, {名称: 只读视图})"""
+        shm = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        for key, m in meta.items():
+            arrays[key] = cls._view(shm, m)
+            arrays[key].flags.writeable = False
+        return shm, arrays
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# ================= 工作进程 =================
+_WORKER = {}
+
+def _init_worker(shm_name, meta, tickers, strategy, robust_samples=0):
+    shm, arrays = SharedArrays.attach(shm_name, meta)
+    _WORKER.update(shm=shm, arrays=arrays, tickers=tickers, strategy=strategy, robust_samples=robust_samples)
+
+def _run_one(params):
+    arrays, tickers = _WORKER['arrays'], _WORKER['tickers']
+    if _WORKER['strategy'] == 'daily':
+        p = dict(engine.DAILY_DEFAULTS, **params)
+        pm, equity_curve, _ = engine.simulate_daily(arrays, tickers, p)
+    else:
+        p = dict(engine.INTRADAY_DEFAULTS, **params)
+        pm, equity_curve = engine.simulate_intraday(arrays, tickers, p)
+    row = dict(params, **engine.summarize(pm, equity_curve, p['initial_cash']))
+    if _WORKER['robust_samples']:
+        # 交易 bootstrap 的低分位数，筛掉只靠少数几笔交易撑起来的参数组合
+        row.update(robustness.quick_stats(robustness.trade_pnl(pm.ledger), p['initial_cash'], _WORKER['robust_samples']))
+    return row
+
+
+# ================= 扫描入口 =================
+def run_sweep(arrays, tickers, combos, strategy='intraday', workers=None, sort_by='total_return', robust_samples=0):
+    """
+    :param arrays: engine.intraday_arrays / engine.daily_arrays 的结果，需包含 combos 中所有 ema_period
+    :param combos: 参数组合列表
+    :param robust_samples: >0 时每组参数额外做该数量的交易 bootstrap (robustness.quick_stats)
+    :return: 按 sort_by 降序排列的结果表
+    """
+    shared = SharedArrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(shared.shm.name, shared.meta, list(tickers), strategy, robust_samples)) as pool:
+            chunksize = max(1, len(combos) // ((workers or os.cpu_count()) * 4))
+            rows = list(pool.map(_run_one, combos, chunksize=chunksize))
+    finally:
+        shared.close()
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    return table.sort_values(sort_by, ascending=False, ignore_index=True)
+
+def ema_periods(combos, default=150):
+    return sorted({int(c.get('ema_period', default)) for c in combos})
+
+
+# ================= 命令行 =================
+def _load_intraday(store, tickers):
+    from indicators import calculate_rsi, simple_atr
+    daily = {t: store.load(t, '1d') for t in tickers}
+    intraday = {}
+    for t in tickers:
+        i = store.load(t, '15m')
+        i['RSI'] = calculate_rsi(i['Close'], 14)
+        i['ATR'] = simple_atr(i, 14)
+        intraday[t] = i
+    return daily, intraday
+
+def _load_daily(store, tickers):
+    from indicators import calculate_rsi, simple_atr
+    data = {}
+    for t in tickers:
+        df = store.load(t, '1d')
+        df['RSI'] = calculate_rsi(df['Close'], 14)
+        df['ATR'] = simple_atr(df, 14)
+        data[t] = df
+    return data
+
+def main():
+    from bar_store import BarStore
+
+    parser = argparse.ArgumentParser(description="并行参数扫描 (只读本地 K 线仓库)")
+    parser.add_argument('--strategy', choices=['intraday', 'daily'], default='intraday')
+    parser.add_argument('--samples', type=int, default=0, help="随机采样数量，0 表示完整网格")
+    parser.add_argument('--grid', help="JSON 文件，覆盖默认扫描空间")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--robust', type=int, default=0, help="每组参数的交易 bootstrap 样本数，0 表示不做")
+    parser.add_argument('--out', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    with open('config.json', 'r') as f:
+        config = json.load(f)
+    tickers = config['watchlist']
+    store = BarStore(config.get('bar_store_dir', 'data/bars'))
+
+    if args.grid:
+        with open(args.grid, 'r') as f:
+            # {"name": [取值...]} 为离散候选，{"name": {"range": [lo, hi]}} 为均匀分布
+            space = {k: tuple(v['range']) if isinstance(v, dict) else v for k, v in json.load(f).items()}
+    else:
+        space = DAILY_GRID if args.strategy == 'daily' else INTRADAY_GRID
+    combos = param_samples(space, args.samples, args.seed) if args.samples else param_grid(space)
+    print(f"共 {len(combos)} 组参数，策略: {args.strategy}")
+
+    periods = ema_periods(combos)
+    if args.strategy == 'daily':
+        data = _load_daily(store, tickers)
+        arrays = engine.daily_arrays(data, ema_periods=periods)
+    else:
+        daily, intraday = _load_intraday(store, tickers)
+        arrays = engine.intraday_arrays(daily, intraday, ema_periods=periods)
+
+    table = run_sweep(arrays, tickers, combos, args.strategy, args.workers, robust_samples=args.robust)
+    table.to_csv(args.out, index=False)
+    print(table.head(20).to_string(index=False))
+    print(f"\n✅ 扫描结果已保存至: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# ConcurrentFeed 的重试 / 失败处理：用替身数据源注入失败，不访问网络
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bar_store import BarStore
+from data_feed import ConcurrentFeed
+
+
+def bars(n=5, start='2024-01-02 09:30', close=100.0):
+    index = pd.date_range(start, periods=n, freq='15min')
+    c = close + np.arange(n, dtype=float)
+    return pd.DataFrame({'Open': c, 'High': c + 1, 'Low': c - 1, 'Close': c, 'Volume': 1000.0}, index=index)
+
+
+class FakeSource:
+    """按脚本返回结果：plan[ticker] 为每次请求依次使用的结果 (DataFrame / None / Exception)，用完后重复最后一个"""
+
+    def __init__(self, plan):
+        self.plan = {t: list(v) for t, v in plan.items()}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def download(self, tickers, interval, period=None, start=None):
+        with self.lock:
+            self.calls.append((tuple(tickers), period, start))
+            result = {}
+            for t in tickers:
+                steps = self.plan[t]
+                outcome = steps.pop(0) if len(steps) > 1 else steps[0]
+                if isinstance(outcome, Exception):
+                    if len(tickers) == 1:
+                        raise outcome
+                    continue
+                if outcome is not None:
+                    result[t] = outcome
+            return result
+
+
+def feed(source, **kwargs):
+    kwargs.setdefault('retries', 3)
+    return ConcurrentFeed(source=source, rate=1e9, burst=1e9, backoff=0, **kwargs)
+
+
+def calls_for(source, ticker):
+    return [c for c in source.calls if c[0] == (ticker,)]
+
+
+def test_missing_ticker_is_retried_individually():
+    source = FakeSource({'AAA': [bars()], 'BBB': [None, None, bars(close=50.0)]})
+    result = dict(feed(source).scan(['AAA', 'BBB'], '15m', period='5d'))
+
+    assert result['AAA']['Close'].iloc[0] == 100.0
+    assert result['BBB']['Close'].iloc[0] == 50.0
+    assert source.calls[0][0] == ('AAA', 'BBB')
+    assert len(calls_for(source, 'BBB')) == 2
+    assert not calls_for(source, 'AAA')
+
+
+def test_ticker_failing_every_retry_yields_none():
+    source = FakeSource({'AAA': [bars()], 'BBB': [RuntimeError('boom')]})
+    result = dict(feed(source, retries=2).scan(['AAA', 'BBB'], '15m', period='5d'))
+
+    assert result['BBB'] is None
+    assert result['AAA'] is not None
+    assert len(calls_for(source, 'BBB')) == 2
+
+
+def test_batch_exception_falls_back_to_single_requests():
+    class FlakyBatch(FakeSource):
+        def download(self, tickers, interval, period=None, start=None):
+            if len(tickers) > 1:
+                with self.lock:
+                    self.calls.append((tuple(tickers), period, start))
+                raise ConnectionError('batch down')
+            return super().download(tickers, interval, period, start)
+
+    source = FlakyBatch({'AAA': [bars()], 'BBB': [bars(close=50.0)]})
+    result = dict(feed(source).scan(['AAA', 'BBB'], '15m', period='5d'))
+
+    assert result['AAA'] is not None and result['BBB'] is not None
+    assert len(calls_for(source, 'AAA')) == 1 and len(calls_for(source, 'BBB')) == 1
+
+
+def test_failed_fetch_does_not_serve_stale_store_bars(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append('AAA', '15m', bars())
+    source = FakeSource({'AAA': [None]})
+    result = dict(feed(source, store=store, retries=1).scan(['AAA'], '15m', period='5d', tail=3))
+
+    assert result['AAA'] is None
+    assert store.num_rows('AAA', '15m') == 5
+
+
+def test_store_requests_only_the_missing_window(tmp_path):
+    store = BarStore(str(tmp_path))
+    old = bars(start=pd.Timestamp.now().normalize() - pd.Timedelta(days=1))
+    store.append('AAA', '15m', old)
+    new = bars(n=8, start=old.index[0])
+    source = FakeSource({'AAA': [new]})
+    result = dict(feed(source, store=store).scan(['AAA'], '15m', period='59d', tail=4))
+
+    (_, period, start), = source.calls
+    assert period is None and start is not None
+    assert len(result['AAA']) == 4
+    assert result['AAA'].index[-1] == new.index[-1]
+    assert store.num_rows('AAA', '15m') == 8
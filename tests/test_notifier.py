@@ -0,0 +1,99 @@
+# TelegramNotifier 的 429 重试与合并发送：替换 session 与 sleep，不访问网络
+import threading
+
+from notifier import TELEGRAM_LIMIT, TelegramNotifier, coalesce
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """按脚本依次返回响应 (用完后重复最后一个)，记录每次发送的文本"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses) or [FakeResponse(200, {'ok': True})]
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, timeout=None):
+        with self.lock:
+            self.sent.append(json['text'])
+            return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+def notifier(session, **kwargs):
+    n = TelegramNotifier('token', 'chat', rate=1e9, **kwargs)
+    n.session = session
+    n.waits = []
+    n.sleep = n.waits.append
+    return n
+
+
+def too_many_requests(retry_after):
+    return FakeResponse(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': retry_after}})
+
+
+def test_429_waits_retry_after_then_retries():
+    session = FakeSession(too_many_requests(7), FakeResponse(200, {'ok': True}))
+    n = notifier(session)
+
+    assert n.send('hello') == {'ok': True}
+    assert session.sent == ['hello', 'hello']
+    assert n.waits == [7]
+
+
+def test_gives_up_after_max_retries_with_backoff():
+    session = FakeSession(FakeResponse(502, {'ok': False}))
+    n = notifier(session, max_retries=3, backoff=0.5)
+
+    result = n.send('hello')
+    assert not result['ok']
+    assert len(session.sent) == 4
+    assert n.waits == [0.5, 1.0, 2.0]
+
+
+def test_coalesce_respects_limit_and_order():
+    messages = [f"msg {i} " + 'x' * 1500 for i in range(10)]
+    chunks = coalesce(messages)
+
+    assert len(chunks) < len(messages)
+    assert all(len(c) <= TELEGRAM_LIMIT for c in chunks)
+    assert '\n\n'.join(chunks) == '\n\n'.join(messages)
+
+
+def test_coalesce_splits_oversized_message():
+    chunks = coalesce(['y' * (TELEGRAM_LIMIT + 10)])
+    assert [len(c) for c in chunks] == [TELEGRAM_LIMIT, 10]
+
+
+def test_batch_sends_one_message_and_reports_each_signal():
+    session = FakeSession()
+    n = notifier(session)
+    sent, failed = [], []
+    with n.batch():
+        for i in range(3):
+            n.submit(f"signal {i}", on_sent=lambda i=i: sent.append(i), on_failed=lambda i=i: failed.append(i))
+    n.flush()
+    n.close()
+
+    assert session.sent == ['signal 0\n\nsignal 1\n\nsignal 2']
+    assert sent == [0, 1, 2] and failed == []
+
+
+def test_failed_delivery_calls_on_failed_after_429_retries():
+    session = FakeSession(too_many_requests(1))
+    n = notifier(session, max_retries=2)
+    sent, failed = [], []
+    n.submit('signal', on_sent=lambda: sent.append(1), on_failed=lambda: failed.append(1))
+    n.flush()
+    n.close()
+
+    assert len(session.sent) == 3
+    assert n.waits == [1, 1]
+    assert sent == [] and failed == [1]
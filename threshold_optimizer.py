@@ -1,4 +1,5 @@
 # threshold_optimizer.py
+import numpy as np
 import pandas as pd
 
 class ThresholdOptimizer:
@@ -18,4 +19,47 @@ class ThresholdOptimizer:
         
         # 逻辑约束：自适应阈值不应高于 50（中轴），也不应低于 25（极端情况）
         final_threshold = max(25, min(50, adaptive_val))
-        return round(final_threshold, 2)
\ No newline at end of file
+        return round(final_threshold, 2)
+
+    @staticmethod
+    def clamp_threshold(values, base_level=35):
+        """与 get_adaptive_threshold 相同的约束：限制在 [25, 50]，保留两位小数，缺失值回退到 base_level"""
+        values = np.asarray(values, dtype=float)
+        return np.where(np.isnan(values), float(base_level), np.round(np.clip(values, 25, 50), 2))
+
+    @staticmethod
+    def get_rolling_threshold(df_intraday, window=None, base_level=35, percentile=20, min_periods=100):
+        """
+        逐 bar 的滚动 (walk-forward) 自适应阈值：每根 K 线只使用截至当根的历史 RSI，无未来函数
+        pandas 的 rolling/expanding quantile 内部使用有序跳表，单步 O(log N)，不会逐 bar 重新排序
+        :param df_intraday: 含 RSI 列的数据
+        :param window: 回看的 K 线数量；None 表示扩展窗口（使用全部已知历史）
+        :param min_periods: 窗口内有效 RSI 少于该数量时回退到 base_level
+        :return: 与 df_intraday.index 对齐的阈值 Series
+        """
+        if 'RSI' not in df_intraday.columns:
+            return pd.Series(float(base_level), index=df_intraday.index)
+        rsi = df_intraday['RSI'].astype(float)
+        if window is None:
+            roller = rsi.expanding(min_periods=min_periods)
+        else:
+            roller = rsi.rolling(window, min_periods=min(min_periods, window))
+        q = roller.quantile(percentile / 100)
+        return pd.Series(ThresholdOptimizer.clamp_threshold(q.to_numpy(), base_level), index=df_intraday.index)
+
+    @staticmethod
+    def get_rolling_thresholds(data, window=None, base_level=35, percentile=20, min_periods=100):
+        """
+        批量计算所有标的的滚动阈值
+        :param data: {ticker: DataFrame(含 RSI)}，或 时间 × 标的 的 RSI 宽表 (一次向量化计算所有列；
+                     宽表中的 NaN 行同样占用窗口位置)
+        :return: {ticker: Series} 或与宽表同形的 DataFrame
+        """
+        if isinstance(data, pd.DataFrame):
+            roller = data.expanding(min_periods=min_periods) if window is None else \
+                data.rolling(window, min_periods=min(min_periods, window))
+            q = roller.quantile(percentile / 100)
+            return pd.DataFrame(ThresholdOptimizer.clamp_threshold(q.to_numpy(), base_level),
+                                index=data.index, columns=data.columns)
+        return {t: ThresholdOptimizer.get_rolling_threshold(df, window, base_level, percentile, min_periods)
+                for t, df in data.items()}